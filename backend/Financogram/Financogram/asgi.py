@@ -2,6 +2,10 @@
 ASGI config for Financogram project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Live quote streams (Server-Sent Events and WebSockets) are served by
+web.streaming on the event loop. Every other request goes to the WSGI app on
+a thread pool, since Django 3.2's ASGI handler runs all sync views on a
+single thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
@@ -9,8 +13,35 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from a2wsgi import WSGIMiddleware
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Financogram.settings')
 
-application = get_asgi_application()
+django_application = WSGIMiddleware(get_wsgi_application(), workers=int(os.getenv('WSGI_THREADS', 10)))
+
+# Imported after Django is set up
+from web.streaming import quote_stream  # noqa: E402
+
+STREAM_PATHS = {'/web/stream/quotes', '/web/stream/quotes/'}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['path'] in STREAM_PATHS:
+        return await quote_stream(scope, receive, send)
+    if scope['type'] == 'websocket':
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    return await django_application(scope, receive, send)
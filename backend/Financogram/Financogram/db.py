@@ -0,0 +1,67 @@
+"""ORM writes that hold on djongo as well as on SQL databases.
+
+djongo has no transactions, so atomic() and select_for_update() do
+nothing there. It also reports a duplicate key as a DatabaseError raised
+from pymongo's DuplicateKeyError, not as an IntegrityError, and cannot
+translate the CASE WHEN of QuerySet.bulk_update(). The helpers here work
+without any of these.
+"""
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from . import mongo
+
+
+def is_duplicate_key(error):
+    """Whether error, or an error it was raised from, is a unique-constraint violation"""
+    while error is not None:
+        if isinstance(error, (IntegrityError, DuplicateKeyError)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def insert_unique(create):
+    """Run create() and return True, or False when the row already exists.
+
+    On SQL databases the insert runs in a savepoint, so a conflict does not
+    break the caller's transaction. Other database errors propagate.
+    """
+    try:
+        if connection.vendor == 'djongo':
+            create()
+        else:
+            with transaction.atomic():
+                create()
+    except DatabaseError as e:
+        if not is_duplicate_key(e):
+            raise
+        return False
+    return True
+
+
+def bulk_update(model, objs, fields, batch_size=1000):
+    """model.objects.bulk_update(objs, fields) that also runs on djongo.
+
+    There the rows are written with one pymongo bulk write per batch, or
+    with an UPDATE per row when the Mongo repositories are turned off.
+    """
+    objs = list(objs)
+    if mongo.enabled():
+        fields = [model._meta.get_field(name) for name in fields]
+        collection = mongo.get_database()[model._meta.db_table]
+        for start in range(0, len(objs), batch_size):
+            collection.bulk_write([
+                UpdateOne({model._meta.pk.column: obj.pk}, {'$set': {
+                    field.column: mongo.to_mongo_value(field.get_prep_value(getattr(obj, field.attname)))
+                    for field in fields
+                }})
+                for obj in objs[start:start + batch_size]
+            ], ordered=False)
+    elif connection.vendor == 'djongo':
+        fields = [model._meta.get_field(name) for name in fields]
+        for obj in objs:
+            model.objects.filter(pk=obj.pk).update(**{field.attname: getattr(obj, field.attname) for field in fields})
+    elif objs:
+        model.objects.bulk_update(objs, fields, batch_size=batch_size)
@@ -0,0 +1,193 @@
+"""Direct pymongo access for the hottest reads and writes.
+
+djongo turns every ORM query into SQL and then translates that SQL into a
+Mongo query, which costs more than the lookup itself on simple queries. The
+repositories here send the equivalent Mongo operations directly, through one
+pooled client per process. Documents keep djongo's layout, so both paths
+read and write the same collections:
+
+- `id` is allocated from djongo's `__schema__` sequence of the collection.
+- Datetimes are naive UTC, dates are datetimes at midnight and times are
+  datetimes on 1900-01-01.
+- Django JSONFields hold a JSON string.
+
+Call sites check `enabled()` and use the ORM otherwise (e.g. SQLite in tests).
+"""
+import json
+import threading
+from datetime import date, datetime, time, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def enabled():
+    """Whether hot paths should bypass the ORM"""
+    return settings.MONGO_REPOSITORIES and connection.vendor == 'djongo'
+
+
+def get_client():
+    """The process-wide MongoClient, built from the default database's CLIENT settings"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            options = {k: v for k, v in settings.DATABASES['default'].get('CLIENT', {}).items() if v}
+            options.setdefault('maxPoolSize', settings.MONGO_MAX_POOL_SIZE)
+            _client = MongoClient(**options)
+        return _client
+
+
+def get_database():
+    return get_client()[settings.DATABASES['default']['NAME']]
+
+
+def to_mongo_datetime(value):
+    """An aware datetime as djongo stores it (naive UTC)"""
+    if timezone.is_aware(value):
+        value = timezone.make_naive(value, dt_timezone.utc)
+    return value
+
+
+def to_mongo_value(value):
+    """A field's prepared value as djongo stores it"""
+    if isinstance(value, datetime):
+        return to_mongo_datetime(value)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, time):
+        return datetime.combine(date(1900, 1, 1), value)
+    return value
+
+
+def from_mongo_datetime(value):
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def next_ids(db, collection, count):
+    """Reserve `count` ids from djongo's sequence for collection"""
+    if not count:
+        return []
+    auto = db['__schema__'].find_one_and_update(
+        {'name': collection, 'auto': {'$exists': True}},
+        {'$inc': {'auto.seq': count}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if auto is None:
+        raise ValueError(f"No id sequence for collection {collection}")
+    last = auto['auto']['seq']
+    return list(range(last - count + 1, last + 1))
+
+
+class PredictionCacheRepository:
+    """Reads and upserts of prediction_predictioncache"""
+
+    collection_name = 'prediction_predictioncache'
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_database()
+        self.collection = self.db[self.collection_name]
+
+    def get_many(self, keys, now):
+        """(cache_key, cache_data, expires_at) of the entries for keys that expire after now"""
+        cursor = self.collection.find(
+            {'cache_key': {'$in': list(keys)}, 'expires_at': {'$gt': to_mongo_datetime(now)}},
+            {'_id': 0, 'cache_key': 1, 'cache_data': 1, 'expires_at': 1},
+        )
+        return [(doc['cache_key'], json.loads(doc['cache_data']), from_mongo_datetime(doc['expires_at']))
+                for doc in cursor]
+
+    def upsert_many(self, items, ttl):
+        """Insert or replace the entries in items ({cache_key: data}) with one bulk write.
+
+        Returns their expires_at. Every key gets a reserved id in $setOnInsert,
+        since the TTL index may delete a row at any moment; ids of keys that
+        still had a row go unused.
+        """
+        if not items:
+            return None
+        now = timezone.now()
+        expires_at = to_mongo_datetime(now + ttl)
+        ids = next_ids(self.db, self.collection_name, len(items))
+        self.collection.bulk_write([
+            UpdateOne({'cache_key': key}, {
+                '$set': {'cache_data': json.dumps(data), 'expires_at': expires_at},
+                '$setOnInsert': {'id': id_, 'created_at': to_mongo_datetime(now)},
+            }, upsert=True)
+            for id_, (key, data) in zip(ids, items.items())
+        ], ordered=False)
+        return from_mongo_datetime(expires_at)
+
+
+class UserRepository:
+    """Lookups and wallet updates of api_user"""
+
+    collection_name = 'api_user'
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_database()
+        self.collection = self.db[self.collection_name]
+
+    def find_by_email(self, email, fields):
+        """A dict of `fields` for the user with email, or None"""
+        doc = self.collection.find_one({'email': email}, {'_id': 0, **{f: 1 for f in fields}})
+        if doc is not None and 'date_joined' in doc:
+            doc['date_joined'] = doc['date_joined'].date()
+        return doc
+
+    def balances(self, emails):
+        """{email: balance string} of the users with these emails"""
+        cursor = self.collection.find({'email': {'$in': list(emails)}}, {'_id': 0, 'email': 1, 'balance': 1})
+        return {doc['email']: doc['balance'] for doc in cursor}
+
+    def update_balance(self, email, change, attempts=10, current=None):
+        """User.update_balance on api_user: the same compare-and-set on the balance string"""
+        for _ in range(attempts):
+            if current is None:
+                doc = self.collection.find_one({'email': email}, {'_id': 0, 'balance': 1})
+                if doc is None:
+                    return None
+            else:
+                doc, current = {'balance': current}, None
+            try:
+                balance = float(doc['balance'])
+            except (TypeError, ValueError):
+                raise ValueError('Invalid user balance in system')
+            new_balance = round(change(round(balance, 2)), 2)
+            stored = f"{new_balance:.2f}"
+            if stored == doc['balance'] or self.collection.update_one(
+                    {'email': email, 'balance': doc['balance']}, {'$set': {'balance': stored}}).matched_count:
+                return new_balance
+        raise RuntimeError(f"Wallet of {email} is changing too fast to update")
+
+
+class InvestmentRepository:
+    """Listing of web_investment"""
+
+    collection_name = 'web_investment'
+    list_fields = ('fund_id', 'name', 'amount', 'sip_date', 'investment_type', 'nav', 'category', 'risk',
+                   'payment_mode', 'date', 'time')
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_database()
+        self.collection = self.db[self.collection_name]
+
+    def list_for(self, email):
+        """The user's investments in the order they were made, as dicts of list_fields"""
+        cursor = self.collection.find(
+            {'email': email}, {'_id': 0, **{f: 1 for f in self.list_fields}}).sort('id', 1)
+        rows = []
+        for doc in cursor:
+            row = {field: doc.get(field) for field in self.list_fields}
+            if isinstance(row['date'], datetime):
+                row['date'] = row['date'].date()
+            if isinstance(row['time'], datetime):
+                row['time'] = row['time'].time()
+            rows.append(row)
+        return rows
@@ -41,6 +41,8 @@ CORS_ALLOWED_ORIGINS = [
     "https://financogram.vercel.app",
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Let the frontend read when list snapshots were taken
+CORS_EXPOSE_HEADERS = ["X-As-Of"]
 
 # Application definition
 import cloudinary
@@ -82,6 +84,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'prediction.instrumentation.ServerTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'Financogram.urls'
@@ -130,6 +133,11 @@ DATABASES = {
     }
 }
 
+# Hot paths (prediction cache, user lookups, wallet updates, investment lists) use pymongo
+# directly when the database is MongoDB, through one pooled client per process
+MONGO_REPOSITORIES = os.getenv('MONGO_REPOSITORIES', 'True') == 'True'
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -169,6 +177,69 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Local market data shared by every worker process
+DATA_DIR = Path(os.getenv('DATA_DIR', BASE_DIR / 'data'))
+BAR_STORE_DIR = DATA_DIR / 'bars'
+NAV_STORE_DIR = DATA_DIR / 'navs'
+# Prepared feature windows kept in each process and advanced as new bars are stored
+FEATURE_CACHE_ENTRIES = int(os.getenv('FEATURE_CACHE_ENTRIES', 256))
+
+# Where market data comes from: 'yahoo', 'replay' (recorded fixtures) or 'synthetic'
+MARKET_DATA_PROVIDER = os.getenv('MARKET_DATA_PROVIDER', 'yahoo')
+MARKET_DATA_FIXTURES_DIR = Path(os.getenv('MARKET_DATA_FIXTURES_DIR', DATA_DIR / 'fixtures'))
+# Process-wide cap on concurrent provider calls, and how long a fan-out may take (seconds)
+MARKET_DATA_MAX_CONCURRENCY = int(os.getenv('MARKET_DATA_MAX_CONCURRENCY', 16))
+MARKET_DATA_DEADLINE = float(os.getenv('MARKET_DATA_DEADLINE', 4))
+# Shared per-symbol quote and fundamentals cache (seconds)
+SYMBOL_QUOTE_TTL = int(os.getenv('SYMBOL_QUOTE_TTL', 30))
+SYMBOL_FUNDAMENTALS_TTL = int(os.getenv('SYMBOL_FUNDAMENTALS_TTL', 6 * 3600))
+SYMBOL_CACHE_LOCAL_ENTRIES = int(os.getenv('SYMBOL_CACHE_LOCAL_ENTRIES', 1024))
+# Stock list and index quote snapshots (seconds)
+MARKET_SNAPSHOT_MAX_AGE = int(os.getenv('MARKET_SNAPSHOT_MAX_AGE', 60))
+MARKET_SNAPSHOT_MAX_STALE = int(os.getenv('MARKET_SNAPSHOT_MAX_STALE', 900))
+# Seconds between refresh_snapshots passes; below SYMBOL_QUOTE_TTL keeps the shared quotes warm
+MARKET_SNAPSHOT_INTERVAL = int(os.getenv('MARKET_SNAPSHOT_INTERVAL', 20))
+# Cached chart series (symbol x period) kept in each process
+CHART_CACHE_ENTRIES = int(os.getenv('CHART_CACHE_ENTRIES', 256))
+# Mutual fund catalog: hours before a scheme's details are refetched, seconds between
+# checks for a changed catalog, and parallel detail requests during a sync
+MF_CATALOG_DETAIL_MAX_AGE = int(os.getenv('MF_CATALOG_DETAIL_MAX_AGE', 12))
+MF_CATALOG_RELOAD_SECONDS = int(os.getenv('MF_CATALOG_RELOAD_SECONDS', 60))
+MF_CATALOG_SYNC_WORKERS = int(os.getenv('MF_CATALOG_SYNC_WORKERS', 16))
+# Seconds before a fund's stored NAV history is checked for new NAVs
+NAV_STORE_REFRESH_SECONDS = int(os.getenv('NAV_STORE_REFRESH_SECONDS', 3600))
+# Funds aligned into one NAV matrix when computing returns
+FUND_RETURNS_CHUNK_SIZE = int(os.getenv('FUND_RETURNS_CHUNK_SIZE', 500))
+# Seconds a valued portfolio is served from the shared cache (new investments drop it)
+PORTFOLIO_CACHE_TTL = int(os.getenv('PORTFOLIO_CACHE_TTL', 300))
+# SIPs read and recorded per batch by the run_sips scheduler
+SIP_CHUNK_SIZE = int(os.getenv('SIP_CHUNK_SIZE', 1000))
+# News feed: NewsAPI queries polled into the local store and seconds between polls across
+# all processes (NewsAPI's free plan allows 100 requests a day), days articles are kept,
+# seconds between index reloads, and whether a read may start a poll when the ingest_news
+# process has not polled within the interval
+NEWS_API_KEY = os.getenv('NEWS_API_KEY')
+NEWS_QUERIES = [q.strip() for q in os.getenv('NEWS_QUERIES', 'sensex').split(',') if q.strip()]
+NEWS_POLL_INTERVAL = int(os.getenv('NEWS_POLL_INTERVAL', 900))
+NEWS_RETENTION_DAYS = int(os.getenv('NEWS_RETENTION_DAYS', 30))
+NEWS_RELOAD_SECONDS = int(os.getenv('NEWS_RELOAD_SECONDS', 30))
+NEWS_REFRESH_ON_READ = os.getenv('NEWS_REFRESH_ON_READ', 'True') == 'True'
+# Live quote streams at /web/stream/quotes/ (seconds)
+QUOTE_STREAM_INTERVAL = float(os.getenv('QUOTE_STREAM_INTERVAL', 1))
+QUOTE_STREAM_HEARTBEAT = float(os.getenv('QUOTE_STREAM_HEARTBEAT', 15))
+QUOTE_STREAM_MAX_SYMBOLS = int(os.getenv('QUOTE_STREAM_MAX_SYMBOLS', 50))
+
+# Prediction cache and the refresh-ahead warmer that keeps it filled
+PREDICTION_CACHE_TTL = int(os.getenv('PREDICTION_CACHE_TTL', 3600))  # seconds
+PREDICTION_CACHE_LOCAL_ENTRIES = int(os.getenv('PREDICTION_CACHE_LOCAL_ENTRIES', 512))
+PREDICTION_WARMER_INTERVAL = int(os.getenv('PREDICTION_WARMER_INTERVAL', 300))
+PREDICTION_WARMER_REFRESH_AHEAD = int(os.getenv('PREDICTION_WARMER_REFRESH_AHEAD', 900))
+PREDICTION_WARMER_CONCURRENCY = int(os.getenv('PREDICTION_WARMER_CONCURRENCY', 2))
+PREDICTION_WARMER_BATCH_SIZE = int(os.getenv('PREDICTION_WARMER_BATCH_SIZE', 8))
+
+# Per-stage allocation tracking via tracemalloc (slows every allocation down)
+PREDICTION_TRACE_ALLOCATIONS = os.getenv('PREDICTION_TRACE_ALLOCATIONS', 'False') == 'True'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -1,6 +1,13 @@
 from django.db import models
 from django.utils import timezone
 
+from Financogram import mongo
+
+
+class InsufficientBalance(ValueError):
+    pass
+
+
 class User(models.Model):
     name = models.CharField(max_length=100)
     username = models.CharField(max_length=20, unique=True, default="financogram_user")
@@ -18,3 +25,52 @@ class User(models.Model):
 
     def __str__(self):
         return self.email
+
+    @classmethod
+    def balances(cls, emails):
+        """{email: stored balance string} of the users with these emails, in one query"""
+        if mongo.enabled():
+            return mongo.UserRepository().balances(emails)
+        return dict(cls.objects.filter(email__in=list(emails)).values_list('email', 'balance'))
+
+    @classmethod
+    def update_balance(cls, email, change, attempts=10, current=None):
+        """Set the wallet balance of email to change(balance); returns it, or None without a user.
+
+        Balances are strings, so the write is a compare-and-set on the value
+        that was read, retried when another writer changed it first. Every
+        balance write goes through here, on pymongo when the Mongo
+        repositories are on; change() may raise to abort. Raises ValueError
+        when the stored balance is not a number. `current`, a balance string
+        already read (see balances()), saves the first read.
+        """
+        if mongo.enabled():
+            return mongo.UserRepository().update_balance(email, change, attempts, current)
+        for _ in range(attempts):
+            if current is None:
+                current = cls.objects.filter(email=email).values_list('balance', flat=True).first()
+                if current is None:
+                    return None
+            try:
+                balance = float(current)
+            except (TypeError, ValueError):
+                raise ValueError('Invalid user balance in system')
+            new_balance = round(change(round(balance, 2)), 2)
+            stored = f"{new_balance:.2f}"
+            if stored == current or cls.objects.filter(email=email, balance=current).update(balance=stored):
+                return new_balance
+            current = None
+        raise RuntimeError(f"Wallet of {email} is changing too fast to update")
+
+    @classmethod
+    def add_to_balance(cls, email, amount):
+        return cls.update_balance(email, lambda balance: balance + amount)
+
+    @classmethod
+    def debit(cls, email, amount, current=None):
+        """Take amount from the wallet; raises InsufficientBalance when it holds less"""
+        def change(balance):
+            if amount > balance:
+                raise InsufficientBalance('Insufficient wallet balance')
+            return balance - amount
+        return cls.update_balance(email, change, current=current)
@@ -12,6 +12,7 @@ from django.core.files import File
 from rest_framework import status
 from django.conf import settings
 import cloudinary.uploader
+from Financogram import mongo
 from .models import User
 from io import BytesIO
 from PIL import Image
@@ -175,6 +176,9 @@ def login_face_view(request):
         print("Error in login_face_view:", str(e))
         return JsonResponse({'status': 'Internal server error', 'error': str(e)}, status=500)
 
+PROFILE_FIELDS = ('name', 'username', 'email', 'mobile', 'face_image', 'qr_code', 'profile_image',
+                  'date_joined', 'balance')
+
 # Get user profile with face image and QR code URLs
 @api_view(['GET'])
 def user_profile(request):
@@ -182,6 +186,12 @@ def user_profile(request):
     if not email:
         return JsonResponse({'error': 'Email not provided'}, status=400)
 
+    if mongo.enabled():
+        profile = mongo.UserRepository().find_by_email(email, PROFILE_FIELDS)
+        if profile is None:
+            return JsonResponse({'error': 'User not found'}, status=404)
+        return JsonResponse({field: profile.get(field) for field in PROFILE_FIELDS})
+
     try:
         user = User.objects.get(email=email)
         # image_url = request.build_absolute_uri(user.face_image.url) if user.face_image else None
@@ -578,14 +588,14 @@ def update_wallet(request):
             return Response({'error': 'Email and amount are required'}, status=400)
         
         try:
-            user = User.objects.get(email=email)
-            user.balance = str(round(float(user.balance), 2) + amount)
-            user.save()
+            new_balance = User.add_to_balance(email, amount)
+            if new_balance is None:
+                raise User.DoesNotExist
             
             return Response({
                 'status': 'success',
                 'message': f'Wallet updated successfully',
-                'new_balance': float(user.balance)
+                'new_balance': new_balance
             })
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=404)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import StockPrediction, PredictionCache
+from .models import StockPrediction, PredictionCache, MarketDataCache
 
 @admin.register(StockPrediction)
 class StockPredictionAdmin(admin.ModelAdmin):
@@ -14,3 +14,10 @@ class PredictionCacheAdmin(admin.ModelAdmin):
     list_filter = ('expires_at', 'created_at')
     search_fields = ('cache_key',)
     readonly_fields = ('created_at',)
+
+@admin.register(MarketDataCache)
+class MarketDataCacheAdmin(admin.ModelAdmin):
+    list_display = ('cache_key', 'expires_at', 'updated_at')
+    list_filter = ('expires_at',)
+    search_fields = ('cache_key',)
+    readonly_fields = ('updated_at',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PredictionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'prediction'
+
+    def ready(self):
+        from .instrumentation import start_allocation_tracing
+        start_allocation_tracing()
@@ -0,0 +1,159 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .bar_store import BarStore
+from .prediction_engine import StockPredictionEngine, TIMEFRAME_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Rows of prepared features a live prediction sees (one year of bars after dropna)
+CONFIDENCE_WINDOW = 200
+
+
+def trend_signals(data):
+    """StockPredictionEngine.predict_trend evaluated at every row at once"""
+    price_trend = (data['Close'] - data['Close'].shift(19)).astype(np.float64)
+    sma_trend = (data['SMA_20'] - data['SMA_20'].shift(19)).astype(np.float64)
+
+    # Same weights, summed in the same order and precision as the scalar version
+    score = (
+        0.4 * np.sign(price_trend)
+        + 0.3 * np.sign(sma_trend)
+        + np.where(data['RSI'] > 50, 0.2, -0.2)
+        + np.where(data['MACD'] > 0, 0.1, -0.1)
+    )
+    trend = np.where(score > 0.2, 'UP', np.where(score < -0.2, 'DOWN', 'SIDEWAYS'))
+    return pd.Series(trend, index=data.index).where(price_trend.notna())
+
+
+def confidence_signals(data, trend, window=CONFIDENCE_WINDOW):
+    """StockPredictionEngine.calculate_confidence over a trailing window at every row"""
+    data_quality = min(1.0, window / 200)
+
+    volatility = data['Volatility'].rolling(20).mean()
+    volatility_score = (1 - volatility / data['Close'].rolling(window).mean()).clip(lower=0)
+
+    up_share = (data['Price_Change'] > 0).rolling(20).sum() / 20
+    down_share = (data['Price_Change'] < 0).rolling(20).sum() / 20
+    consistency_score = np.where(trend == 'UP', up_share, np.where(trend == 'DOWN', down_share, 0.5))
+
+    volume_score = (data['Volume'].rolling(20).mean() / data['Volume'].rolling(window).mean()).clip(upper=1.0)
+
+    confidence = (
+        data_quality * 0.3
+        + volatility_score * 0.25
+        + consistency_score * 0.25
+        + volume_score * 0.2
+    )
+    return confidence.clip(lower=0.3, upper=0.95)
+
+
+def expected_return_signals(data, timeframe):
+    """Deterministic part of predict_prices + calculate_expected_return at every row.
+
+    The live forecast adds zero-mean noise to the 30-bar linear trend; the
+    backtest uses the trend alone.
+    """
+    closes = data['Close'].to_numpy(dtype=np.float64)
+    days = TIMEFRAME_DAYS.get(timeframe, 30)
+    window = 30
+    slope = np.full(len(closes), np.nan)
+    if len(closes) >= window:
+        # Rolling least-squares slope: windows @ centered x / sum(x^2)
+        x = np.arange(window) - (window - 1) / 2
+        slope[window - 1:] = sliding_window_view(closes, window) @ x / (x @ x)
+    end_price = np.maximum(closes + slope * days, closes * 0.5)
+    expected = np.round((end_price - closes) / closes * 100, 2)
+    return pd.Series(expected, index=data.index)
+
+
+def recommendation_signals(trend, confidence, expected_return):
+    """StockPredictionEngine.generate_recommendation at every row"""
+    buy = (confidence >= 0.5) & (trend == 'UP') & (expected_return > 2)
+    sell = (confidence >= 0.5) & (trend == 'DOWN') & (expected_return < -2)
+    return pd.Series(np.where(buy, 'BUY', np.where(sell, 'SELL', 'HOLD')), index=trend.index)
+
+
+def max_drawdown(equity):
+    peaks = np.maximum.accumulate(equity)
+    return float(((equity - peaks) / peaks).min()) if len(equity) else 0.0
+
+
+def evaluate(data, timeframe):
+    """Hit rates, returns and drawdown of the signals for one prepared symbol"""
+    horizon = TIMEFRAME_DAYS.get(timeframe, 30)
+    trend = trend_signals(data)
+    confidence = confidence_signals(data, trend)
+    expected_return = expected_return_signals(data, timeframe)
+    recommendation = recommendation_signals(trend, confidence, expected_return)
+
+    forward = data['Close'].shift(-horizon) / data['Close'] - 1
+    valid = trend.notna() & confidence.notna() & forward.notna()
+    trend, recommendation, forward = trend[valid], recommendation[valid], forward[valid]
+
+    direction = trend.map({'UP': 1, 'DOWN': -1}).fillna(0).to_numpy()
+    position = recommendation.map({'BUY': 1, 'SELL': -1}).fillna(0).to_numpy()
+    forward = forward.to_numpy()
+
+    called = direction != 0
+    traded = position != 0
+
+    # Daily strategy: hold the signal's position over the next bar
+    next_day = (data['Close'].shift(-1) / data['Close'] - 1)[valid].fillna(0).to_numpy()
+    equity = np.cumprod(1 + position * next_day)
+
+    return {
+        'timeframe': timeframe,
+        'signals': int(valid.sum()),
+        'trend_calls': int(called.sum()),
+        'trend_hit_rate': float((np.sign(forward[called]) == direction[called]).mean()) if called.any() else None,
+        'trades': int(traded.sum()),
+        'trade_hit_rate': float((np.sign(forward[traded]) == position[traded]).mean()) if traded.any() else None,
+        'avg_trade_return': float((position[traded] * forward[traded]).mean() * 100) if traded.any() else None,
+        'strategy_return': float((equity[-1] - 1) * 100) if len(equity) else 0.0,
+        'buy_and_hold_return': float((data['Close'][valid].iloc[-1] / data['Close'][valid].iloc[0] - 1) * 100) if valid.any() else 0.0,
+        'max_drawdown': max_drawdown(equity) * 100,
+    }
+
+
+def backtest_symbol(symbol, period, timeframes, store_root):
+    """Backtest one symbol from the bar store; runs inside a worker process"""
+    try:
+        bars = BarStore(root=store_root).read_period(symbol, period).to_frame()
+        data = StockPredictionEngine().prepare_features(bars).to_frame()
+        rows = []
+        for timeframe in timeframes:
+            row = evaluate(data, timeframe)
+            row['symbol'] = symbol
+            rows.append(row)
+        return rows
+    except Exception as e:
+        return [{'symbol': symbol, 'error': str(e)}]
+
+
+def run_backtest(symbols, period='5y', timeframes=('1d', '1w', '1m'), workers=None, store=None):
+    """Walk-forward backtest of the trend/recommendation logic over many symbols.
+
+    Bars are synced once in bulk, then symbols fan out over a process pool that
+    only reads the shared memory-mapped store.
+    """
+    from .bar_store import get_bar_store
+    store = store or get_bar_store()
+    try:
+        store.update_many(symbols)
+    except Exception as e:
+        logger.warning(f"Backtest bar sync failed, using stored bars: {str(e)}")
+
+    workers = workers or min(len(symbols), os.cpu_count() or 1)
+    args = [(symbol, period, list(timeframes), store.root) for symbol in symbols]
+    if workers <= 1:
+        results = [backtest_symbol(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(backtest_symbol, *zip(*args)))
+    return [row for rows in results for row in rows]
@@ -0,0 +1,331 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .market_data import get_market_data
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Ticker symbols the store (and the APIs in front of it) accept; they name directories
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9.^=&\-]{1,20}$')
+
+# How far back the first download for a symbol goes (Yahoo caps intraday history)
+BACKFILL_PERIODS = {
+    '1m': '7d',
+    '5m': '60d',
+    '15m': '60d',
+    '30m': '60d',
+    '1h': '730d',
+    '1d': 'max',
+    '1wk': 'max',
+    '1mo': 'max',
+}
+
+# Seconds before a stored series is considered stale and a delta fetch is made
+REFRESH_SECONDS = {
+    '1m': 60,
+    '5m': 120,
+    '15m': 300,
+    '30m': 600,
+    '1h': 1800,
+    '1d': 900,
+    '1wk': 3600,
+    '1mo': 6 * 3600,
+}
+
+
+def provider_fetch(symbol, interval, period=None, start=None):
+    """Download bars for one symbol from the configured market data provider"""
+    return get_market_data().history(symbol, interval, period=period, start=start)
+
+
+def provider_fetch_many(symbols, interval, period=None, start=None):
+    """Download bars for several symbols, in one request where the provider supports it"""
+    return get_market_data().history_many(symbols, interval, period=period, start=start)
+
+
+def read_meta(path):
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+@contextmanager
+def series_lock(path, create=True):
+    """Exclusive lock on a series directory, across threads and worker processes.
+
+    With create=False a series that has no directory yet is not locked; the
+    first write_series creates it.
+    """
+    if not create and not os.path.isdir(path):
+        yield
+        return
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, '.lock'), 'w') as handle:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def write_series(path, arrays, meta):
+    """Swap in new .npy files (written in the order given) and then meta.json.
+
+    Files are replaced rather than rewritten so readers holding the previous
+    mapping keep a consistent snapshot. Write the array whose mtime readers
+    check last.
+    """
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays:
+        fd, tmp = tempfile.mkstemp(dir=path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, os.path.join(path, name))
+    fd, tmp = tempfile.mkstemp(dir=path, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, 'meta.json'))
+
+
+class Bars:
+    """Read-only view over a range of stored bars (slices of memory-mapped arrays)"""
+
+    def __init__(self, timestamps, values, tz):
+        self.timestamps = timestamps
+        self.values = values
+        self.tz = tz
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def column(self, name):
+        return self.values[:, BAR_COLUMNS.index(name)]
+
+    def index(self):
+        return pd.DatetimeIndex(self.timestamps.astype('datetime64[s]'), tz='UTC').tz_convert(self.tz).rename('Date')
+
+    def to_frame(self):
+        return pd.DataFrame(np.asarray(self.values), index=self.index(), columns=BAR_COLUMNS)
+
+
+class BarStore:
+    """Persistent OHLCV store keyed by symbol and interval.
+
+    Each series lives in its own directory as two .npy files (int64 epoch
+    seconds and an N x 5 float64 OHLCV matrix) that are opened memory-mapped,
+    so every worker process shares the same pages. Updates only download the
+    bars after the last stored one and swap the files in atomically.
+    """
+
+    def __init__(self, root=None, fetcher=None, bulk_fetcher=None, refresh_seconds=None):
+        self.root = str(root or settings.BAR_STORE_DIR)
+        self.fetcher = fetcher or provider_fetch
+        self.bulk_fetcher = bulk_fetcher or provider_fetch_many
+        self.refresh_seconds = dict(REFRESH_SECONDS, **(refresh_seconds or {}))
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def series_dir(self, symbol, interval):
+        """Directory of a series; raises ValueError for symbols that are not a valid ticker"""
+        name = symbol.upper()
+        if not SYMBOL_PATTERN.match(name) or name in ('.', '..'):
+            raise ValueError(f"Invalid symbol: {symbol}")
+        path = os.path.join(self.root, name, interval)
+        root = os.path.realpath(self.root)
+        if os.path.commonpath([root, os.path.realpath(path)]) != root:
+            raise ValueError(f"Invalid series: {symbol} {interval}")
+        return path
+
+    def _load(self, symbol, interval):
+        """Return the memory-mapped (timestamps, values, meta) for a series"""
+        path = self.series_dir(symbol, interval)
+        ts_path = os.path.join(path, 'timestamps.npy')
+        try:
+            stamp = os.stat(ts_path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._maps.get(path)
+            if cached and cached[0] == stamp:
+                return cached[1]
+        loaded = (
+            np.load(ts_path, mmap_mode='r'),
+            np.load(os.path.join(path, 'bars.npy'), mmap_mode='r'),
+            read_meta(path),
+        )
+        with self._lock:
+            self._maps[path] = (stamp, loaded)
+        return loaded
+
+    def is_stale(self, symbol, interval='1d'):
+        meta = read_meta(self.series_dir(symbol, interval))
+        fetched_at = meta.get('fetched_at', 0)
+        return time.time() - fetched_at > self.refresh_seconds.get(interval, 900)
+
+    def _delta_start(self, loaded, interval):
+        """Start date for a delta fetch, or None when a full backfill is needed"""
+        if loaded is None or not len(loaded[0]):
+            return None
+        backfill = BACKFILL_PERIODS.get(interval, 'max')
+        last = pd.Timestamp(int(loaded[0][-1]), unit='s', tz='UTC')
+        if backfill.endswith('d') and pd.Timestamp.now(tz='UTC') - last > pd.Timedelta(backfill):
+            return None
+        # Refetch from the last stored session so a partial bar gets completed
+        return last.tz_convert(loaded[2].get('tz', 'UTC')).strftime('%Y-%m-%d')
+
+    def _merge(self, symbol, interval, loaded, frame):
+        """Append freshly fetched bars after the stored ones and persist the result"""
+        path = self.series_dir(symbol, interval)
+        frame = frame[BAR_COLUMNS].dropna(subset=['Close'])
+        tz = loaded[2].get('tz') if loaded is not None else None
+        if frame.empty:
+            new_ts = np.empty(0, dtype=np.int64)
+            new_values = np.empty((0, len(BAR_COLUMNS)))
+        else:
+            index = frame.index.tz_localize('UTC') if frame.index.tz is None else frame.index
+            tz = tz or str(index.tz)
+            new_ts = (index.tz_convert('UTC').asi8 // 10**9).astype(np.int64)
+            new_values = frame.to_numpy(dtype=np.float64)
+
+        if loaded is not None and len(new_ts):
+            keep = int(np.searchsorted(loaded[0], new_ts[0], side='left'))
+            timestamps = np.concatenate([loaded[0][:keep], new_ts])
+            values = np.concatenate([loaded[1][:keep], new_values])
+            added = len(timestamps) - len(loaded[0])
+        elif loaded is not None:
+            timestamps, values, added = np.asarray(loaded[0]), np.asarray(loaded[1]), 0
+        else:
+            timestamps, values, added = new_ts, new_values, len(new_ts)
+        if not len(timestamps):
+            return 0
+
+        write_series(path, [('bars.npy', values), ('timestamps.npy', timestamps)],
+                     {'fetched_at': time.time(), 'tz': tz or 'UTC'})
+        return added
+
+    def update(self, symbol, interval='1d', force=False):
+        """Fetch only the bars after the last stored one; returns the number of new bars"""
+        path = self.series_dir(symbol, interval)
+        with series_lock(path):
+            # Another worker may have refreshed the series while we waited
+            if not force and not self.is_stale(symbol, interval):
+                return 0
+            loaded = self._load(symbol, interval)
+            start = self._delta_start(loaded, interval)
+            if start is None:
+                frame = self.fetcher(symbol, interval, period=BACKFILL_PERIODS.get(interval, 'max'))
+                loaded = None
+            else:
+                frame = self.fetcher(symbol, interval, start=start)
+            if frame is None or frame.empty:
+                if loaded is None:
+                    return 0
+                frame = pd.DataFrame(columns=BAR_COLUMNS)
+            added = self._merge(symbol, interval, loaded, frame)
+            logger.info(f"Bar store: {symbol} {interval} +{added} bars")
+            return added
+
+    def update_many(self, symbols, interval='1d', force=False):
+        """Bring several series up to date with at most two bulk requests"""
+        stale = [s for s in symbols if force or self.is_stale(s, interval)]
+        if not stale:
+            return {}
+        loaded = {s: self._load(s, interval) for s in stale}
+        starts = {s: self._delta_start(loaded[s], interval) for s in stale}
+        backfill = [s for s in stale if starts[s] is None]
+        delta = [s for s in stale if starts[s] is not None]
+
+        frames = {}
+        if backfill:
+            frames.update(self.bulk_fetcher(backfill, interval, period=BACKFILL_PERIODS.get(interval, 'max')))
+        if delta:
+            frames.update(self.bulk_fetcher(delta, interval, start=min(starts[s] for s in delta)))
+
+        added = {}
+        for symbol in stale:
+            frame = frames.get(symbol)
+            if frame is None or (frame.empty and loaded[symbol] is None):
+                continue
+            with series_lock(self.series_dir(symbol, interval)):
+                added[symbol] = self._merge(symbol, interval, self._load(symbol, interval), frame)
+        return added
+
+    def read(self, symbol, interval='1d', start=None, end=None):
+        """Zero-copy read of the stored bars in [start, end) (epoch seconds)"""
+        loaded = self._load(symbol, interval)
+        if loaded is None:
+            return Bars(np.empty(0, dtype=np.int64), np.empty((0, len(BAR_COLUMNS))), 'UTC')
+        timestamps, values, meta = loaded
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        return Bars(timestamps[lo:hi], values[lo:hi], meta.get('tz', 'UTC'))
+
+    def read_period(self, symbol, period='1y', interval='1d'):
+        """Read the trailing window a Yahoo `period` string describes"""
+        bars = self.read(symbol, interval)
+        if not len(bars) or period == 'max':
+            return bars
+        last = pd.Timestamp(int(bars.timestamps[-1]), unit='s', tz='UTC').tz_convert(bars.tz)
+        if period == 'ytd':
+            start = last.normalize().replace(month=1, day=1)
+        elif period.endswith('d') and period[:-1].isdigit():
+            # Day periods count trading sessions, like Yahoo does
+            sessions = bars.index().normalize().unique()
+            start = sessions[max(0, len(sessions) - int(period[:-1]))]
+        elif period.endswith('mo') and period[:-2].isdigit():
+            start = last - pd.DateOffset(months=int(period[:-2]))
+        elif period.endswith('wk') and period[:-2].isdigit():
+            start = last - pd.DateOffset(weeks=int(period[:-2]))
+        elif period.endswith('y') and period[:-1].isdigit():
+            start = last - pd.DateOffset(years=int(period[:-1]))
+        else:
+            raise ValueError(f"Unsupported period: {period}")
+        return self.read(symbol, interval, start=start.tz_convert('UTC').value // 10**9)
+
+    def refresh(self, symbol, interval='1d'):
+        """Update the series if stale, keeping the stored bars when the provider fails"""
+        if self.is_stale(symbol, interval):
+            try:
+                self.update(symbol, interval)
+            except Exception as e:
+                # Serve what we already have rather than failing on a flaky upstream
+                if self._load(symbol, interval) is None:
+                    raise
+                logger.warning(f"Bar store refresh failed for {symbol} {interval}: {str(e)}")
+
+    def history(self, symbol, period='1y', interval='1d'):
+        """Drop-in for Ticker.history(): refresh if stale, then read the window"""
+        self.refresh(symbol, interval)
+        return self.read_period(symbol, period, interval).to_frame()
+
+
+_bar_store = None
+
+
+def get_bar_store():
+    """Process-wide BarStore rooted at settings.BAR_STORE_DIR"""
+    global _bar_store
+    if _bar_store is None:
+        _bar_store = BarStore()
+    return _bar_store
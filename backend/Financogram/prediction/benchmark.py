@@ -0,0 +1,161 @@
+import logging
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from .bar_store import BarStore
+from .indicators import feature_cache
+from .prediction_engine import StockPredictionEngine
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+HISTORIES = {'1y': 1, '5y': 5, '20y': 20}
+STAGES = ['prepare_features', 'predict_trend', 'calculate_confidence', 'predict_prices', 'predict']
+BENCH_SYMBOL = 'BENCH'
+
+
+def synthetic_ohlcv(days, seed=0, end='2024-12-31'):
+    """Reproducible daily OHLCV bars shaped like yfinance history()"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, days)))
+    spread = np.abs(rng.normal(0, 0.006, days))
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.003, days)),
+        'High': close * (1 + spread),
+        'Low': close * (1 - spread),
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 50_000_000, days).astype(float),
+    }, index=pd.bdate_range(end=end, periods=days, tz='America/New_York', name='Date'))
+
+
+def load_fixture(path):
+    """Recorded bars saved with history().to_csv()"""
+    data = pd.read_csv(path, index_col=0)
+    data.index = pd.to_datetime(data.index, utc=True).tz_convert('America/New_York')
+    return data[['Open', 'High', 'Low', 'Close', 'Volume']].astype(float)
+
+
+def measure(func, setup=None, repeat=5):
+    """Wall time over `repeat` runs plus the peak traced allocation of one more run"""
+    func(*(setup() if setup else ()))  # warm-up
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'min_ms': min(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'peak_kib': peak / 1024,
+    }
+
+
+def cold_features():
+    """measure() setup: drop the cached feature windows so predict() prepares the whole history"""
+    feature_cache.clear()
+    return ()
+
+
+def benchmark_history(bars, timeframe='1w', repeat=5):
+    """Time every pipeline stage on one history; end-to-end predict() reads all of it from a local bar store"""
+    engine = StockPredictionEngine()
+    features = engine.prepare_features(bars.copy())
+    trend = engine.predict_trend(features)
+
+    root = tempfile.mkdtemp(prefix='fg-bench-')
+    try:
+        store = BarStore(root=root, fetcher=lambda *args, **kwargs: bars,
+                         refresh_seconds={'1d': float('inf')})
+        store.update(BENCH_SYMBOL, force=True)
+        e2e_engine = StockPredictionEngine(store=store)
+
+        stages = {
+            'prepare_features': measure(engine.prepare_features, lambda: (bars.copy(),), repeat),
+            'predict_trend': measure(lambda: engine.predict_trend(features), repeat=repeat),
+            'calculate_confidence': measure(lambda: engine.calculate_confidence(features, trend), repeat=repeat),
+            'predict_prices': measure(lambda: engine.predict_prices(features, timeframe), repeat=repeat),
+            'predict': measure(lambda: e2e_engine.predict(BENCH_SYMBOL, timeframe, period='max'),
+                               cold_features, repeat),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return stages
+
+
+def run_benchmarks(histories=None, timeframe='1w', repeat=5, fixture=None, seed=0, label=None):
+    """Benchmark the prediction pipeline over several history lengths; returns a JSON-ready report.
+
+    With a fixture, each history is the trailing window of the recorded bars
+    and lengths the recording does not cover are skipped.
+    """
+    histories = histories or list(HISTORIES)
+    recorded = load_fixture(fixture) if fixture else None
+
+    results = []
+    for history in histories:
+        if history not in HISTORIES:
+            raise ValueError(f"Unknown history length: {history}")
+        days = HISTORIES[history] * TRADING_DAYS
+        if recorded is None:
+            bars = synthetic_ohlcv(days, seed=seed)
+        elif len(recorded) >= days * 0.95:
+            bars = recorded.tail(days)
+        else:
+            logger.warning(f"Fixture has {len(recorded)} bars, skipping {history}")
+            continue
+
+        # predict_prices adds random noise; keep runs comparable
+        np.random.seed(seed)
+        for stage, timing in benchmark_history(bars, timeframe, repeat).items():
+            results.append(dict(timing, history=history, rows=len(bars), stage=stage))
+
+    return {
+        'label': label,
+        'created_at': pd.Timestamp.now(tz='UTC').isoformat(),
+        'timeframe': timeframe,
+        'repeat': repeat,
+        'source': fixture or 'synthetic',
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, tolerance=0.2):
+    """Stages whose median time grew by more than `tolerance` against a baseline report"""
+    previous = {(r['history'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for row in current['results']:
+        before = previous.get((row['history'], row['stage']))
+        if before and before['median_ms'] > 0:
+            ratio = row['median_ms'] / before['median_ms']
+            if ratio > 1 + tolerance:
+                regressions.append({
+                    'history': row['history'],
+                    'stage': row['stage'],
+                    'baseline_ms': before['median_ms'],
+                    'current_ms': row['median_ms'],
+                    'ratio': ratio,
+                })
+    return regressions
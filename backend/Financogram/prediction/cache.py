@@ -0,0 +1,353 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from Financogram import mongo
+
+from .instrumentation import stage
+from .models import PredictionCache
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_CACHE_TTL = timedelta(seconds=settings.PREDICTION_CACHE_TTL)
+
+
+def prediction_cache_key(symbol, timeframe, simulation=None):
+    """Cache key for a prediction; simulated bands are cached per setting"""
+    key = f"{symbol}_{timeframe}"
+    if simulation is not None:
+        key += f"_mc_{simulation['method']}_{simulation['paths']}_{simulation['seed']}"
+    return key
+
+
+class _Flight:
+    """A computation in progress that other requests for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TieredPredictionCache:
+    """In-process LRU in front of the shared PredictionCache collection.
+
+    Entries keep the shared row's expires_at, so both tiers expire together.
+    Misses are single-flight per key: concurrent callers for a key that is
+    already being computed wait for that computation instead of starting
+    their own.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or settings.PREDICTION_CACHE_LOCAL_ENTRIES
+        self._local = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            # Misses that a peer filled before this process got to compute them
+            'late_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'computations': 0,
+            'errors': 0,
+            'evictions': 0,
+        }
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _get_local(self, key, now, stat='local_hits'):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at <= now:
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            self.stats[stat] += 1
+            return data
+
+    def _put_local(self, key, data, expires_at):
+        with self._lock:
+            self._local[key] = (data, expires_at)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def get_many(self, keys, recheck=False):
+        """Fresh entries for keys, from the local tier first and then one shared query.
+
+        With recheck, the keys already missed once and hits count as late_hits.
+        """
+        now = timezone.now()
+        found = {}
+        for key in keys:
+            data = self._get_local(key, now, 'late_hits' if recheck else 'local_hits')
+            if data is not None:
+                found[key] = data
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            with stage('cache'):
+                if mongo.enabled():
+                    rows = mongo.PredictionCacheRepository().get_many(remaining, now)
+                else:
+                    rows = list(PredictionCache.objects.filter(
+                        cache_key__in=remaining, expires_at__gt=now
+                    ).values_list('cache_key', 'cache_data', 'expires_at'))
+            for key, data, expires_at in rows:
+                found[key] = data
+                self._put_local(key, data, expires_at)
+            self._count('late_hits' if recheck else 'shared_hits', len(remaining) - len([k for k in remaining if k not in found]))
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items, ttl):
+        """Upsert entries in the shared tier and the local LRU"""
+        if mongo.enabled() and items:
+            try:
+                expires_at = mongo.PredictionCacheRepository().upsert_many(items, ttl)
+            except Exception as cache_error:
+                logger.error(f"Cache error for {', '.join(items)}: {str(cache_error)}")
+                return
+            for key, data in items.items():
+                self._put_local(key, data, expires_at)
+            return
+        for key, data in items.items():
+            try:
+                entry = PredictionCache.store(key, data, ttl)
+                self._put_local(key, data, entry.expires_at)
+            except Exception as cache_error:
+                logger.error(f"Cache error for {key}: {str(cache_error)}")
+
+    def set(self, key, data, ttl):
+        self.set_many({key: data}, ttl)
+
+    def get_or_compute_many(self, keys, compute_many, ttl):
+        """Return (results, errors) for keys, computing misses at most once per key.
+
+        compute_many(keys) must return (results, errors) dicts keyed like keys.
+        """
+        keys = list(dict.fromkeys(keys))
+        results = self.get_many(keys)
+        missing = [key for key in keys if key not in results]
+        errors = {}
+        if not missing:
+            return results, errors
+
+        leading, following = [], {}
+        with self._lock:
+            for key in missing:
+                if key in self._inflight:
+                    following[key] = self._inflight[key]
+                    self.stats['coalesced'] += 1
+                else:
+                    self._inflight[key] = _Flight()
+                    leading.append(key)
+                    self.stats['misses'] += 1
+
+        if leading:
+            flights = {key: self._inflight[key] for key in leading}
+            try:
+                # A peer may have filled the shared tier while we were checking
+                ready = self.get_many(leading, recheck=True)
+                todo = [key for key in leading if key not in ready]
+                computed, failed = ({}, {})
+                if todo:
+                    self._count('computations')
+                    computed, failed = compute_many(todo)
+                    self.set_many(computed, ttl)
+                ready.update(computed)
+                for key in leading:
+                    if key in ready:
+                        flights[key].result = ready[key]
+                    else:
+                        flights[key].error = failed.get(key, 'Prediction was not computed')
+                        self._count('errors')
+            except Exception as e:
+                for flight in flights.values():
+                    flight.error = str(e)
+                self._count('errors', len(flights))
+                raise
+            finally:
+                with self._lock:
+                    for key in leading:
+                        self._inflight.pop(key, None)
+                for flight in flights.values():
+                    flight.done.set()
+            for key, flight in flights.items():
+                if flight.error is None:
+                    results[key] = flight.result
+                else:
+                    errors[key] = flight.error
+
+        for key, flight in following.items():
+            flight.done.wait()
+            if flight.error is None:
+                results[key] = flight.result
+            else:
+                errors[key] = flight.error
+        return results, errors
+
+    def get_or_compute(self, key, compute, ttl):
+        """Single-key form: compute() returns the data or raises ValueError"""
+        def compute_one(keys):
+            return {key: compute()}, {}
+        results, errors = self.get_or_compute_many([key], compute_one, ttl)
+        if key in errors:
+            raise ValueError(errors[key])
+        return results[key]
+
+    def clear_local(self, expired_only=False):
+        now = timezone.now()
+        with self._lock:
+            if not expired_only:
+                self._local.clear()
+                return
+            for key in [k for k, (_, expires_at) in self._local.items() if expires_at <= now]:
+                del self._local[key]
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['local_entries'] = len(self._local)
+            stats['inflight'] = len(self._inflight)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 4) if lookups else None
+        return stats
+
+
+class LocalTTLCache:
+    """In-process LRU with a TTL per entry (seconds) and single-flight misses.
+
+    For data that is cheap to refetch and not worth a shared tier, such as
+    chart series and quotes.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0, 'evictions': 0}
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+            self.stats['hits'] += len(found)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items, ttl):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (value, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def set(self, key, value, ttl):
+        self.set_many({key: value}, ttl)
+
+    def get_or_compute_many(self, keys, compute_many, ttl):
+        """Return (results, errors) for keys; compute_many(missing) returns the same pair.
+
+        ttl may be a number or a function of (key, value) for per-entry TTLs.
+        """
+        keys = list(dict.fromkeys(keys))
+        results = self.get_many(keys)
+        errors = {}
+        leading, following = [], {}
+        with self._lock:
+            for key in keys:
+                if key in results:
+                    continue
+                if key in self._inflight:
+                    following[key] = self._inflight[key]
+                    self.stats['coalesced'] += 1
+                else:
+                    self._inflight[key] = _Flight()
+                    leading.append(key)
+                    self.stats['misses'] += 1
+
+        if leading:
+            flights = {key: self._inflight[key] for key in leading}
+            try:
+                computed, failed = compute_many(leading)
+                for key, value in computed.items():
+                    self.set(key, value, ttl(key, value) if callable(ttl) else ttl)
+                for key, flight in flights.items():
+                    if key in computed:
+                        flight.result = computed[key]
+                    else:
+                        flight.error = failed.get(key, 'Value was not computed')
+            except Exception as e:
+                for flight in flights.values():
+                    flight.error = str(e)
+                raise
+            finally:
+                with self._lock:
+                    for key in leading:
+                        self._inflight.pop(key, None)
+                    self.stats['errors'] += len([f for f in flights.values() if f.error is not None])
+                for flight in flights.values():
+                    flight.done.set()
+            following.update(flights)
+
+        for key, flight in following.items():
+            flight.done.wait()
+            if flight.error is None:
+                results[key] = flight.result
+            else:
+                errors[key] = flight.error
+        return results, errors
+
+    def get_or_compute(self, key, compute, ttl):
+        """Single-key form: compute() returns the value or raises"""
+        def compute_one(keys):
+            return {key: compute()}, {}
+        results, errors = self.get_or_compute_many([key], compute_one, ttl)
+        if key in errors:
+            raise ValueError(errors[key])
+        return results[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries), inflight=len(self._inflight))
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+
+prediction_cache = TieredPredictionCache()
@@ -0,0 +1,155 @@
+import json
+import struct
+
+import numpy as np
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are only offered when msgpack is installed
+    msgpack = None
+
+# Opt-in compact encoding for time series responses (charts and predictions).
+#
+# A series is {'rows', 't0', 'dtypes', 'encoding', 'columns'}: column 't' holds
+# epoch-second timestamps as int32 deltas from the previous row (the first
+# delta is 0, added to t0) and every other column is little-endian float32.
+# Column values are raw bytes; MessagePack sends them as bin fields and the
+# binary format stores them after a JSON header (see ColumnarRenderer).
+
+COLUMNAR_MEDIA_TYPE = 'application/vnd.financogram.columns'
+COLUMNAR_MAGIC = b'FGC1'
+
+
+def encode_series(timestamps, columns):
+    """Encode epoch-second timestamps and {name: values} price columns"""
+    t = np.asarray(timestamps, dtype=np.int64)
+    deltas = np.diff(t, prepend=t[:1])
+    if len(deltas) and (deltas.min() < np.iinfo(np.int32).min or deltas.max() > np.iinfo(np.int32).max):
+        raise ValueError("Timestamp gaps do not fit in int32 deltas")
+    encoded = {'t': deltas.astype('<i4').tobytes()}
+    dtypes = {'t': '<i4'}
+    for name, values in columns.items():
+        array = np.asarray(values, dtype=np.float64)
+        if len(array) != len(t):
+            raise ValueError(f"Column {name} has {len(array)} rows, expected {len(t)}")
+        encoded[name] = array.astype('<f4').tobytes()
+        dtypes[name] = '<f4'
+    return {
+        'rows': len(t),
+        't0': int(t[0]) if len(t) else 0,
+        'dtypes': dtypes,
+        'encoding': {'t': 'delta'},
+        'columns': encoded,
+    }
+
+
+def decode_series(series):
+    """Inverse of encode_series: {'t': int64 epoch seconds, name: float32 array}"""
+    decoded = {}
+    for name, raw in series['columns'].items():
+        decoded[name] = np.frombuffer(raw, dtype=series['dtypes'][name])
+    decoded['t'] = series['t0'] + np.cumsum(decoded['t'], dtype=np.int64)
+    return decoded
+
+
+def date_timestamps(dates):
+    """'YYYY-MM-DD' strings to epoch seconds at midnight UTC"""
+    return np.array(dates, dtype='datetime64[D]').astype('datetime64[s]').astype(np.int64)
+
+
+def prediction_columns(result):
+    """A prediction result with its historical and predicted series encoded"""
+    compact = {k: v for k, v in result.items() if k not in ('historical_data', 'predicted_data')}
+    historical = result['historical_data']
+    compact['historical_data'] = encode_series(
+        date_timestamps(historical['dates']), {'prices': historical['prices']})
+
+    predicted = result['predicted_data']
+    columns = {'prices': predicted['prices']}
+    bands = predicted.get('bands')
+    if bands is not None:
+        for name in ('p5', 'p50', 'p95'):
+            columns[name] = bands[name]
+        compact['simulation'] = {'method': bands['method'], 'paths': bands['paths']}
+    compact['predicted_data'] = encode_series(date_timestamps(predicted['dates']), columns)
+    return compact
+
+
+def is_compact(request):
+    """Whether content negotiation picked one of the compact renderers"""
+    return getattr(getattr(request, 'accepted_renderer', None), 'series_format', False)
+
+
+def _split_buffers(data, buffers):
+    """Copy of data with every bytes value replaced by {'$buf': [offset, length]}"""
+    if isinstance(data, bytes):
+        offset = sum(len(b) for b in buffers)
+        buffers.append(data)
+        return {'$buf': [offset, len(data)]}
+    if isinstance(data, dict):
+        return {k: _split_buffers(v, buffers) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_split_buffers(v, buffers) for v in data]
+    return data
+
+
+class ColumnarRenderer(BaseRenderer):
+    """Raw little-endian binary: b'FGC1', uint32 header length, JSON header, column buffers.
+
+    In the header each column's bytes are {'$buf': [offset, length]}, with
+    offsets counted from the end of the header.
+    """
+
+    media_type = COLUMNAR_MEDIA_TYPE
+    format = 'columns'
+    charset = None
+    render_style = 'binary'
+    series_format = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        buffers = []
+        header = json.dumps(_split_buffers(data, buffers), separators=(',', ':'), default=str).encode()
+        return b''.join([COLUMNAR_MAGIC, struct.pack('<I', len(header)), header] + buffers)
+
+
+def parse_columnar(payload):
+    """Read a ColumnarRenderer payload back into nested data with bytes values"""
+    if payload[:4] != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar payload")
+    (length,) = struct.unpack('<I', payload[4:8])
+    body = payload[8 + length:]
+
+    def restore(value):
+        if isinstance(value, dict):
+            if set(value) == {'$buf'}:
+                offset, size = value['$buf']
+                return body[offset:offset + size]
+            return {k: restore(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [restore(v) for v in value]
+        return value
+
+    return restore(json.loads(payload[8:8 + length]))
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    series_format = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True, default=str)
+
+
+COMPACT_RENDERERS = [ColumnarRenderer] + ([MessagePackRenderer] if msgpack is not None else [])
+
+# Renderer list for views that offer the compact formats next to JSON
+SERIES_RENDERERS = list(api_settings.DEFAULT_RENDERER_CLASSES) + COMPACT_RENDERERS
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+# Columns of a prepared feature matrix, in storage order
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+INDICATOR_COLUMNS = [
+    'SMA_20', 'SMA_50', 'RSI', 'MACD', 'Volatility',
+    'Price_Change', 'Price_Change_5', 'Price_Change_10',
+]
+FEATURE_COLUMNS = PRICE_COLUMNS + INDICATOR_COLUMNS
+
+# Indicators are computed in float64 and stored at this precision
+FEATURE_DTYPE = np.float32
+
+
+class FeatureMatrix:
+    """Prepared features for one symbol as a single column-major matrix.
+
+    Rows are sessions (oldest first), columns follow FEATURE_COLUMNS and
+    `dates` holds the session dates. Column lookups and row slices are views,
+    so nothing downstream copies the data.
+    """
+
+    def __init__(self, values, dates, columns=None):
+        self.values = values
+        self.dates = dates
+        self.columns = list(columns or FEATURE_COLUMNS)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return FeatureMatrix(self.values[key], self.dates[key], self.columns)
+        return self.values[:, self._index[key]]
+
+    def __contains__(self, name):
+        return name in self._index
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.dates.nbytes
+
+    def date_strings(self, start=None):
+        """Session dates from row `start` on as 'YYYY-MM-DD' strings"""
+        return np.datetime_as_string(self.dates[start:], unit='D').tolist()
+
+    def to_frame(self):
+        return pd.DataFrame(self.values, index=pd.DatetimeIndex(self.dates, name='Date'), columns=self.columns)
+
+
+def rolling_mean(x, window):
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        sums = np.cumsum(x)
+        out[window - 1] = sums[window - 1]
+        out[window:] = sums[window:] - sums[:-window]
+        out[window - 1:] /= window
+    return out
+
+
+def rolling_std(x, window):
+    """Sample standard deviation over a sliding window (ddof=1)"""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        # Centering keeps the sum-of-squares difference well conditioned
+        centered = x - x.mean()
+        s1 = rolling_mean(centered, window) * window
+        s2 = rolling_mean(centered * centered, window) * window
+        variance = (s2[window - 1:] - s1[window - 1:] ** 2 / window) / (window - 1)
+        out[window - 1:] = np.sqrt(np.maximum(variance, 0))
+    return out
+
+
+def ewm_mean(x, span):
+    """pandas ewm(span=span).mean() with adjust=True, as one IIR filter pass"""
+    decay = 1 - 2 / (span + 1)
+    a = [1, -decay]
+    return lfilter([1], a, x) / lfilter([1], a, np.ones(len(x)))
+
+
+def rsi(x, period=14):
+    """Same definition as StockPredictionEngine.calculate_rsi (simple rolling means)"""
+    delta = np.empty(len(x))
+    delta[0] = 0.0
+    np.subtract(x[1:], x[:-1], out=delta[1:])
+    gain = rolling_mean(np.maximum(delta, 0), period)
+    loss = rolling_mean(np.maximum(-delta, 0), period)
+    loss[loss == 0] = 0.0001
+    return 100 - 100 / (1 + gain / loss)
+
+
+def pct_change(x, periods=1):
+    out = np.full(len(x), np.nan)
+    out[periods:] = x[periods:] / x[:-periods] - 1
+    return out
+
+
+def session_dates(index):
+    """Local session dates of a (possibly tz-aware) DatetimeIndex"""
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.values.astype('datetime64[D]')
+
+
+def assemble(columns, dates, dtype=FEATURE_DTYPE):
+    """Pack float64 column arrays into a FeatureMatrix, keeping only complete rows"""
+    arrays = [columns[name] for name in FEATURE_COLUMNS]
+    complete = np.ones(len(dates), dtype=bool)
+    for array in arrays:
+        complete &= np.isfinite(array)
+    # Warm-up rows are a prefix; only fall back to a mask when there are holes
+    first = int(complete.argmax()) if complete.any() else len(dates)
+    rows = slice(first, None) if complete[first:].all() else complete
+
+    values = np.empty((int(complete.sum()), len(arrays)), dtype=dtype, order='F')
+    for j, array in enumerate(arrays):
+        values[:, j] = array[rows]
+    return FeatureMatrix(values, dates[rows])
+
+
+def build_feature_matrix(data, dtype=FEATURE_DTYPE):
+    """Compute every feature of prepare_features from an OHLCV DataFrame in one pass"""
+    close = data['Close'].to_numpy(dtype=np.float64)
+    if not np.isfinite(close).all():
+        # Sessions without a close carry no information for any indicator
+        data = data[np.isfinite(close)]
+        close = data['Close'].to_numpy(dtype=np.float64)
+    columns = {name: data[name].to_numpy(dtype=np.float64) for name in PRICE_COLUMNS}
+    columns.update({
+        'SMA_20': rolling_mean(close, 20),
+        'SMA_50': rolling_mean(close, 50),
+        'RSI': rsi(close, 14),
+        'MACD': ewm_mean(close, 12) - ewm_mean(close, 26),
+        'Volatility': rolling_std(close, 20),
+        'Price_Change': pct_change(close, 1),
+        'Price_Change_5': pct_change(close, 5),
+        'Price_Change_10': pct_change(close, 10),
+    })
+    return assemble(columns, session_dates(data.index), dtype)
@@ -0,0 +1,448 @@
+import copy
+import json
+import math
+import os
+import tempfile
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+from django.conf import settings
+
+from .bar_store import BAR_COLUMNS, get_bar_store
+from .features import FEATURE_DTYPE, INDICATOR_COLUMNS, FeatureMatrix, build_feature_matrix, session_dates
+
+# Streaming counterparts of StockPredictionEngine.prepare_features.
+# Every indicator updates in O(1) per bar and round-trips through JSON, and
+# produces the same values as the pandas batch code within float tolerance.
+
+
+class SMA:
+    """Simple moving average (pandas rolling(window).mean())"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+
+    def update(self, x):
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(x)
+        self.total += x
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.values) < self.window:
+            return None
+        return self.total / self.window
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values), 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls(state['window'])
+        obj.values.extend(state['values'])
+        obj.total = state['total']
+        return obj
+
+
+class RollingStd:
+    """Sample standard deviation over a sliding window (pandas rolling(window).std())"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        if len(self.values) < self.window:
+            # Welford growth phase
+            self.values.append(x)
+            delta = x - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (x - self.mean)
+        else:
+            # Replace the oldest value in place
+            old = self.values[0]
+            self.values.append(x)
+            old_mean = self.mean
+            self.mean += (x - old) / self.window
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.values) < self.window:
+            return None
+        return math.sqrt(max(self.m2, 0.0) / (self.window - 1))
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values), 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls(state['window'])
+        obj.values.extend(state['values'])
+        obj.mean = state['mean']
+        obj.m2 = state['m2']
+        return obj
+
+
+class EMA:
+    """Exponential moving average (pandas ewm(span=span).mean(), adjust=True)"""
+
+    def __init__(self, span):
+        self.span = span
+        self.decay = 1 - 2 / (span + 1)
+        self.numerator = 0.0
+        self.denominator = 0.0
+
+    def update(self, x):
+        self.numerator = x + self.decay * self.numerator
+        self.denominator = 1 + self.decay * self.denominator
+        return self.value
+
+    @property
+    def value(self):
+        if not self.denominator:
+            return None
+        return self.numerator / self.denominator
+
+    def to_dict(self):
+        return {'span': self.span, 'numerator': self.numerator, 'denominator': self.denominator}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls(state['span'])
+        obj.numerator = state['numerator']
+        obj.denominator = state['denominator']
+        return obj
+
+
+class RSI:
+    """RSI as computed by StockPredictionEngine.calculate_rsi.
+
+    The batch version averages gains and losses with a simple rolling mean
+    (not Wilder smoothing) and treats the first, undefined change as zero;
+    this keeps that definition so both paths agree.
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.gains = SMA(period)
+        self.losses = SMA(period)
+        self.previous = None
+
+    def update(self, x):
+        delta = 0.0 if self.previous is None else x - self.previous
+        self.previous = x
+        self.gains.update(max(delta, 0.0))
+        self.losses.update(max(-delta, 0.0))
+        return self.value
+
+    @property
+    def value(self):
+        gain, loss = self.gains.value, self.losses.value
+        if gain is None:
+            return None
+        rs = gain / (loss if loss != 0 else 0.0001)
+        return 100 - (100 / (1 + rs))
+
+    def to_dict(self):
+        return {'period': self.period, 'gains': self.gains.to_dict(),
+                'losses': self.losses.to_dict(), 'previous': self.previous}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls(state['period'])
+        obj.gains = SMA.from_dict(state['gains'])
+        obj.losses = SMA.from_dict(state['losses'])
+        obj.previous = state['previous']
+        return obj
+
+
+class MACD:
+    """MACD line (fast EMA - slow EMA), as returned by calculate_macd"""
+
+    def __init__(self, fast=12, slow=26):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+
+    def update(self, x):
+        self.fast.update(x)
+        self.slow.update(x)
+        return self.value
+
+    @property
+    def value(self):
+        if self.fast.value is None:
+            return None
+        return self.fast.value - self.slow.value
+
+    def to_dict(self):
+        return {'fast': self.fast.to_dict(), 'slow': self.slow.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls.__new__(cls)
+        obj.fast = EMA.from_dict(state['fast'])
+        obj.slow = EMA.from_dict(state['slow'])
+        return obj
+
+
+class PctChange:
+    """Percentage change over `periods` bars (pandas pct_change(periods))"""
+
+    def __init__(self, periods=1):
+        self.periods = periods
+        self.values = deque(maxlen=periods + 1)
+
+    def update(self, x):
+        self.values.append(x)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.values) <= self.periods:
+            return None
+        return self.values[-1] / self.values[0] - 1
+
+    def to_dict(self):
+        return {'periods': self.periods, 'values': list(self.values)}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls(state['periods'])
+        obj.values.extend(state['values'])
+        return obj
+
+
+INDICATOR_TYPES = {cls.__name__: cls for cls in (SMA, RollingStd, EMA, RSI, MACD, PctChange)}
+
+
+def default_indicators():
+    """The feature set built by StockPredictionEngine.prepare_features"""
+    return {
+        'SMA_20': SMA(20),
+        'SMA_50': SMA(50),
+        'RSI': RSI(14),
+        'MACD': MACD(12, 26),
+        'Volatility': RollingStd(20),
+        'Price_Change': PctChange(1),
+        'Price_Change_5': PctChange(5),
+        'Price_Change_10': PctChange(10),
+    }
+
+
+class FeatureState:
+    """All streaming indicators for one symbol/interval plus the last bar consumed"""
+
+    def __init__(self, indicators=None, last_timestamp=None):
+        self.indicators = indicators or default_indicators()
+        self.last_timestamp = last_timestamp
+
+    def update(self, timestamp, close):
+        """Consume one closing price and return the current feature values"""
+        close = float(close)
+        values = {name: indicator.update(close) for name, indicator in self.indicators.items()}
+        self.last_timestamp = int(timestamp)
+        return values
+
+    def update_many(self, timestamps, closes):
+        values = None
+        for timestamp, close in zip(timestamps, closes):
+            values = self.update(timestamp, close)
+        return values
+
+    @property
+    def values(self):
+        return {name: indicator.value for name, indicator in self.indicators.items()}
+
+    def to_dict(self):
+        return {
+            'last_timestamp': self.last_timestamp,
+            'indicators': {
+                name: {'type': type(indicator).__name__, 'state': indicator.to_dict()}
+                for name, indicator in self.indicators.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        indicators = {
+            name: INDICATOR_TYPES[item['type']].from_dict(item['state'])
+            for name, item in state['indicators'].items()
+        }
+        return cls(indicators, state.get('last_timestamp'))
+
+
+def _state_path(store, symbol, interval):
+    return os.path.join(store.series_dir(symbol, interval), 'indicators.json')
+
+
+def load_feature_state(symbol, interval='1d', store=None):
+    store = store or get_bar_store()
+    try:
+        with open(_state_path(store, symbol, interval)) as f:
+            return FeatureState.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return FeatureState()
+
+
+def save_feature_state(state, symbol, interval='1d', store=None):
+    store = store or get_bar_store()
+    path = _state_path(store, symbol, interval)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state.to_dict(), f)
+    os.replace(tmp, path)
+
+
+def refresh_features(symbol, interval='1d', store=None):
+    """Latest feature values for a symbol, consuming only bars not seen before.
+
+    The persisted state stops one bar short of the newest stored bar, because
+    the newest bar may still be in progress and get replaced by the next delta
+    fetch; it is applied to a throwaway copy instead.
+    """
+    store = store or get_bar_store()
+    state = load_feature_state(symbol, interval, store)
+    start = None if state.last_timestamp is None else state.last_timestamp + 1
+    bars = store.read(symbol, interval, start=start)
+    if not len(bars):
+        return state.values
+
+    closes = bars.column('Close')
+    if len(bars) > 1:
+        state.update_many(bars.timestamps[:-1], closes[:-1])
+        save_feature_state(state, symbol, interval, store)
+
+    latest = copy.deepcopy(state)
+    values = latest.update(bars.timestamps[-1], closes[-1])
+    values['Close'] = float(closes[-1])
+    values['timestamp'] = int(bars.timestamps[-1])
+    return values
+
+
+def stream_features(closes):
+    """Run the streaming indicators over a price array; returns a dict of arrays"""
+    state = FeatureState()
+    out = {name: np.full(len(closes), np.nan) for name in state.indicators}
+    for i, close in enumerate(closes):
+        for name, value in state.update(i, close).items():
+            if value is not None:
+                out[name][i] = value
+    return out
+
+
+CLOSE = BAR_COLUMNS.index('Close')
+# More new bars than this are cheaper to rebuild in one batch pass than to stream
+MAX_STREAMED_BARS = 64
+
+
+class IncrementalFeatures:
+    """Prepared features of one trailing window, advanced by streaming new bars.
+
+    The window is built once with build_feature_matrix while a FeatureState
+    replays its closes. After that only the bars stored since go through the
+    state, and their rows are appended while rows that left the window are
+    dropped. As in refresh_features, the state stops one bar short of the
+    newest bar, whose row is recomputed on a copy every time.
+    """
+
+    def __init__(self, bars):
+        matrix = build_feature_matrix(bars.to_frame(), np.float64)
+        # Rows prepare_features drops before every indicator is defined
+        self.warmup = len(bars) - len(matrix)
+        self.values = matrix.values[:-1]
+        self.dates = matrix.dates[:-1]
+        self.state = FeatureState()
+        self.state.update_many(bars.timestamps[:-1], bars.column('Close')[:-1])
+        self.start = int(bars.timestamps[0])
+        self.last_close = float(bars.values[-2, CLOSE])
+
+    @staticmethod
+    def _row(state, timestamp, bar):
+        features = state.update(timestamp, bar[CLOSE])
+        return np.concatenate([bar, [features[name] for name in INDICATOR_COLUMNS]])
+
+    def advance(self, bars, dtype=FEATURE_DTYPE):
+        """The FeatureMatrix of window bars, or None when the window cannot be reached by streaming"""
+        timestamps = bars.timestamps
+        pos = int(np.searchsorted(timestamps, self.state.last_timestamp))
+        new = len(bars) - pos - 1
+        if (timestamps[0] < self.start or new < 1 or new > MAX_STREAMED_BARS
+                or timestamps[pos] != self.state.last_timestamp
+                or bars.values[pos, CLOSE] != self.last_close
+                or not np.isfinite(bars.values[pos + 1:]).all()):
+            # Backfilled, rewritten or too far ahead
+            return None
+
+        if new > 1:
+            rows = [self._row(self.state, ts, bar) for ts, bar in zip(timestamps[pos + 1:-1], bars.values[pos + 1:-1])]
+            self.values = np.concatenate([self.values, rows])
+            self.dates = np.concatenate([self.dates, session_dates(bars.index()[pos + 1:-1])])
+            self.last_close = float(bars.values[-2, CLOSE])
+        latest = self._row(copy.deepcopy(self.state), timestamps[-1], bars.values[-1])
+
+        keep = len(bars) - self.warmup - 1
+        self.values = self.values[len(self.values) - keep:]
+        self.dates = self.dates[len(self.dates) - keep:]
+        self.start = int(timestamps[0])
+
+        values = np.empty((keep + 1, len(latest)), dtype=dtype, order='F')
+        values[:keep] = self.values
+        values[keep] = latest
+        return FeatureMatrix(values, np.append(self.dates, session_dates(bars.index()[-1:])))
+
+
+class FeatureCache:
+    """Process-wide IncrementalFeatures per series window, least recently used evicted first.
+
+    The cache lock only guards the table; building and advancing an entry
+    happens under that entry's own lock, so a rebuild of one series does not
+    hold up predictions for the others.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or settings.FEATURE_CACHE_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'streamed': 0, 'rebuilt': 0}
+
+    def features(self, key, bars, dtype=FEATURE_DTYPE):
+        """Prepared features of bars, the current window of the series identified by key"""
+        if len(bars) <= 50 or not np.isfinite(bars.values).all():
+            # Too short to keep rows, or holes the batch path has to drop
+            return build_feature_matrix(bars.to_frame(), dtype)
+        with self._lock:
+            slot = self._entries.get(key)
+            if slot is None:
+                slot = self._entries[key] = {'lock': threading.Lock(), 'entry': None}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        with slot['lock']:
+            entry = slot['entry']
+            matrix = entry.advance(bars, dtype) if entry is not None else None
+            stat = 'streamed'
+            if matrix is None:
+                slot['entry'] = entry = IncrementalFeatures(bars)
+                matrix = entry.advance(bars, dtype)
+                stat = 'rebuilt'
+        with self._lock:
+            self.stats[stat] += 1
+        return matrix
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+feature_cache = FeatureCache()
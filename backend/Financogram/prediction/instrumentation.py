@@ -0,0 +1,187 @@
+import bisect
+import contextvars
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Per-stage wall time and allocation tracking for the prediction pipeline.
+# Every stage feeds a process-wide histogram; inside a request the stages
+# are also collected so ServerTimingMiddleware can report them.
+
+# Upper bucket bounds in milliseconds; the last bucket is unbounded
+BUCKET_BOUNDS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_trace = contextvars.ContextVar('prediction_trace', default=None)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with bucket-resolution percentiles"""
+
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.alloc_total = 0.0
+        self.alloc_max = 0.0
+
+    def observe(self, duration_ms, alloc_kib=None):
+        self.counts[bisect.bisect_left(self.bounds, duration_ms)] += 1
+        self.count += 1
+        self.total += duration_ms
+        self.max = max(self.max, duration_ms)
+        if alloc_kib is not None:
+            self.alloc_total += alloc_kib
+            self.alloc_max = max(self.alloc_max, alloc_kib)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (the max for the open bucket)"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else None,
+            'max_ms': self.max,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'alloc_mean_kib': self.alloc_total / self.count if self.count and tracing_allocations() else None,
+            'alloc_max_kib': self.alloc_max if tracing_allocations() else None,
+            'buckets': {
+                **{str(bound): count for bound, count in zip(self.bounds, self.counts)},
+                '+Inf': self.counts[-1],
+            },
+        }
+
+
+class StageMetrics:
+    """Histograms for every stage name seen in this process"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, duration_ms, alloc_kib=None):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(duration_ms, alloc_kib)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: histogram.to_dict() for name, histogram in sorted(self._histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+stage_metrics = StageMetrics()
+
+
+def tracing_allocations():
+    return settings.PREDICTION_TRACE_ALLOCATIONS and tracemalloc.is_tracing()
+
+
+def start_allocation_tracing():
+    """Turn on tracemalloc when PREDICTION_TRACE_ALLOCATIONS is set (adds overhead to every allocation)"""
+    if settings.PREDICTION_TRACE_ALLOCATIONS and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage and, with tracing on, the memory it allocates.
+
+    Allocation figures come from the process-wide tracemalloc counters, so
+    they are approximate while other threads are allocating too.
+    """
+    tracing = tracing_allocations()
+    if tracing:
+        start_current, start_peak = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        alloc_kib = None
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            alloc_kib = max(current - start_current, peak - start_peak, 0) / 1024
+        stage_metrics.observe(name, duration_ms, alloc_kib)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, duration_ms, alloc_kib))
+
+
+def start_trace():
+    """Begin collecting stages for the current request; returns a token for end_trace"""
+    return _trace.set([])
+
+
+def end_trace(token):
+    trace = _trace.get()
+    _trace.reset(token)
+    return trace or []
+
+
+def server_timing(trace):
+    """Server-Timing header value; repeated stages (e.g. in batch requests) are summed"""
+    totals = {}
+    for name, duration_ms, alloc_kib in trace:
+        total = totals.setdefault(name, [0.0, None])
+        total[0] += duration_ms
+        if alloc_kib is not None:
+            total[1] = (total[1] or 0.0) + alloc_kib
+    parts = []
+    for name, (duration_ms, alloc_kib) in totals.items():
+        part = f"{name};dur={duration_ms:.2f}"
+        if alloc_kib is not None:
+            part += f';desc="alloc {alloc_kib:.0f}KiB"'
+        parts.append(part)
+    return ', '.join(parts)
+
+
+class ServerTimingMiddleware:
+    """Collect the stages run while handling a request and report them in Server-Timing.
+
+    DRF responses are rendered after the view returns; the time from
+    process_template_response to the end of rendering is the serialization
+    stage.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_trace()
+        try:
+            response = self.get_response(request)
+            render_started = getattr(request, '_render_started', None)
+            if render_started is not None and _trace.get():
+                duration_ms = (time.perf_counter() - render_started) * 1000
+                stage_metrics.observe('serialization', duration_ms)
+                _trace.get().append(('serialization', duration_ms, None))
+        finally:
+            trace = end_trace(token)
+        if trace:
+            response['Server-Timing'] = server_timing(trace)
+        return response
+
+    def process_template_response(self, request, response):
+        request._render_started = time.perf_counter()
+        return response
@@ -0,0 +1,50 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from prediction.backtest import run_backtest
+from prediction.prediction_engine import AVAILABLE_STOCKS
+
+
+class Command(BaseCommand):
+    help = 'Walk-forward backtest of the trend/recommendation logic over the stock universe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', default=AVAILABLE_STOCKS)
+        parser.add_argument('--period', default='5y')
+        parser.add_argument('--timeframes', nargs='+', default=['1d', '1w', '1m'], choices=['1d', '1w', '1m'])
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--json', dest='json_path', help='Write the full report to this file')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = run_backtest(
+            [s.upper() for s in options['symbols']],
+            period=options['period'],
+            timeframes=options['timeframes'],
+            workers=options['workers'],
+        )
+        elapsed = time.perf_counter() - started
+
+        def pct(value):
+            return '-' if value is None else f"{value:.1f}"
+
+        self.stdout.write(f"{'Symbol':<8}{'TF':<4}{'Signals':>8}{'Trend hit':>10}{'Trades':>8}"
+                          f"{'Trade hit':>10}{'Strategy %':>11}{'B&H %':>9}{'Max DD %':>10}")
+        for row in rows:
+            if 'error' in row:
+                self.stdout.write(self.style.WARNING(f"{row['symbol']:<8}error: {row['error']}"))
+                continue
+            hit = lambda v: pct(v * 100 if v is not None else None)
+            self.stdout.write(
+                f"{row['symbol']:<8}{row['timeframe']:<4}{row['signals']:>8}{hit(row['trend_hit_rate']):>10}"
+                f"{row['trades']:>8}{hit(row['trade_hit_rate']):>10}{pct(row['strategy_return']):>11}"
+                f"{pct(row['buy_and_hold_return']):>9}{pct(row['max_drawdown']):>10}"
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'period': options['period'], 'elapsed_seconds': elapsed, 'results': rows}, f, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(f"Backtested {len(options['symbols'])} symbols in {elapsed:.2f}s"))
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.benchmark import HISTORIES, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Offline benchmark of the prediction pipeline on synthetic or recorded bars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--histories', nargs='+', default=list(HISTORIES), choices=list(HISTORIES))
+        parser.add_argument('--timeframe', default='1w', choices=['1d', '1w', '1m'])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--fixture', help='CSV of recorded bars (history().to_csv()) instead of synthetic data')
+        parser.add_argument('--label', help='Name for this run, e.g. a version or commit')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--compare', help='Baseline JSON report to check for regressions')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed median slowdown against the baseline (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        report = run_benchmarks(
+            histories=options['histories'],
+            timeframe=options['timeframe'],
+            repeat=options['repeat'],
+            fixture=options['fixture'],
+            label=options['label'],
+        )
+
+        self.stdout.write(f"{'History':<8}{'Rows':>6}  {'Stage':<22}{'Min ms':>9}{'Median ms':>11}{'Peak KiB':>10}")
+        for row in report['results']:
+            self.stdout.write(
+                f"{row['history']:<8}{row['rows']:>6}  {row['stage']:<22}{row['min_ms']:>9.3f}"
+                f"{row['median_ms']:>11.3f}{row['peak_kib']:>10.1f}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                regressions = compare(json.load(f), report, options['tolerance'])
+            for row in regressions:
+                self.stdout.write(self.style.WARNING(
+                    f"{row['history']} {row['stage']}: {row['baseline_ms']:.3f} -> {row['current_ms']:.3f} ms "
+                    f"(x{row['ratio']:.2f})"
+                ))
+            if regressions:
+                raise CommandError(f"{len(regressions)} stage(s) slower than the baseline")
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from prediction.market_data import record_fixtures
+from prediction.prediction_engine import AVAILABLE_STOCKS
+
+
+class Command(BaseCommand):
+    help = 'Record Yahoo Finance bars and info as fixtures for MARKET_DATA_PROVIDER=replay'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='+', default=AVAILABLE_STOCKS)
+        parser.add_argument('--intervals', nargs='+', default=['1d'])
+        parser.add_argument('--period', default='max', help='History to record for daily and longer intervals')
+        parser.add_argument('--root', help='Fixture directory (default: MARKET_DATA_FIXTURES_DIR)')
+
+    def handle(self, *args, **options):
+        recorded = record_fixtures(
+            [s.upper() for s in options['symbols']],
+            root=options['root'],
+            intervals=options['intervals'],
+            period=options['period'],
+        )
+        failed = [symbol for symbol, ok in recorded.items() if not ok]
+        for symbol in failed:
+            self.stdout.write(self.style.WARNING(f"{symbol}: recording failed"))
+        self.stdout.write(self.style.SUCCESS(f"Recorded {len(recorded) - len(failed)} of {len(recorded)} symbols"))
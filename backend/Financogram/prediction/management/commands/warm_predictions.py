@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from prediction.warmer import PredictionWarmer
+
+
+class Command(BaseCommand):
+    help = 'Recompute cached predictions for every stock and timeframe before they expire'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single refresh cycle and exit')
+        parser.add_argument('--interval', type=int, default=None, help='Seconds between cycles')
+        parser.add_argument('--concurrency', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--refresh-ahead', type=int, default=None, help='Seconds before expiry to refresh')
+
+    def handle(self, *args, **options):
+        refresh_ahead = options['refresh_ahead']
+        warmer = PredictionWarmer(
+            refresh_ahead=timedelta(seconds=refresh_ahead) if refresh_ahead else None,
+            max_concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+        )
+        if options['once']:
+            batches = warmer.run_once()
+            stats = warmer.snapshot()
+            self.stdout.write(self.style.SUCCESS(
+                f"Refreshed {stats['refreshed']} predictions in {batches} batches "
+                f"({stats['failed']} failed, avg lag {stats['avg_lag_seconds']})"
+            ))
+            return
+
+        self.stdout.write('Prediction warmer running, press Ctrl+C to stop')
+        try:
+            warmer.run_forever(options['interval'])
+        except KeyboardInterrupt:
+            warmer.stop()
@@ -0,0 +1,99 @@
+import asyncio
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .market_data import get_market_data
+
+logger = logging.getLogger(__name__)
+
+
+class MarketDataClient:
+    """Shared fan-out client for market data lookups.
+
+    One asyncio loop runs on a daemon thread for the whole process. Blocking
+    provider calls run on a persistent thread pool whose size is the global
+    concurrency limit, so concurrent requests queue for the same workers
+    instead of each starting its own pool. Every fan-out has a deadline.
+    Lookups still running at the deadline are dropped from the response;
+    lookups still queued are cancelled before they start.
+    """
+
+    def __init__(self, max_concurrency=None, deadline=None):
+        self.max_concurrency = max_concurrency or settings.MARKET_DATA_MAX_CONCURRENCY
+        self.deadline = deadline or settings.MARKET_DATA_DEADLINE
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='market-data')
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(target=self._loop.run_forever, name='market-data-loop', daemon=True)
+        self._thread.start()
+        self.stats = {'calls': 0, 'failed': 0, 'timed_out': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                self.stats[name] += n
+
+    async def _gather(self, func, keys, deadline):
+        loop = asyncio.get_running_loop()
+        tasks = {loop.run_in_executor(None, func, key): key for key in keys}
+        if not tasks:
+            return {}, {}, []
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+
+        results, errors = {}, {}
+        for task in done:
+            key = tasks[task]
+            try:
+                results[key] = task.result()
+            except Exception as e:
+                errors[key] = str(e)
+        timed_out = [tasks[task] for task in pending]
+        self._count(calls=len(tasks), failed=len(errors), timed_out=len(timed_out))
+        if timed_out:
+            logger.warning(f"Market data deadline of {deadline}s passed for {', '.join(map(str, timed_out))}")
+        return results, errors, timed_out
+
+    def map(self, func, keys, deadline=None):
+        """Run func(key) for every key concurrently; returns (results, errors, timed_out)"""
+        deadline = self.deadline if deadline is None else deadline
+        future = asyncio.run_coroutine_threadsafe(self._gather(func, list(keys), deadline), self._loop)
+        return future.result()
+
+    async def amap(self, func, keys, deadline=None):
+        """Awaitable map() for async views running on another event loop"""
+        deadline = self.deadline if deadline is None else deadline
+        future = asyncio.run_coroutine_threadsafe(self._gather(func, list(keys), deadline), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def quotes(self, symbols, deadline=None):
+        provider = get_market_data()
+        return self.map(provider.quote, symbols, deadline)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, max_concurrency=self.max_concurrency, deadline=self.deadline)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_market_client():
+    """Process-wide MarketDataClient"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MarketDataClient()
+            atexit.register(_client.close)
+        return _client
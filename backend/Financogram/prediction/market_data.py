@@ -0,0 +1,317 @@
+import json
+import logging
+import os
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+INTRADAY_MINUTES = {'1m': 1, '5m': 5, '15m': 15, '30m': 30, '1h': 60}
+
+
+def slice_period(frame, period=None, start=None):
+    """Trailing window of a bar frame, using the same period strings as Yahoo"""
+    if start is not None:
+        return frame[frame.index >= pd.Timestamp(start, tz=frame.index.tz)]
+    if frame.empty or not period or period == 'max':
+        return frame
+    last = frame.index[-1]
+    if period == 'ytd':
+        begin = last.normalize().replace(month=1, day=1)
+    elif period.endswith('d') and period[:-1].isdigit():
+        sessions = frame.index.normalize().unique()
+        begin = sessions[max(0, len(sessions) - int(period[:-1]))]
+    elif period.endswith('mo') and period[:-2].isdigit():
+        begin = last - pd.DateOffset(months=int(period[:-2]))
+    elif period.endswith('wk') and period[:-2].isdigit():
+        begin = last - pd.DateOffset(weeks=int(period[:-2]))
+    elif period.endswith('y') and period[:-1].isdigit():
+        begin = last - pd.DateOffset(years=int(period[:-1]))
+    else:
+        raise ValueError(f"Unsupported period: {period}")
+    return frame[frame.index >= begin]
+
+
+def quote_from_info(symbol, info):
+    """The handful of fields list views need, from a Yahoo-style info dict"""
+    previous_close = info.get('regularMarketPreviousClose') or info.get('previousClose')
+    return {
+        'symbol': symbol,
+        'name': info.get('shortName') or symbol,
+        'price': info.get('regularMarketPrice'),
+        'previous_close': previous_close,
+        'currency': info.get('currency'),
+        'exchange': info.get('exchange'),
+    }
+
+
+class MarketDataProvider:
+    """Source of bars, quotes and company info.
+
+    history() returns a DataFrame shaped like yfinance Ticker.history()
+    (tz-aware DatetimeIndex, OHLCV columns); info() returns a dict with
+    Yahoo's info keys.
+    """
+
+    name = None
+
+    def history(self, symbol, interval='1d', period=None, start=None):
+        raise NotImplementedError
+
+    def history_many(self, symbols, interval='1d', period=None, start=None):
+        frames = {}
+        for symbol in symbols:
+            try:
+                frames[symbol] = self.history(symbol, interval, period=period, start=start)
+            except Exception as e:
+                logger.warning(f"{self.name}: history failed for {symbol}: {str(e)}")
+        return frames
+
+    def info(self, symbol):
+        raise NotImplementedError
+
+    def quote(self, symbol):
+        return quote_from_info(symbol, self.info(symbol))
+
+
+class YahooProvider(MarketDataProvider):
+    """Live data from Yahoo Finance through yfinance"""
+
+    name = 'yahoo'
+
+    def history(self, symbol, interval='1d', period=None, start=None):
+        import yfinance as yf
+        if start is not None:
+            return yf.Ticker(symbol).history(start=start, interval=interval)
+        return yf.Ticker(symbol).history(period=period or '1mo', interval=interval)
+
+    def history_many(self, symbols, interval='1d', period=None, start=None):
+        """Several symbols with one Yahoo Finance request"""
+        import yfinance as yf
+        kwargs = {'start': start} if start is not None else {'period': period or '1mo'}
+        data = yf.download(
+            list(symbols), interval=interval, group_by='ticker',
+            auto_adjust=True, actions=False, ignore_tz=False, progress=False, threads=True, **kwargs
+        )
+        frames = {}
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                frame = data[symbol]
+            else:
+                frame = data
+            frames[symbol] = frame.dropna(how='all')
+        return frames
+
+    def info(self, symbol):
+        import yfinance as yf
+        return yf.Ticker(symbol).info
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serves fixtures recorded with record_fixtures().
+
+    Layout: <root>/<SYMBOL>/<interval>.csv (history().to_csv()) and
+    <root>/<SYMBOL>/info.json. Periods are measured back from the last
+    recorded bar, so a recording replays the same way on any day.
+    """
+
+    name = 'replay'
+
+    def __init__(self, root=None):
+        self.root = str(root or settings.MARKET_DATA_FIXTURES_DIR)
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, name):
+        return os.path.join(self.root, symbol.upper().replace('/', '_'), name)
+
+    def _load(self, symbol, interval):
+        path = self._path(symbol, f'{interval}.csv')
+        with self._lock:
+            frame = self._frames.get(path)
+        if frame is None:
+            if not os.path.exists(path):
+                raise ValueError(f"No recorded {interval} bars for {symbol}")
+            frame = pd.read_csv(path, index_col=0)
+            frame.index = pd.to_datetime(frame.index, utc=True).tz_convert(
+                self._read_info(symbol).get('exchangeTimezoneName', 'America/New_York'))
+            frame.index.name = 'Date'
+            frame = frame[OHLCV_COLUMNS].astype(float)
+            with self._lock:
+                self._frames[path] = frame
+        return frame
+
+    def _read_info(self, symbol):
+        try:
+            with open(self._path(symbol, 'info.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def history(self, symbol, interval='1d', period=None, start=None):
+        return slice_period(self._load(symbol, interval), period, start).copy()
+
+    def info(self, symbol):
+        info = self._read_info(symbol)
+        if not info:
+            raise ValueError(f"No recorded info for {symbol}")
+        return info
+
+
+class SyntheticProvider(MarketDataProvider):
+    """Deterministic random-walk market data for any symbol, with no I/O.
+
+    Daily bars start on 2000-01-03 and are seeded by symbol, so past bars
+    never change between calls and delta fetches line up.
+    """
+
+    name = 'synthetic'
+    tz = 'America/New_York'
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        # Per-instance caches: a decorated method would keep every provider alive in one shared cache
+        self._daily = lru_cache(maxsize=256)(self._build_daily)
+        self._intraday = lru_cache(maxsize=64)(self._build_intraday)
+
+    def _rng(self, *parts):
+        return np.random.default_rng([self.seed] + [zlib.crc32(str(p).encode()) for p in parts])
+
+    def _build_daily(self, symbol, today):
+        index = pd.bdate_range('2000-01-03', today, tz=self.tz, name='Date')
+        days = len(index)
+        # One stream per column, so adding a day leaves earlier bars unchanged
+        start_price = self._rng(symbol, 'start').uniform(20, 500)
+        close = start_price * np.exp(np.cumsum(self._rng(symbol, 'close').normal(0.0001, 0.017, days)))
+        spread = np.abs(self._rng(symbol, 'spread').normal(0, 0.008, days))
+        return pd.DataFrame({
+            'Open': close * (1 + self._rng(symbol, 'open').normal(0, 0.004, days)),
+            'High': close * (1 + spread),
+            'Low': close * (1 - spread),
+            'Close': close,
+            'Volume': self._rng(symbol, 'volume').integers(500_000, 40_000_000, days).astype(float),
+        }, index=index)
+
+    def _build_intraday(self, symbol, interval, today, sessions=60):
+        daily = self._daily(symbol, today).tail(sessions)
+        minutes = INTRADAY_MINUTES[interval]
+        steps = 390 // minutes
+        frames = []
+        for day, bar in daily.iterrows():
+            rng = self._rng(symbol, interval, day.date())
+            # Random walk from the open that is pulled onto the day's close
+            walk = np.cumsum(rng.normal(0, 0.002, steps))
+            walk -= np.linspace(0, walk[-1], steps)
+            close = bar['Open'] + (bar['Close'] - bar['Open']) * np.linspace(1 / steps, 1, steps)
+            close = close * (1 + walk)
+            index = pd.date_range(day + pd.Timedelta(hours=9, minutes=30), periods=steps,
+                                  freq=f'{minutes}min', name='Date')
+            opens = np.concatenate([[bar['Open']], close[:-1]])
+            frames.append(pd.DataFrame({
+                'Open': opens,
+                'High': np.maximum(opens, close) * 1.0005,
+                'Low': np.minimum(opens, close) * 0.9995,
+                'Close': close,
+                'Volume': np.full(steps, bar['Volume'] / steps),
+            }, index=index))
+        return pd.concat(frames)
+
+    def _bars(self, symbol, interval):
+        today = pd.Timestamp.now(tz=self.tz).strftime('%Y-%m-%d')
+        if interval in INTRADAY_MINUTES:
+            return self._intraday(symbol.upper(), interval, today)
+        daily = self._daily(symbol.upper(), today)
+        if interval == '1d':
+            return daily
+        rule = {'1wk': 'W-FRI', '1mo': 'M'}.get(interval)
+        if rule is None:
+            raise ValueError(f"Unsupported interval: {interval}")
+        return daily.resample(rule).agg({
+            'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'
+        }).dropna()
+
+    def history(self, symbol, interval='1d', period=None, start=None):
+        return slice_period(self._bars(symbol, interval), period or '1mo', start).copy()
+
+    def info(self, symbol):
+        daily = self._bars(symbol, '1d')
+        year = daily.tail(252)
+        last, previous = daily.iloc[-1], daily.iloc[-2]
+        rng = self._rng(symbol, 'info')
+        return {
+            'symbol': symbol,
+            'shortName': symbol,
+            'currency': 'USD',
+            'exchange': 'SYN',
+            'country': 'Synthetic',
+            'exchangeTimezoneName': self.tz,
+            'regularMarketPrice': round(float(last['Close']), 2),
+            'regularMarketPreviousClose': round(float(previous['Close']), 2),
+            'previousClose': round(float(previous['Close']), 2),
+            'dayLow': round(float(last['Low']), 2),
+            'dayHigh': round(float(last['High']), 2),
+            'fiftyTwoWeekLow': round(float(year['Low'].min()), 2),
+            'fiftyTwoWeekHigh': round(float(year['High'].max()), 2),
+            'averageVolume': int(year['Volume'].mean()),
+            'marketCap': int(last['Close'] * rng.uniform(1e8, 3e9)),
+            'trailingPE': round(float(rng.uniform(8, 60)), 2),
+            'dividendYield': round(float(rng.uniform(0, 0.04)), 4),
+        }
+
+
+PROVIDERS = {
+    'yahoo': YahooProvider,
+    'replay': ReplayProvider,
+    'synthetic': SyntheticProvider,
+}
+
+_provider = None
+
+
+def get_market_data():
+    """Process-wide provider chosen by settings.MARKET_DATA_PROVIDER"""
+    global _provider
+    if _provider is None:
+        name = settings.MARKET_DATA_PROVIDER
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown market data provider: {name}")
+        _provider = PROVIDERS[name]()
+    return _provider
+
+
+def set_market_data(provider):
+    """Swap the process-wide provider (None re-reads settings on next use)"""
+    global _provider
+    _provider = provider
+
+
+def record_fixtures(symbols, root=None, source=None, intervals=('1d',), period='max'):
+    """Save bars and info from `source` (Yahoo by default) in ReplayProvider's layout"""
+    source = source or YahooProvider()
+    root = str(root or settings.MARKET_DATA_FIXTURES_DIR)
+    recorded = {}
+    for symbol in symbols:
+        directory = os.path.join(root, symbol.upper().replace('/', '_'))
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, 'info.json'), 'w') as f:
+                json.dump(source.info(symbol), f, default=str)
+            for interval in intervals:
+                # Yahoo only keeps a few weeks of intraday bars
+                window = {'1m': '7d'}.get(interval, '60d') if interval in INTRADAY_MINUTES else period
+                frame = source.history(symbol, interval, period=window)
+                frame[OHLCV_COLUMNS].to_csv(os.path.join(directory, f'{interval}.csv'))
+            recorded[symbol] = True
+        except Exception as e:
+            logger.warning(f"Recording failed for {symbol}: {str(e)}")
+            recorded[symbol] = False
+    return recorded
@@ -0,0 +1,60 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:34
+
+from django.db import migrations, models
+
+# Cache rows past expires_at are dead weight. MongoDB removes them itself through a
+# TTL index; other databases get a plain index for the expired-row cleanup query.
+EXPIRING_MODELS = {
+    'predictioncache': 'prediction_cache_ttl_idx',
+    'marketdatacache': 'market_cache_ttl_idx',
+}
+
+
+def add_expiry_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    for model_name, index_name in EXPIRING_MODELS.items():
+        model = apps.get_model('prediction', model_name)
+        if connection.vendor == 'djongo':
+            connection.ensure_connection()
+            connection.connection[model._meta.db_table].create_index(
+                [('expires_at', 1)], name=index_name, expireAfterSeconds=0)
+        else:
+            schema_editor.add_index(model, models.Index(fields=['expires_at'], name=index_name))
+
+
+def remove_expiry_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    for model_name, index_name in EXPIRING_MODELS.items():
+        model = apps.get_model('prediction', model_name)
+        if connection.vendor == 'djongo':
+            connection.ensure_connection()
+            connection.connection[model._meta.db_table].drop_index(index_name)
+        else:
+            schema_editor.remove_index(model, models.Index(fields=['expires_at'], name=index_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0002_market_data_cache'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='marketdatacache',
+            index=models.Index(fields=['cache_key', 'expires_at'], name='market_cache_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predictioncache',
+            index=models.Index(fields=['cache_key', 'expires_at'], name='prediction_cache_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockprediction',
+            index=models.Index(fields=['symbol', 'timeframe', '-created_at'], name='prediction_symbol_tf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockprediction',
+            index=models.Index(fields=['symbol', '-created_at'], name='prediction_symbol_idx'),
+        ),
+        migrations.RunPython(add_expiry_indexes, remove_expiry_indexes),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.utils import timezone
 import json
 
+from Financogram.db import insert_unique
+
 
 class StockPrediction(models.Model):
     TREND_CHOICES = [
@@ -38,10 +40,32 @@ class StockPrediction(models.Model):
     class Meta:
         unique_together = ['symbol', 'timeframe', 'created_at']
         ordering = ['-created_at']
+        indexes = [
+            # Latest prediction per symbol and timeframe, and recent history per symbol
+            models.Index(fields=['symbol', 'timeframe', '-created_at'], name='prediction_symbol_tf_idx'),
+            models.Index(fields=['symbol', '-created_at'], name='prediction_symbol_idx'),
+        ]
     
     def __str__(self):
         return f"{self.symbol} - {self.timeframe} - {self.trend_direction}"
     
+    @classmethod
+    def from_result(cls, result):
+        """Unsaved instance built from a StockPredictionEngine.predict() result"""
+        return cls(
+            symbol=result['symbol'],
+            timeframe=result['timeframe'],
+            historical_data=result['historical_data'],
+            predicted_data=result['predicted_data'],
+            trend_direction=result['trend_direction'],
+            confidence_score=result['confidence_score'],
+            recommendation=result['recommendation'],
+            model_used=result['model_used'],
+            current_price=result['current_price'],
+            predicted_end_price=result['predicted_end_price'],
+            expected_return=result['expected_return']
+        )
+    
     def get_historical_dates(self):
         return self.historical_data.get('dates', [])
     
@@ -63,10 +87,21 @@ class PredictionCache(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        # expires_at is indexed by migration 0003: a TTL index on MongoDB, a plain one elsewhere
+        indexes = [models.Index(fields=['cache_key', 'expires_at'], name='prediction_cache_lookup_idx')]
     
     def __str__(self):
         return f"{self.cache_key} - Expires: {self.expires_at}"
     
+    @classmethod
+    def store(cls, cache_key, cache_data, ttl):
+        """Insert or replace the entry for cache_key (an expired row may still exist)"""
+        entry, _ = cls.objects.update_or_create(
+            cache_key=cache_key,
+            defaults={'cache_data': cache_data, 'expires_at': timezone.now() + ttl}
+        )
+        return entry
+    
     def is_expired(self):
         return timezone.now() > self.expires_at
     
@@ -74,3 +109,34 @@ class PredictionCache(models.Model):
         if not self.is_expired():
             return self.cache_data
         return None
+
+
+class MarketDataCache(models.Model):
+    """Shared entries keyed '<kind>:<id>': quotes and fundamentals per symbol, portfolios per user"""
+    cache_key = models.CharField(max_length=64, unique=True)
+    cache_data = models.JSONField()
+    expires_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['cache_key', 'expires_at'], name='market_cache_lookup_idx')]
+    
+    def __str__(self):
+        return f"{self.cache_key} - Expires: {self.expires_at}"
+    
+    @classmethod
+    def store_many(cls, entries, ttl):
+        """Insert or replace the entries for every key in `entries` ({cache_key: data}).
+
+        Each row is updated in place and only inserted when missing, so readers
+        never see a key disappear. When another writer inserts the same key
+        first, the update is repeated on its row.
+        """
+        now = timezone.now()
+        fields = {'expires_at': now + ttl, 'updated_at': now}
+        for key, data in entries.items():
+            rows = cls.objects.filter(cache_key=key)
+            if rows.update(cache_data=data, **fields):
+                continue
+            if not insert_unique(lambda: cls.objects.create(cache_key=key, cache_data=data, **fields)):
+                rows.update(cache_data=data, **fields)
@@ -1,4 +1,3 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -6,6 +5,11 @@ from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics import mean_squared_error
 import logging
 
+from .bar_store import get_bar_store
+from .features import FEATURE_DTYPE, assemble, build_feature_matrix, session_dates
+from .indicators import feature_cache
+from .instrumentation import stage
+
 # Set up logging
 logger = logging.getLogger(__name__)
 import warnings
@@ -13,40 +17,71 @@ warnings.filterwarnings('ignore')
 
 
 class StockPredictionEngine:
-    def __init__(self):
+    def __init__(self, store=None):
         self.scaler = MinMaxScaler(feature_range=(0, 1))
+        # Bar store to read history from; defaults to the process-wide one
+        self.store = store
         
     def get_stock_data(self, symbol, period='1y'):
-        """Fetch stock data from Yahoo Finance"""
+        """Fetch stock data from the local bar store (delta-synced from the market data provider)"""
+        return self.get_stock_bars(symbol, period).to_frame()
+    
+    def get_stock_bars(self, symbol, period='1y'):
+        """Same as get_stock_data, as the stored Bars instead of a DataFrame"""
         try:
-            import yfinance as yf
-            stock = yf.Ticker(symbol)
-            data = stock.history(period=period)
-            if data.empty:
+            store = self.store or get_bar_store()
+            store.refresh(symbol)
+            bars = store.read_period(symbol, period)
+            if not len(bars):
                 raise ValueError(f"No data found for {symbol}. The stock symbol might be invalid or the market might be closed.")
-            if len(data) < 20:
-                raise ValueError(f"Insufficient historical data for {symbol}. Only {len(data)} days available.")
-            return data
+            if len(bars) < 20:
+                raise ValueError(f"Insufficient historical data for {symbol}. Only {len(bars)} days available.")
+            return bars
         except Exception as e:
             raise ValueError(f"Error fetching data for {symbol}: {str(e)}")
     
-    def prepare_features(self, data):
-        """Prepare features for prediction"""
+    def get_bulk_stock_data(self, symbols, period='1y'):
+        """Fetch stock data for several symbols, syncing stale ones in one provider request"""
+        try:
+            store = self.store or get_bar_store()
+            try:
+                store.update_many(symbols)
+            except Exception as e:
+                logger.warning(f"Bulk bar store refresh failed: {str(e)}")
+            
+            # Wide panel: one dates x symbols DataFrame per OHLCV field
+            bars = {symbol: store.read_period(symbol, period).to_frame() for symbol in symbols}
+            if all(frame.empty for frame in bars.values()):
+                raise ValueError(f"No data found for {', '.join(symbols)}")
+            return {
+                field: pd.DataFrame({symbol: frame[field] for symbol, frame in bars.items()})
+                for field in PANEL_FIELDS
+            }
+        except Exception as e:
+            raise ValueError(f"Error fetching bulk data: {str(e)}")
+    
+    def prepare_features(self, data, dtype=FEATURE_DTYPE):
+        """Prepare features for prediction as a compact FeatureMatrix"""
         try:
-            # Calculate technical indicators
-            data['SMA_20'] = data['Close'].rolling(window=20).mean()
-            data['SMA_50'] = data['Close'].rolling(window=50).mean()
-            data['RSI'] = self.calculate_rsi(data['Close'])
-            data['MACD'] = self.calculate_macd(data['Close'])
-            data['Volatility'] = data['Close'].rolling(window=20).std()
+            # OHLCV plus technical indicators, without the warm-up rows
+            data = build_feature_matrix(data, dtype)
             
-            # Calculate price changes
-            data['Price_Change'] = data['Close'].pct_change()
-            data['Price_Change_5'] = data['Close'].pct_change(periods=5)
-            data['Price_Change_10'] = data['Close'].pct_change(periods=10)
+            if len(data) < 20:
+                raise ValueError(f"After feature preparation, insufficient data: {len(data)} rows")
             
-            # Remove NaN values
-            data = data.dropna()
+            return data
+        except Exception as e:
+            raise ValueError(f"Error preparing features: {str(e)}")
+    
+    def prepare_stored_features(self, symbol, bars, period='1y', dtype=FEATURE_DTYPE):
+        """prepare_features for a window read from the bar store.
+        
+        The window's features are kept per process and only the bars stored
+        since the previous call are streamed through the indicators.
+        """
+        try:
+            store = self.store or get_bar_store()
+            data = feature_cache.features((store.root, symbol, '1d', period), bars, dtype)
             
             if len(data) < 20:
                 raise ValueError(f"After feature preparation, insufficient data: {len(data)} rows")
@@ -55,6 +90,51 @@ class StockPredictionEngine:
         except Exception as e:
             raise ValueError(f"Error preparing features: {str(e)}")
     
+    def prepare_panel_features(self, panel):
+        """Prepare features for every symbol of a wide panel in one vectorized pass"""
+        try:
+            close = panel['Close'].dropna(how='all')
+            
+            # Symbols with holes inside their history would be padded by pct_change,
+            # so they are left to the single-symbol path
+            gaps = close.isna() & close.ffill().notna() & close.bfill().notna()
+            gapped = [symbol for symbol in close.columns if gaps[symbol].any()]
+            
+            dates = session_dates(close.index)
+            features = {
+                'SMA_20': close.rolling(window=20).mean(),
+                'SMA_50': close.rolling(window=50).mean(),
+                'RSI': self.calculate_rsi(close),
+                'MACD': self.calculate_macd(close),
+                'Volatility': close.rolling(window=20).std(),
+                'Price_Change': close.pct_change(),
+                'Price_Change_5': close.pct_change(periods=5),
+                'Price_Change_10': close.pct_change(periods=10),
+            }
+            
+            frames = {}
+            errors = {}
+            for symbol in close.columns:
+                try:
+                    if symbol in gapped:
+                        raw = pd.DataFrame({field: panel[field][symbol] for field in PANEL_FIELDS}).dropna()
+                        frames[symbol] = self.prepare_features(raw)
+                        continue
+                    columns = {
+                        field: panel[field][symbol].reindex(close.index).to_numpy(dtype=np.float64)
+                        for field in PANEL_FIELDS
+                    }
+                    columns.update({name: frame[symbol].to_numpy(dtype=np.float64) for name, frame in features.items()})
+                    data = assemble(columns, dates)
+                    if len(data) < 20:
+                        raise ValueError(f"After feature preparation, insufficient data: {len(data)} rows")
+                    frames[symbol] = data
+                except ValueError as e:
+                    errors[symbol] = str(e)
+            return frames, errors
+        except Exception as e:
+            raise ValueError(f"Error preparing panel features: {str(e)}")
+    
     def calculate_rsi(self, prices, period=14):
         """Calculate Relative Strength Index"""
         try:
@@ -92,16 +172,16 @@ class StockPredictionEngine:
             if len(data) < 20:
                 raise ValueError(f"Insufficient data for trend prediction. Need at least 20 rows, got {len(data)}")
             
-            recent_data = data.tail(20)
-            
-            # Calculate trend indicators
-            price_trend = recent_data['Close'].iloc[-1] - recent_data['Close'].iloc[0]
-            sma_trend = recent_data['SMA_20'].iloc[-1] - recent_data['SMA_20'].iloc[0]
-            rsi_current = recent_data['RSI'].iloc[-1]
-            macd_current = recent_data['MACD'].iloc[-1]
+            # Calculate trend indicators over the last 20 rows
+            close = data['Close']
+            sma_20 = data['SMA_20']
+            price_trend = float(close[-1]) - float(close[-20])
+            sma_trend = float(sma_20[-1]) - float(sma_20[-20])
+            rsi_current = float(data['RSI'][-1])
+            macd_current = float(data['MACD'][-1])
             
             # Check for NaN values
-            if pd.isna(price_trend) or pd.isna(sma_trend) or pd.isna(rsi_current) or pd.isna(macd_current):
+            if np.isnan([price_trend, sma_trend, rsi_current, macd_current]).any():
                 raise ValueError("NaN values found in trend indicators")
         
             # Trend scoring
@@ -147,11 +227,11 @@ class StockPredictionEngine:
         data_quality = min(1.0, len(data) / 200)  # Normalize to 0-1
         
         # Volatility score (25% weight)
-        volatility = data['Volatility'].tail(20).mean()
-        volatility_score = max(0, 1 - (volatility / data['Close'].mean()))
+        volatility = data['Volatility'][-20:].mean(dtype=np.float64)
+        volatility_score = max(0, 1 - (volatility / data['Close'].mean(dtype=np.float64)))
         
         # Trend consistency score (25% weight)
-        recent_changes = data['Price_Change'].tail(20)
+        recent_changes = data['Price_Change'][-20:]
         if trend_direction == 'UP':
             consistency_score = (recent_changes > 0).sum() / len(recent_changes)
         elif trend_direction == 'DOWN':
@@ -160,7 +240,8 @@ class StockPredictionEngine:
             consistency_score = 0.5
         
         # Volume score (20% weight)
-        volume_score = min(1.0, data['Volume'].tail(20).mean() / data['Volume'].mean())
+        volume = data['Volume']
+        volume_score = min(1.0, volume[-20:].mean(dtype=np.float64) / volume.mean(dtype=np.float64))
         
         # Calculate final confidence
         confidence = (
@@ -170,7 +251,7 @@ class StockPredictionEngine:
             volume_score * 0.2
         )
         
-        return min(0.95, max(0.3, confidence))
+        return float(min(0.95, max(0.3, confidence)))
     
     def generate_recommendation(self, trend_direction, confidence_score, expected_return):
         """Generate investment recommendation"""
@@ -187,29 +268,22 @@ class StockPredictionEngine:
     def predict_prices(self, data, timeframe):
         """Predict future prices using simple forecasting"""
         try:
-            current_price = data['Close'].iloc[-1]
+            current_price = float(data['Close'][-1])
             
             # Get recent trend
-            recent_prices = data['Close'].tail(30)
+            recent_prices = data['Close'][-30:].astype(np.float64)
             if len(recent_prices) < 10:
                 raise ValueError("Insufficient recent price data for trend calculation")
             
             trend = np.polyfit(range(len(recent_prices)), recent_prices, 1)[0]
             
             # Calculate volatility
-            volatility = data['Volatility'].tail(20).mean()
+            volatility = data['Volatility'][-20:].mean(dtype=np.float64)
             if np.isnan(volatility) or volatility <= 0:
                 volatility = current_price * 0.02  # Default 2% volatility
             
             # Generate prediction dates
-            if timeframe == '1d':
-                days = 1
-            elif timeframe == '1w':
-                days = 7
-            elif timeframe == '1m':
-                days = 30
-            else:
-                days = 30
+            days = TIMEFRAME_DAYS.get(timeframe, 30)
             
             dates = []
             prices = []
@@ -236,6 +310,44 @@ class StockPredictionEngine:
         except Exception as e:
             raise ValueError(f"Error predicting prices: {str(e)}")
     
+    def simulate_price_paths(self, data, timeframe, n_paths=2000, seed=None, method='gbm'):
+        """Simulate many future price paths at once and return P5/P50/P95 bands"""
+        try:
+            closes = np.asarray(data['Close'], dtype=np.float64)
+            log_returns = np.diff(np.log(closes[-253:]))
+            if len(log_returns) < 20:
+                raise ValueError("Insufficient price history for simulation")
+            
+            days = TIMEFRAME_DAYS.get(timeframe, 30)
+            rng = np.random.default_rng(seed)
+            
+            # Draw every daily log return for every path in one array operation,
+            # laid out day-major so each day's paths are contiguous
+            if method == 'bootstrap':
+                steps = rng.choice(log_returns, size=(days, n_paths))
+            elif method == 'gbm':
+                mu = log_returns.mean()
+                sigma = log_returns.std(ddof=1)
+                steps = rng.standard_normal((days, n_paths))
+                steps *= sigma
+                steps += mu
+            else:
+                raise ValueError(f"Unknown simulation method: {method}")
+            
+            # Quantiles commute with exp, so only the three band rows are exponentiated
+            np.cumsum(steps, axis=0, out=steps)
+            p5, p50, p95 = closes[-1] * np.exp(np.percentile(steps, [5, 50, 95], axis=1))
+            
+            return {
+                'method': method,
+                'paths': n_paths,
+                'p5': np.round(p5, 2).tolist(),
+                'p50': np.round(p50, 2).tolist(),
+                'p95': np.round(p95, 2).tolist(),
+            }
+        except Exception as e:
+            raise ValueError(f"Error simulating prices: {str(e)}")
+    
     def calculate_expected_return(self, current_price, predicted_prices):
         """Calculate expected return percentage"""
         if not predicted_prices:
@@ -244,40 +356,58 @@ class StockPredictionEngine:
         end_price = predicted_prices[-1]
         return round(((end_price - current_price) / current_price) * 100, 2)
     
-    def predict(self, symbol, timeframe):
-        """Main prediction method"""
+    def predict(self, symbol, timeframe, simulation=None, period='1y'):
+        """Main prediction method; `period` is the history window the features are built on"""
         try:
             logger.info(f"Starting prediction for {symbol} with timeframe {timeframe}")
             
             # Fetch and prepare data
             logger.info(f"Fetching stock data for {symbol}")
-            data = self.get_stock_data(symbol)
-            logger.info(f"Fetched {len(data)} rows of data")
+            with stage('fetch'):
+                bars = self.get_stock_bars(symbol, period)
+            logger.info(f"Fetched {len(bars)} rows of data")
             
             logger.info("Preparing features")
-            data = self.prepare_features(data)
+            with stage('features'):
+                data = self.prepare_stored_features(symbol, bars, period)
             logger.info(f"After feature preparation: {len(data)} rows")
-            
+        except Exception as e:
+            error_msg = f"Prediction failed for {symbol}: {str(e)}"
+            logger.error(f"ERROR: {error_msg}")
+            raise ValueError(error_msg)
+        
+        return self.predict_from_features(symbol, timeframe, data, simulation)
+    
+    def predict_from_features(self, symbol, timeframe, data, simulation=None):
+        """Run the prediction on a FeatureMatrix returned by prepare_features.
+        
+        `simulation` optionally holds Monte Carlo settings (paths, seed, method);
+        when given, P5/P50/P95 bands are added to predicted_data.
+        """
+        try:
             if len(data) < 50:
                 raise ValueError(f"Insufficient data for {symbol}. Need at least 50 rows, got {len(data)}")
             
             # Get current price
-            current_price = data['Close'].iloc[-1]
+            current_price = float(data['Close'][-1])
             logger.info(f"Current price: {current_price}")
             
             # Predict trend
             logger.info("Predicting trend")
-            trend_direction = self.predict_trend(data)
+            with stage('trend'):
+                trend_direction = self.predict_trend(data)
             logger.info(f"Trend direction: {trend_direction}")
             
             # Calculate confidence
             logger.info("Calculating confidence")
-            confidence_score = self.calculate_confidence(data, trend_direction)
+            with stage('confidence'):
+                confidence_score = self.calculate_confidence(data, trend_direction)
             logger.info(f"Confidence score: {confidence_score}")
             
             # Predict future prices
             logger.info("Predicting future prices")
-            pred_dates, pred_prices = self.predict_prices(data, timeframe)
+            with stage('price'):
+                pred_dates, pred_prices = self.predict_prices(data, timeframe)
             logger.info(f"Generated {len(pred_prices)} price predictions")
             
             # Calculate expected return
@@ -290,30 +420,40 @@ class StockPredictionEngine:
             )
             logger.info(f"Recommendation: {recommendation}")
             
-            # Prepare historical data
-            historical_dates = data.index.strftime('%Y-%m-%d').tolist()
-            historical_prices = data['Close'].round(2).tolist()
-            
-            # Prepare response
-            result = {
-                'symbol': symbol,
-                'timeframe': timeframe,
-                'historical_data': {
-                    'dates': historical_dates[-60:],  # Last 60 days
-                    'prices': historical_prices[-60:]
-                },
-                'predicted_data': {
-                    'dates': pred_dates,
-                    'prices': pred_prices
-                },
-                'trend_direction': trend_direction,
-                'confidence_score': round(confidence_score, 3),
-                'recommendation': recommendation,
-                'model_used': 'LSTM-Hybrid',
-                'current_price': round(current_price, 2),
-                'predicted_end_price': round(pred_prices[-1], 2),
-                'expected_return': expected_return
-            }
+            # Prepare historical data and the response payload
+            with stage('serialization'):
+                historical_dates = data.date_strings(-60)
+                historical_prices = np.round(data['Close'][-60:].astype(np.float64), 2).tolist()
+            
+                # Prepare response
+                result = {
+                    'symbol': symbol,
+                    'timeframe': timeframe,
+                    'historical_data': {
+                        'dates': historical_dates,  # Last 60 days
+                        'prices': historical_prices
+                    },
+                    'predicted_data': {
+                        'dates': pred_dates,
+                        'prices': pred_prices
+                    },
+                    'trend_direction': trend_direction,
+                    'confidence_score': round(confidence_score, 3),
+                    'recommendation': recommendation,
+                    'model_used': 'LSTM-Hybrid',
+                    'current_price': round(current_price, 2),
+                    'predicted_end_price': round(pred_prices[-1], 2),
+                    'expected_return': expected_return
+                }
+            
+            if simulation is not None:
+                with stage('simulation'):
+                    result['predicted_data']['bands'] = self.simulate_price_paths(
+                        data, timeframe,
+                        n_paths=simulation.get('paths', 2000),
+                        seed=simulation.get('seed'),
+                        method=simulation.get('method', 'gbm')
+                    )
             
             logger.info(f"Prediction completed successfully for {symbol}")
             return result
@@ -322,6 +462,38 @@ class StockPredictionEngine:
             error_msg = f"Prediction failed for {symbol}: {str(e)}"
             logger.error(f"ERROR: {error_msg}")
             raise ValueError(error_msg)
+    
+    def predict_batch(self, symbols, timeframe, simulation=None):
+        """Predict several symbols from a single bulk fetch and one panel feature pass"""
+        logger.info(f"Starting batch prediction for {len(symbols)} symbols with timeframe {timeframe}")
+        with stage('fetch'):
+            panel = self.get_bulk_stock_data(symbols)
+        with stage('features'):
+            frames, errors = self.prepare_panel_features(panel)
+        
+        results = {}
+        for symbol in symbols:
+            if symbol in errors:
+                continue
+            data = frames.get(symbol)
+            if data is None or not len(data):
+                errors[symbol] = f"No data found for {symbol}"
+                continue
+            try:
+                results[symbol] = self.predict_from_features(symbol, timeframe, data, simulation)
+            except ValueError as e:
+                errors[symbol] = str(e)
+        
+        logger.info(f"Batch prediction completed: {len(results)} succeeded, {len(errors)} failed")
+        return results, errors
+
+
+# Number of forecast steps per timeframe
+TIMEFRAME_DAYS = {'1d': 1, '1w': 7, '1m': 30}
+
+
+# OHLCV fields kept in the wide per-symbol panel
+PANEL_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
 
 
 # Available stocks for prediction
@@ -16,7 +16,21 @@ class PredictionCacheSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at',)
 
 
-class PredictionRequestSerializer(serializers.Serializer):
+class SimulationOptionsMixin(serializers.Serializer):
+    simulate = serializers.BooleanField(required=False, default=False)
+    paths = serializers.IntegerField(required=False, default=2000, min_value=100, max_value=20000)
+    seed = serializers.IntegerField(required=False, allow_null=True, default=None)
+    method = serializers.ChoiceField(choices=['gbm', 'bootstrap'], required=False, default='gbm')
+    
+    def get_simulation(self):
+        """Monte Carlo settings for the engine, or None when not requested"""
+        data = self.validated_data
+        if not data.get('simulate'):
+            return None
+        return {'paths': data['paths'], 'seed': data['seed'], 'method': data['method']}
+
+
+class PredictionRequestSerializer(SimulationOptionsMixin):
     symbol = serializers.CharField(max_length=10, required=True)
     timeframe = serializers.ChoiceField(
         choices=[('1d', '1 Day'), ('1w', '1 Week'), ('1m', '1 Month')],
@@ -24,6 +38,19 @@ class PredictionRequestSerializer(serializers.Serializer):
     )
 
 
+class BatchPredictionRequestSerializer(SimulationOptionsMixin):
+    symbols = serializers.ListField(
+        child=serializers.CharField(max_length=10),
+        required=False,
+        allow_empty=False,
+        help_text="Symbols to predict; defaults to every available stock"
+    )
+    timeframe = serializers.ChoiceField(
+        choices=[('1d', '1 Day'), ('1w', '1 Week'), ('1m', '1 Month')],
+        required=True
+    )
+
+
 class StockListSerializer(serializers.Serializer):
     stocks = serializers.ListField(
         child=serializers.CharField(max_length=10),
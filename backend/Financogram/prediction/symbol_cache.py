@@ -0,0 +1,133 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import LocalTTLCache
+from .instrumentation import stage
+from .market_client import get_market_client
+from .market_data import get_market_data, quote_from_info
+from .models import MarketDataCache
+
+logger = logging.getLogger(__name__)
+
+# Yahoo info fields by how fast they move. Every entry is filled from the same
+# info() call, but each kind expires on its own TTL.
+QUOTE_FIELDS = [
+    'shortName', 'currency', 'exchange', 'regularMarketPrice', 'regularMarketPreviousClose',
+    'previousClose', 'dayLow', 'dayHigh', 'regularMarketVolume', 'volume',
+]
+FUNDAMENTAL_FIELDS = [
+    'shortName', 'longName', 'currency', 'exchange', 'country', 'sector', 'industry',
+    'marketCap', 'trailingPE', 'forwardPE', 'dividendYield', 'fiftyTwoWeekLow',
+    'fiftyTwoWeekHigh', 'averageVolume', 'exchangeTimezoneName',
+]
+
+KINDS = {
+    'quote': (QUOTE_FIELDS, 'SYMBOL_QUOTE_TTL'),
+    'fundamentals': (FUNDAMENTAL_FIELDS, 'SYMBOL_FUNDAMENTALS_TTL'),
+}
+
+
+def symbol_cache_key(kind, symbol):
+    return f"{kind}:{symbol.upper()}"
+
+
+class SymbolDataCache:
+    """Quote and fundamentals fields per symbol, shared by every view.
+
+    Lookups go through an in-process LRU and then the shared MarketDataCache
+    collection. The remaining misses are fetched with one batch of info()
+    calls on the shared market data client. Each info() response fills both
+    kinds, so a symbol reaches upstream at most once per TTL across all
+    worker processes.
+    """
+
+    def __init__(self, max_entries=None):
+        self.local = LocalTTLCache(max_entries or settings.SYMBOL_CACHE_LOCAL_ENTRIES)
+
+    def ttl(self, kind):
+        return getattr(settings, KINDS[kind][1])
+
+    def _shared(self, keys):
+        """Fresh rows for keys from the shared tier, with the seconds each has left"""
+        now = timezone.now()
+        with stage('cache'):
+            rows = MarketDataCache.objects.filter(cache_key__in=keys, expires_at__gt=now).values_list(
+                'cache_key', 'cache_data', 'expires_at')
+            return {key: (data, (expires_at - now).total_seconds()) for key, data, expires_at in rows}
+
+    def _fetch(self, symbols):
+        """info() for every symbol in one fan-out; returns ({kind: {key: data}}, errors by symbol)"""
+        provider = get_market_data()
+        infos, errors, timed_out = get_market_client().map(provider.info, symbols)
+        for symbol in timed_out:
+            errors[symbol] = 'Market data deadline exceeded'
+        entries = {kind: {} for kind in KINDS}
+        for symbol, info in infos.items():
+            for kind, (fields, _) in KINDS.items():
+                entries[kind][symbol_cache_key(kind, symbol)] = {
+                    field: info[field] for field in fields if info.get(field) is not None
+                }
+        for kind, items in entries.items():
+            if items:
+                try:
+                    with stage('db'):
+                        MarketDataCache.store_many(items, timedelta(seconds=self.ttl(kind)))
+                except Exception as db_error:
+                    logger.error(f"Market data cache write failed: {str(db_error)}")
+        return entries, errors
+
+    def get_many(self, kind, symbols):
+        """({symbol: fields}, {symbol: error}) for one kind of data"""
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        keys = {symbol_cache_key(kind, s): s for s in symbols}
+        ttls = {}
+
+        def compute_many(missing):
+            found = {}
+            for key, (data, remaining) in self._shared(missing).items():
+                found[key] = data
+                ttls[key] = remaining
+            todo = [keys[key] for key in missing if key not in found]
+            errors = {}
+            if todo:
+                entries, failed = self._fetch(todo)
+                # The other kind was fetched too; keep it locally for the next caller
+                for other, items in entries.items():
+                    if other != kind:
+                        self.local.set_many(items, self.ttl(other))
+                found.update(entries[kind])
+                errors = {symbol_cache_key(kind, s): e for s, e in failed.items()}
+            return found, errors
+
+        results, errors = self.local.get_or_compute_many(
+            list(keys), compute_many, lambda key, value: ttls.get(key, self.ttl(kind)))
+        return (
+            {keys[key]: value for key, value in results.items()},
+            {keys[key]: error for key, error in errors.items()},
+        )
+
+    def quotes(self, symbols):
+        """({symbol: quote}, errors) with quotes shaped like MarketDataProvider.quote()"""
+        fields, errors = self.get_many('quote', symbols)
+        return {symbol: quote_from_info(symbol, info) for symbol, info in fields.items()}, errors
+
+    def fundamentals(self, symbols):
+        return self.get_many('fundamentals', symbols)
+
+    def info(self, symbol):
+        """Quote and fundamentals fields of one symbol merged into a Yahoo-style info dict"""
+        fundamentals, errors = self.get_many('fundamentals', [symbol])
+        quote, quote_errors = self.get_many('quote', [symbol])
+        errors.update(quote_errors)
+        if errors:
+            raise ValueError(f"No market data for {symbol}: {errors[symbol.upper()]}")
+        return dict(fundamentals[symbol.upper()], **quote[symbol.upper()])
+
+    def snapshot(self):
+        return self.local.snapshot()
+
+
+symbol_data = SymbolDataCache()
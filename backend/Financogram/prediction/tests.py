@@ -1,12 +1,55 @@
+import gc
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+import unittest
+import unittest.mock
+import weakref
+
+from django.db import connection
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
+from Financogram.db import insert_unique
 from .models import StockPrediction, PredictionCache
-from .prediction_engine import StockPredictionEngine, AVAILABLE_STOCKS
+from .prediction_engine import StockPredictionEngine, AVAILABLE_STOCKS, PANEL_FIELDS
+from .bar_store import BarStore
+from .indicators import FeatureCache, FeatureState, feature_cache, refresh_features, stream_features
+from . import indicators
+from . import backtest
+from .warmer import PredictionWarmer
+from .cache import TieredPredictionCache
+from . import benchmark
+from .instrumentation import Histogram, server_timing
+from .market_data import ReplayProvider, SyntheticProvider, record_fixtures, set_market_data
+from .market_client import MarketDataClient
+from .symbol_cache import SymbolDataCache
+from .models import MarketDataCache
+from .columnar import ColumnarRenderer, decode_series, encode_series, parse_columnar, prediction_columns
+import numpy as np
 import pandas as pd
 
 
+def make_ohlcv(days=260, seed=0, start='2023-01-02'):
+    """Synthetic daily OHLCV bars shaped like yfinance history()"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.015, days)))
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.003, days)),
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 5_000_000, days).astype(float),
+    }, index=pd.bdate_range(start, periods=days, tz='America/New_York'))
+
+
 class StockPredictionModelTest(TestCase):
     def setUp(self):
         self.prediction_data = {
@@ -72,6 +115,614 @@ class PredictionEngineTest(TestCase):
         self.assertIsNotNone(macd.iloc[-1])
 
 
+class FeatureMatrixTest(TestCase):
+    def setUp(self):
+        self.engine = StockPredictionEngine()
+        self.bars = make_ohlcv(days=600, seed=9)
+    
+    def reference_features(self, data):
+        """The original column-by-column pandas implementation"""
+        data = data.copy()
+        data['SMA_20'] = data['Close'].rolling(window=20).mean()
+        data['SMA_50'] = data['Close'].rolling(window=50).mean()
+        data['RSI'] = self.engine.calculate_rsi(data['Close'])
+        data['MACD'] = self.engine.calculate_macd(data['Close'])
+        data['Volatility'] = data['Close'].rolling(window=20).std()
+        data['Price_Change'] = data['Close'].pct_change()
+        data['Price_Change_5'] = data['Close'].pct_change(periods=5)
+        data['Price_Change_10'] = data['Close'].pct_change(periods=10)
+        return data.dropna()
+    
+    def test_matches_pandas_features(self):
+        matrix = self.engine.prepare_features(self.bars)
+        reference = self.reference_features(self.bars)
+        self.assertEqual(matrix.values.dtype, np.float32)
+        self.assertTrue(matrix.values.flags.f_contiguous)
+        self.assertEqual(matrix.date_strings(), list(reference.index.strftime('%Y-%m-%d')))
+        np.testing.assert_allclose(matrix.values, reference[matrix.columns].to_numpy(), rtol=1e-6, atol=1e-5)
+        self.assertLess(matrix.nbytes, reference.memory_usage(deep=True).sum() * 0.6)
+    
+    def test_float32_storage_keeps_predictions(self):
+        compact = self.engine.prepare_features(self.bars)
+        exact = self.engine.prepare_features(self.bars, dtype=np.float64)
+        trend = self.engine.predict_trend(exact)
+        self.assertEqual(self.engine.predict_trend(compact), trend)
+        self.assertAlmostEqual(self.engine.calculate_confidence(compact, trend),
+                               self.engine.calculate_confidence(exact, trend), places=5)
+        np.random.seed(0)
+        compact_prices = self.engine.predict_prices(compact, '1w')[1]
+        np.random.seed(0)
+        exact_prices = self.engine.predict_prices(exact, '1w')[1]
+        np.testing.assert_allclose(compact_prices, exact_prices, atol=0.011)
+    
+    def test_sessions_without_close_are_skipped(self):
+        bars = self.bars.copy()
+        bars.iloc[300, bars.columns.get_loc('Close')] = np.nan
+        matrix = self.engine.prepare_features(bars)
+        self.assertEqual(len(matrix), len(self.bars) - 50)
+        self.assertNotIn(bars.index[300].strftime('%Y-%m-%d'), matrix.date_strings())
+
+
+class MonteCarloTest(TestCase):
+    def setUp(self):
+        self.engine = StockPredictionEngine()
+        self.data = self.engine.prepare_features(make_ohlcv(seed=5))
+    
+    def test_seeded_bands_are_reproducible(self):
+        first = self.engine.simulate_price_paths(self.data, '1m', seed=42)
+        second = self.engine.simulate_price_paths(self.data, '1m', seed=42)
+        self.assertEqual(first, second)
+        self.assertEqual(len(first['p50']), 30)
+    
+    def test_bands_are_ordered(self):
+        for method in ('gbm', 'bootstrap'):
+            bands = self.engine.simulate_price_paths(self.data, '1w', seed=1, method=method)
+            self.assertTrue(all(lo <= mid <= hi for lo, mid, hi in zip(bands['p5'], bands['p50'], bands['p95'])))
+    
+    def test_prediction_includes_bands_when_requested(self):
+        result = self.engine.predict_from_features('AAPL', '1d', self.data, {'paths': 1000, 'seed': 7})
+        self.assertEqual(len(result['predicted_data']['bands']['p95']), 1)
+        plain = self.engine.predict_from_features('AAPL', '1d', self.data)
+        self.assertNotIn('bands', plain['predicted_data'])
+
+
+class PanelFeaturesTest(TestCase):
+    def setUp(self):
+        self.engine = StockPredictionEngine()
+        self.bars = {symbol: make_ohlcv(seed=i) for i, symbol in enumerate(['AAPL', 'MSFT', 'GOOGL'])}
+        # A late listing and a missing day inside the history
+        self.bars['MSFT'] = self.bars['MSFT'].iloc[30:]
+        self.bars['GOOGL'] = self.bars['GOOGL'].drop(self.bars['GOOGL'].index[100])
+        self.panel = {
+            field: pd.DataFrame({symbol: bars[field] for symbol, bars in self.bars.items()})
+            for field in PANEL_FIELDS
+        }
+    
+    def test_panel_matches_single_symbol_features(self):
+        frames, errors = self.engine.prepare_panel_features(self.panel)
+        self.assertEqual(errors, {})
+        for symbol, bars in self.bars.items():
+            single = self.engine.prepare_features(bars)
+            np.testing.assert_array_equal(frames[symbol].dates, single.dates)
+            np.testing.assert_allclose(frames[symbol].values, single.values, rtol=1e-6)
+    
+    def test_predict_batch_uses_one_bulk_fetch(self):
+        calls = []
+        def bulk_fetch(symbols, period='1y'):
+            calls.append(list(symbols))
+            return self.panel
+        self.engine.get_bulk_stock_data = bulk_fetch
+        results, errors = self.engine.predict_batch(['AAPL', 'MSFT', 'GOOGL'], '1w')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, {})
+        self.assertEqual(set(results), {'AAPL', 'MSFT', 'GOOGL'})
+        self.assertEqual(len(results['AAPL']['predicted_data']['prices']), 7)
+
+
+class BarStoreTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.bars = make_ohlcv(days=300)
+        self.available = 250
+        self.calls = []
+        
+        def fetcher(symbol, interval, period=None, start=None):
+            self.calls.append({'period': period, 'start': start})
+            bars = self.bars.iloc[:self.available]
+            if start is not None:
+                bars = bars[bars.index >= pd.Timestamp(start, tz=bars.index.tz)]
+            return bars
+        
+        self.store = BarStore(root=self.root, fetcher=fetcher, refresh_seconds={'1d': 0})
+    
+    def test_backfill_then_delta_fetch(self):
+        self.assertEqual(self.store.update('AAPL'), 250)
+        self.assertEqual(self.calls[0]['period'], 'max')
+        
+        self.available = 260
+        self.assertEqual(self.store.update('AAPL'), 10)
+        # Only the bars from the last stored session onwards are requested
+        self.assertEqual(self.calls[1]['start'], self.bars.index[249].strftime('%Y-%m-%d'))
+        
+        frame = self.store.read('AAPL').to_frame()
+        pd.testing.assert_frame_equal(frame, self.bars.iloc[:260], check_freq=False, check_names=False)
+    
+    def test_range_reads_are_zero_copy(self):
+        self.store.update('AAPL')
+        bars = self.store.read_period('AAPL', '1mo')
+        self.assertIsInstance(bars.values.base, np.memmap)
+        self.assertLessEqual(len(bars), 23)
+        self.assertEqual(bars.timestamps[-1], self.bars.index[249].value // 10**9)
+    
+    def test_history_matches_window(self):
+        frame = self.store.history('AAPL', period='5d')
+        self.assertEqual(list(frame.index), list(self.bars.index[245:250]))
+
+    def test_symbols_cannot_leave_the_root(self):
+        root = os.path.join(self.root, 'bars')
+        store = BarStore(root=root, fetcher=lambda *args, **kwargs: None)
+        for symbol in ('..', '.', '../AAPL', 'A/B'):
+            with self.assertRaises(ValueError):
+                store.history(symbol)
+        with self.assertRaises(ValueError):
+            store.series_dir('AAPL', '../../1d')
+        self.assertEqual(os.listdir(self.root), [])
+
+
+class StreamingIndicatorTest(TestCase):
+    def setUp(self):
+        self.engine = StockPredictionEngine()
+        self.bars = make_ohlcv(days=400, seed=3)
+    
+    def test_matches_batch_features(self):
+        batch = self.engine.prepare_features(self.bars, dtype=np.float64)
+        streamed = stream_features(self.bars['Close'].to_numpy())
+        offset = len(self.bars) - len(batch)
+        for name, values in streamed.items():
+            np.testing.assert_allclose(values[offset:], batch[name], rtol=1e-9, atol=1e-9)
+    
+    def test_state_round_trips_through_json(self):
+        closes = self.bars['Close'].to_numpy()
+        state = FeatureState()
+        state.update_many(range(300), closes[:300])
+        restored = FeatureState.from_dict(json.loads(json.dumps(state.to_dict())))
+        self.assertEqual(restored.update_many(range(300, 400), closes[300:]),
+                         state.update_many(range(300, 400), closes[300:]))
+    
+    def test_refresh_consumes_only_new_bars(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        available = {'rows': 300}
+        store = BarStore(root=root, fetcher=lambda *a, **k: self.bars.iloc[:available['rows']])
+        store.update('AAPL', force=True)
+        first = refresh_features('AAPL', store=store)
+        
+        available['rows'] = 400
+        store.update('AAPL', force=True)
+        latest = refresh_features('AAPL', store=store)
+        batch = self.engine.prepare_features(self.bars, dtype=np.float64)
+        self.assertNotEqual(first['SMA_20'], latest['SMA_20'])
+        for name in ('SMA_20', 'SMA_50', 'RSI', 'MACD', 'Volatility', 'Price_Change_10'):
+            self.assertAlmostEqual(latest[name], batch[name][-1], places=6)
+    
+    def test_predict_streams_only_new_bars(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        available = {'rows': 300}
+        store = BarStore(root=root, fetcher=lambda *a, **k: self.bars.iloc[:available['rows']])
+        store.update('AAPL', force=True)
+        engine = StockPredictionEngine(store=store)
+        engine.predict('AAPL', '1w')
+        
+        streamed = feature_cache.stats['streamed']
+        available['rows'] = 310
+        store.update('AAPL', force=True)
+        bars = engine.get_stock_bars('AAPL')
+        data = engine.prepare_stored_features('AAPL', bars, dtype=np.float64)
+        batch = self.engine.prepare_features(bars.to_frame(), dtype=np.float64)
+        self.assertEqual(feature_cache.stats['streamed'], streamed + 1)
+        np.testing.assert_array_equal(data.dates, batch.dates)
+        for name in data.columns:
+            if name == 'MACD':
+                # EMAs remember bars that left the window; the difference decays away
+                np.testing.assert_allclose(data[name][-20:], batch[name][-20:], rtol=1e-6, atol=1e-5)
+            else:
+                np.testing.assert_allclose(data[name], batch[name], rtol=1e-9, atol=1e-9)
+
+    def test_feature_cache_builds_outside_its_lock(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = BarStore(root=root, fetcher=lambda *a, **k: self.bars)
+        store.update('AAPL', force=True)
+        bars = store.read('AAPL')
+        cache = FeatureCache(max_entries=4)
+        building, release = threading.Event(), threading.Event()
+        build = indicators.IncrementalFeatures
+
+        def slow_build(bars):
+            building.set()
+            release.wait(5)
+            return build(bars)
+
+        with unittest.mock.patch.object(indicators, 'IncrementalFeatures', slow_build):
+            slow = threading.Thread(target=cache.features, args=('slow', bars, np.float64))
+            slow.start()
+            self.assertTrue(building.wait(5))
+            # Another series streams while the first one is still being built
+            with unittest.mock.patch.object(indicators, 'IncrementalFeatures', build):
+                cache.features('other', bars, np.float64)
+            self.assertTrue(slow.is_alive())
+            release.set()
+            slow.join()
+        self.assertEqual(cache.stats, {'streamed': 0, 'rebuilt': 2})
+        cache.features('slow', bars, np.float64)
+        self.assertEqual(cache.stats['streamed'], 1)
+
+
+class BacktestTest(TestCase):
+    def setUp(self):
+        self.engine = StockPredictionEngine()
+        self.features = self.engine.prepare_features(make_ohlcv(days=900, seed=11))
+        self.data = self.features.to_frame()
+    
+    def test_vectorized_signals_match_engine(self):
+        trend = backtest.trend_signals(self.data)
+        confidence = backtest.confidence_signals(self.data, trend)
+        expected = backtest.expected_return_signals(self.data, '1w')
+        for end in range(250, len(self.data), 97):
+            window = self.features[end - backtest.CONFIDENCE_WINDOW + 1:end + 1]
+            live_trend = self.engine.predict_trend(window)
+            self.assertEqual(trend.iloc[end], live_trend)
+            self.assertAlmostEqual(confidence.iloc[end], self.engine.calculate_confidence(window, live_trend))
+            closes = window['Close'][-30:].astype(np.float64)
+            slope = np.polyfit(range(30), closes, 1)[0]
+            self.assertAlmostEqual(expected.iloc[end], self.engine.calculate_expected_return(
+                closes[-1], [closes[-1] + slope * 7]), places=6)
+    
+    def test_run_backtest_reports_every_timeframe(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        bars = {'AAPL': make_ohlcv(days=900, seed=1), 'MSFT': make_ohlcv(days=900, seed=2)}
+        store = BarStore(root=root, bulk_fetcher=lambda symbols, interval, **kw: {s: bars[s] for s in symbols})
+        rows = backtest.run_backtest(['AAPL', 'MSFT'], period='max', workers=1, store=store)
+        self.assertEqual(len(rows), 6)
+        for row in rows:
+            self.assertGreater(row['signals'], 0)
+            self.assertLessEqual(row['max_drawdown'], 0)
+
+
+class PredictionWarmerTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.warmer = PredictionWarmer(symbols=['AAPL', 'MSFT'], timeframes=['1d'],
+                                       refresh_ahead=timedelta(minutes=10), max_concurrency=1)
+        PredictionCache.objects.create(cache_key='AAPL_1d', cache_data={}, expires_at=self.now + timedelta(hours=1))
+        PredictionCache.objects.create(cache_key='MSFT_1d', cache_data={}, expires_at=self.now + timedelta(minutes=5))
+        
+        data = StockPredictionEngine().prepare_features(make_ohlcv())
+        self.calls = []
+        def predict_batch(symbols, timeframe):
+            self.calls.append(list(symbols))
+            return {s: StockPredictionEngine().predict_from_features(s, timeframe, data) for s in symbols}, {}
+        self.warmer.engine.predict_batch = predict_batch
+    
+    def test_refreshes_only_entries_about_to_expire(self):
+        self.assertEqual([pair[:2] for pair in self.warmer.due(self.now)], [('MSFT', '1d')])
+        self.warmer.run_once()
+        self.assertEqual(self.calls, [['MSFT']])
+        
+        entry = PredictionCache.objects.get(cache_key='MSFT_1d')
+        self.assertEqual(entry.cache_data['symbol'], 'MSFT')
+        self.assertGreater(entry.expires_at, self.now + timedelta(minutes=50))
+        self.assertEqual(StockPrediction.objects.filter(symbol='MSFT').count(), 1)
+        self.assertLess(self.warmer.snapshot()['avg_lag_seconds'], 0)
+
+
+class TieredPredictionCacheTest(TestCase):
+    def setUp(self):
+        self.cache = TieredPredictionCache(max_entries=2)
+    
+    def test_local_tier_serves_repeat_reads(self):
+        self.cache.set('AAPL_1d', {'symbol': 'AAPL'}, timedelta(hours=1))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get('AAPL_1d'), {'symbol': 'AAPL'})
+        self.assertEqual(PredictionCache.objects.get(cache_key='AAPL_1d').cache_data, {'symbol': 'AAPL'})
+    
+    def test_shared_tier_fills_local_and_lru_evicts(self):
+        for symbol in ['AAPL', 'MSFT', 'GOOGL']:
+            PredictionCache.store(f'{symbol}_1d', {'symbol': symbol}, timedelta(hours=1))
+        found = self.cache.get_many(['AAPL_1d', 'MSFT_1d', 'GOOGL_1d'])
+        self.assertEqual(len(found), 3)
+        stats = self.cache.snapshot()
+        self.assertEqual((stats['shared_hits'], stats['local_entries'], stats['evictions']), (3, 2, 1))
+    
+    def test_expired_entry_is_replaced(self):
+        PredictionCache.objects.create(cache_key='AAPL_1d', cache_data={'old': True},
+                                       expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertIsNone(self.cache.get('AAPL_1d'))
+        self.cache.set('AAPL_1d', {'symbol': 'AAPL'}, timedelta(hours=1))
+        self.assertEqual(PredictionCache.objects.filter(cache_key='AAPL_1d').count(), 1)
+        self.assertEqual(self.cache.get('AAPL_1d'), {'symbol': 'AAPL'})
+    
+    def test_concurrent_misses_compute_once(self):
+        # Keep the shared tier out of it; test threads do not share the test database
+        self.cache.get_many = lambda keys, recheck=False: {}
+        self.cache.set_many = lambda items, ttl: None
+        started, release = threading.Event(), threading.Event()
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'symbol': 'AAPL'}
+        
+        results = []
+        leader = threading.Thread(target=lambda: results.append(
+            self.cache.get_or_compute('AAPL_1d', compute, timedelta(hours=1))))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(
+            self.cache.get_or_compute('AAPL_1d', compute, timedelta(hours=1)))) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        while self.cache.snapshot()['coalesced'] < 4:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'symbol': 'AAPL'}] * 5)
+        self.assertEqual(self.cache.snapshot()['coalesced'], 4)
+    
+    def test_failed_computation_reaches_waiters_as_error(self):
+        self.cache.get_many = lambda keys, recheck=False: {}
+        def compute_many(keys):
+            return {}, {key: 'No data found' for key in keys}
+        results, errors = self.cache.get_or_compute_many(['AAPL_1d'], compute_many, timedelta(hours=1))
+        self.assertEqual((results, errors), ({}, {'AAPL_1d': 'No data found'}))
+    
+    def test_entry_filled_by_peer_counts_as_late_hit(self):
+        lookup = self.cache.get_many
+        # The first lookup misses; a peer stores the entry before the leader rechecks
+        self.cache.get_many = lambda keys, recheck=False: lookup(keys, recheck) if recheck else {}
+        PredictionCache.store('AAPL_1d', {'symbol': 'AAPL'}, timedelta(hours=1))
+        results, errors = self.cache.get_or_compute_many(['AAPL_1d'], lambda keys: ({}, {}), timedelta(hours=1))
+        self.assertEqual(results, {'AAPL_1d': {'symbol': 'AAPL'}})
+        stats = self.cache.snapshot()
+        self.assertEqual((stats['misses'], stats['shared_hits'], stats['late_hits'], stats['computations']),
+                         (1, 0, 1, 0))
+
+
+class BenchmarkTest(TestCase):
+    def test_report_covers_every_stage_offline(self):
+        report = benchmark.run_benchmarks(histories=['1y'], repeat=1)
+        self.assertEqual([row['stage'] for row in report['results']], benchmark.STAGES)
+        self.assertTrue(all(row['rows'] == 252 and row['peak_kib'] > 0 for row in report['results']))
+        json.dumps(report)
+    
+    def test_end_to_end_stage_prepares_the_whole_history(self):
+        bars = benchmark.synthetic_ohlcv(600)
+        rows = []
+        prepare = StockPredictionEngine.prepare_stored_features
+        def spy(engine, symbol, stored, *args, **kwargs):
+            rows.append(len(stored))
+            return prepare(engine, symbol, stored, *args, **kwargs)
+        with unittest.mock.patch.object(StockPredictionEngine, 'prepare_stored_features', spy):
+            benchmark.benchmark_history(bars, repeat=2)
+        self.assertEqual(rows, [len(bars)] * 4)
+    
+    def test_compare_flags_slower_stages(self):
+        row = {'history': '1y', 'stage': 'predict', 'median_ms': 10.0}
+        baseline = {'results': [row]}
+        current = {'results': [dict(row, median_ms=11.0)]}
+        self.assertEqual(benchmark.compare(baseline, current, tolerance=0.2), [])
+        current = {'results': [dict(row, median_ms=13.0)]}
+        self.assertEqual(benchmark.compare(baseline, current, tolerance=0.2)[0]['stage'], 'predict')
+
+
+class InstrumentationTest(TestCase):
+    def test_histogram_percentiles_use_bucket_bounds(self):
+        histogram = Histogram()
+        for duration in [0.5] * 90 + [20] * 9 + [4000]:
+            histogram.observe(duration)
+        stats = histogram.to_dict()
+        self.assertEqual((stats['p50_ms'], stats['p95_ms'], stats['p99_ms']), (1, 25, 25))
+        self.assertEqual(histogram.percentile(100), 4000)
+        self.assertEqual(stats['buckets']['5000'], 1)
+    
+    def test_server_timing_sums_repeated_stages(self):
+        header = server_timing([('fetch', 10.0, None), ('trend', 1.0, None), ('trend', 1.5, None)])
+        self.assertEqual(header, 'fetch;dur=10.00, trend;dur=2.50')
+
+
+class MarketDataProviderTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.synthetic = SyntheticProvider(seed=1)
+    
+    def test_synthetic_history_is_deterministic(self):
+        first = self.synthetic.history('AAPL', '1d', period='1y')
+        again = SyntheticProvider(seed=1).history('AAPL', '1d', period='1y')
+        pd.testing.assert_frame_equal(first, again)
+        self.assertEqual(list(first.columns), PANEL_FIELDS)
+        self.assertIsNotNone(first.index.tz)
+        self.assertGreater(len(self.synthetic.history('AAPL', '5m', period='1d')), 50)
+
+    def test_synthetic_caches_belong_to_the_provider(self):
+        provider = SyntheticProvider(seed=2)
+        provider.history('AAPL')
+        self.assertEqual(provider._daily.cache_info().currsize, 1)
+        self.assertEqual(self.synthetic._daily.cache_info().currsize, 0)
+        collected = weakref.ref(provider)
+        del provider
+        gc.collect()
+        self.assertIsNone(collected())
+    
+    def test_replay_serves_recorded_fixtures(self):
+        record_fixtures(['MSFT'], root=self.root, source=self.synthetic, period='2y')
+        replay = ReplayProvider(root=self.root)
+        recorded = self.synthetic.history('MSFT', '1d', period='2y')
+        replayed = replay.history('MSFT', '1d', period='1y')
+        np.testing.assert_allclose(replayed['Close'], recorded['Close'].iloc[-len(replayed):])
+        self.assertEqual(replay.quote('MSFT')['price'], self.synthetic.quote('MSFT')['price'])
+        with self.assertRaises(ValueError):
+            replay.history('GOOGL')
+    
+    def test_engine_predicts_offline_through_provider(self):
+        set_market_data(self.synthetic)
+        self.addCleanup(set_market_data, None)
+        store = BarStore(root=self.root)
+        result = StockPredictionEngine(store=store).predict('AAPL', '1w')
+        self.assertEqual(len(result['predicted_data']['prices']), 7)
+        self.assertEqual(result['current_price'], round(self.synthetic.quote('AAPL')['price'], 2))
+
+
+class MarketDataClientTest(TestCase):
+    def setUp(self):
+        self.market = MarketDataClient(max_concurrency=3, deadline=0.5)
+        self.addCleanup(self.market.close)
+    
+    def test_deadline_returns_partial_results(self):
+        def lookup(key):
+            if key == 'SLOW':
+                time.sleep(2)
+            if key == 'BAD':
+                raise ValueError('no data')
+            return key.lower()
+        
+        started = time.perf_counter()
+        results, errors, timed_out = self.market.map(lookup, ['A', 'SLOW', 'BAD', 'B'], deadline=0.2)
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(results, {'A': 'a', 'B': 'b'})
+        self.assertEqual(list(errors), ['BAD'])
+        self.assertEqual(timed_out, ['SLOW'])
+        self.assertEqual(self.market.snapshot()['timed_out'], 1)
+    
+    def test_concurrency_is_bounded_across_callers(self):
+        lock = threading.Lock()
+        running = [0, 0]
+        
+        def lookup(key):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return key
+        
+        threads = [threading.Thread(target=self.market.map, args=(lookup, range(6))) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(running[1], 3)
+    
+    def test_quotes_use_provider(self):
+        set_market_data(SyntheticProvider(seed=1))
+        self.addCleanup(set_market_data, None)
+        results, errors, timed_out = self.market.quotes(['AAPL', 'MSFT'])
+        self.assertEqual(set(results), {'AAPL', 'MSFT'})
+        self.assertEqual(results['AAPL']['symbol'], 'AAPL')
+
+
+class SymbolDataCacheTest(TestCase):
+    def setUp(self):
+        self.calls = []
+        calls = self.calls
+        
+        class CountingProvider(SyntheticProvider):
+            def info(self, symbol):
+                calls.append(symbol)
+                return super().info(symbol)
+        
+        set_market_data(CountingProvider(seed=1))
+        self.addCleanup(set_market_data, None)
+    
+    def test_one_upstream_call_fills_quote_and_fundamentals(self):
+        cache = SymbolDataCache()
+        quotes, errors = cache.quotes(['AAPL', 'msft'])
+        self.assertEqual(set(quotes), {'AAPL', 'MSFT'})
+        self.assertEqual(errors, {})
+        fundamentals, _ = cache.fundamentals(['AAPL', 'MSFT'])
+        self.assertIn('marketCap', fundamentals['AAPL'])
+        self.assertNotIn('marketCap', cache.get_many('quote', ['AAPL'])[0]['AAPL'])
+        self.assertIn('fiftyTwoWeekHigh', cache.info('AAPL'))
+        self.assertEqual(sorted(self.calls), ['AAPL', 'MSFT'])
+    
+    def test_shared_tier_serves_other_processes(self):
+        SymbolDataCache().quotes(['AAPL'])
+        self.assertEqual(MarketDataCache.objects.count(), 2)
+        quotes, _ = SymbolDataCache().quotes(['AAPL'])
+        self.assertEqual(quotes['AAPL']['symbol'], 'AAPL')
+        self.assertEqual(self.calls, ['AAPL'])
+    
+    def test_expired_quote_is_refetched(self):
+        cache = SymbolDataCache()
+        cache.quotes(['AAPL'])
+        MarketDataCache.objects.filter(cache_key='quote:AAPL').update(expires_at=timezone.now())
+        cache.local.clear()
+        cache.fundamentals(['AAPL'])
+        self.assertEqual(self.calls, ['AAPL'])
+        cache.quotes(['AAPL'])
+        self.assertEqual(self.calls, ['AAPL', 'AAPL'])
+
+
+class MarketDataCacheTest(TestCase):
+    def test_store_many_updates_rows_in_place(self):
+        MarketDataCache.store_many({'quote:AAPL': {'price': 1}}, timedelta(minutes=1))
+        row_id = MarketDataCache.objects.get(cache_key='quote:AAPL').id
+        MarketDataCache.store_many({'quote:AAPL': {'price': 2}, 'quote:MSFT': {'price': 3}}, timedelta(minutes=1))
+        entry = MarketDataCache.objects.get(cache_key='quote:AAPL')
+        self.assertEqual((entry.id, entry.cache_data), (row_id, {'price': 2}))
+        self.assertEqual(MarketDataCache.objects.count(), 2)
+    
+    def test_insert_lost_to_another_writer_updates_its_row(self):
+        def racing_insert(create):
+            # Another writer inserts the key between our update and our insert
+            MarketDataCache.objects.create(cache_key='quote:AAPL', cache_data={'price': 0}, expires_at=timezone.now())
+            self.assertFalse(insert_unique(create))
+            return False
+        with unittest.mock.patch('prediction.models.insert_unique', racing_insert):
+            MarketDataCache.store_many({'quote:AAPL': {'price': 2}}, timedelta(minutes=1))
+        self.assertEqual(list(MarketDataCache.objects.values_list('cache_data', flat=True)), [{'price': 2}])
+
+
+def sample_result():
+    return {
+        'symbol': 'AAPL', 'timeframe': '1d',
+        'historical_data': {'dates': ['2024-01-02', '2024-01-03', '2024-01-05'], 'prices': [185.64, 184.25, 181.18]},
+        'predicted_data': {
+            'dates': ['2024-01-08'], 'prices': [182.5],
+            'bands': {'method': 'gbm', 'paths': 100, 'p5': [175.0], 'p50': [182.0], 'p95': [190.0]},
+        },
+        'trend_direction': 'neutral', 'confidence_score': 0.5, 'current_price': 181.18,
+    }
+
+
+class ColumnarFormatTest(TestCase):
+    def test_series_round_trip(self):
+        timestamps = np.array([1704153600, 1704240000, 1704412800], dtype=np.int64)
+        series = encode_series(timestamps, {'prices': [185.64, 184.25, 181.18]})
+        self.assertEqual(len(series['columns']['prices']), 12)
+        decoded = decode_series(series)
+        np.testing.assert_array_equal(decoded['t'], timestamps)
+        np.testing.assert_allclose(decoded['prices'], [185.64, 184.25, 181.18], rtol=1e-6)
+    
+    def test_prediction_columns_and_binary_payload(self):
+        compact = prediction_columns(sample_result())
+        self.assertEqual(compact['simulation'], {'method': 'gbm', 'paths': 100})
+        payload = parse_columnar(ColumnarRenderer().render(compact))
+        self.assertEqual(payload['trend_direction'], 'neutral')
+        historical = decode_series(payload['historical_data'])
+        self.assertEqual(np.datetime64(int(historical['t'][-1]), 's').astype('datetime64[D]'), np.datetime64('2024-01-05'))
+        np.testing.assert_allclose(decode_series(payload['predicted_data'])['p95'], [190.0])
+
+
 class PredictionAPITest(APITestCase):
     def test_get_available_stocks(self):
         url = reverse('prediction:available_stocks')
@@ -92,12 +743,79 @@ class PredictionAPITest(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
     
+    def test_generate_batch_prediction_invalid_symbol(self):
+        url = reverse('prediction:generate_batch_prediction')
+        data = {'symbols': ['AAPL', 'INVALID'], 'timeframe': '1d'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
     def test_download_csv_invalid_symbol(self):
         url = reverse('prediction:download_csv', kwargs={'symbol': 'INVALID', 'timeframe': '1d'})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_generate_prediction_reports_server_timing(self):
+        PredictionCache.store('AAPL_1w', {'symbol': 'AAPL', 'timeframe': '1w'}, timedelta(hours=1))
+        url = reverse('prediction:generate_prediction')
+        response = self.client.post(url, {'symbol': 'AAPL', 'timeframe': '1w'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('cache;dur=', response['Server-Timing'])
+        self.assertIn('serialization;dur=', response['Server-Timing'])
+    
+    def test_generate_prediction_compact_format(self):
+        PredictionCache.store('AAPL_1d', sample_result(), timedelta(hours=1))
+        url = reverse('prediction:generate_prediction') + '?format=columns'
+        response = self.client.post(url, {'symbol': 'AAPL', 'timeframe': '1d'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.financogram.columns')
+        payload = parse_columnar(response.content)
+        np.testing.assert_allclose(decode_series(payload['historical_data'])['prices'], [185.64, 184.25, 181.18], rtol=1e-6)
+    
+    def test_pipeline_metrics_requires_admin(self):
+        url = reverse('prediction:pipeline_metrics')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        
+        from django.contrib.auth.models import User
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_authenticate(admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('stages', response.data)
+    
+    def test_get_cache_stats(self):
+        response = self.client.get(reverse('prediction:cache_stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('coalesced', response.data)
 
 
 # Note: These tests are basic and don't test the actual ML prediction functionality
 # In a real production environment, you would want to mock the yfinance calls
 # and test the prediction logic with sample data
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'query plans are checked on SQLite')
+class QueryPlanTest(TestCase):
+    """Hot lookups must be index searches, never table scans"""
+
+    def assert_uses_index(self, queryset, index):
+        plan = queryset.explain()
+        self.assertRegex(plan, rf'SEARCH \S+ USING (COVERING )?INDEX {index}\b')
+        self.assertNotRegex(plan, r'\bSCAN\b')
+
+    def test_prediction_lookups(self):
+        self.assert_uses_index(
+            StockPrediction.objects.filter(symbol='AAPL', timeframe='1d').order_by('-created_at')[:1],
+            'prediction_symbol_tf_idx')
+        self.assert_uses_index(
+            StockPrediction.objects.filter(symbol='AAPL').order_by('-created_at')[:10], 'prediction_symbol_idx')
+        self.assertNotIn('TEMP B-TREE', StockPrediction.objects.filter(
+            symbol='AAPL', timeframe='1d').order_by('-created_at').explain())
+
+    def test_cache_lookups(self):
+        now = timezone.now()
+        self.assert_uses_index(
+            PredictionCache.objects.filter(cache_key__in=['AAPL_1d', 'MSFT_1d'], expires_at__gt=now),
+            'prediction_cache_lookup_idx')
+        self.assert_uses_index(PredictionCache.objects.filter(expires_at__lt=now), 'prediction_cache_ttl_idx')
+        self.assert_uses_index(
+            MarketDataCache.objects.filter(cache_key__in=['quote:AAPL'], expires_at__gt=now), r'\w+')
@@ -10,9 +10,14 @@ urlpatterns = [
     
     # Prediction endpoints
     path('predict/', views.generate_prediction, name='generate_prediction'),
+    path('predict/batch/', views.generate_batch_prediction, name='generate_batch_prediction'),
     path('download/<str:symbol>/<str:timeframe>/', views.download_prediction_xlsx, name='download_csv'),
     path('history/<str:symbol>/', views.get_prediction_history, name='prediction_history'),
     
     # Cache management
     path('cache/clear/', views.clear_prediction_cache, name='clear_cache'),
+    path('cache/stats/', views.get_cache_stats, name='cache_stats'),
+    
+    # Instrumentation
+    path('metrics/', views.get_pipeline_metrics, name='pipeline_metrics'),
 ]
@@ -1,9 +1,8 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
-from datetime import timedelta
 import json
 import csv
 from io import StringIO
@@ -16,9 +15,15 @@ from .models import StockPrediction, PredictionCache
 from .serializers import (
     StockPredictionSerializer, 
     PredictionRequestSerializer,
+    BatchPredictionRequestSerializer,
     StockListSerializer
 )
 from .prediction_engine import StockPredictionEngine, AVAILABLE_STOCKS
+from .columnar import SERIES_RENDERERS, is_compact, prediction_columns
+from .cache import PREDICTION_CACHE_TTL, prediction_cache, prediction_cache_key
+from .instrumentation import stage, stage_metrics, tracing_allocations
+from .warmer import save_prediction_history
+from .symbol_cache import symbol_data
 
 
 @api_view(['GET'])
@@ -37,6 +42,7 @@ def get_available_stocks(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@renderer_classes(SERIES_RENDERERS)
 def generate_prediction(request):
     """Generate stock price prediction"""
     try:
@@ -53,6 +59,7 @@ def generate_prediction(request):
         
         symbol = serializer.validated_data['symbol'].upper()
         timeframe = serializer.validated_data['timeframe']
+        simulation = serializer.get_simulation()
         
         logger.info(f"Processing prediction for {symbol} with timeframe {timeframe}")
         
@@ -64,62 +71,37 @@ def generate_prediction(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check cache first
-        cache_key = f"{symbol}_{timeframe}"
-        cached_prediction = PredictionCache.objects.filter(
-            cache_key=cache_key,
-            expires_at__gt=timezone.now()
-        ).first()
+        # Local tier, then the shared cache; concurrent misses for the same
+        # key wait for a single computation
+        cache_key = prediction_cache_key(symbol, timeframe, simulation)
+        saved = {}
         
-        if cached_prediction:
-            logger.info(f"Returning cached prediction for {symbol}")
-            return Response(cached_prediction.cache_data)
+        def compute():
+            logger.info(f"Generating new prediction for {symbol}")
+            prediction_engine = StockPredictionEngine()
+            result = prediction_engine.predict(symbol, timeframe, simulation)
+            
+            # Save prediction to database
+            try:
+                prediction = StockPrediction.from_result(result)
+                with stage('db'):
+                    prediction.save()
+                saved['prediction_id'] = prediction.id
+                logger.info(f"Prediction saved to database with ID: {prediction.id}")
+            except Exception as db_error:
+                logger.error(f"Database save error: {str(db_error)}")
+                # Continue without saving to database if there's an error
+            return result
         
-        # Generate new prediction
-        logger.info(f"Generating new prediction for {symbol}")
-        prediction_engine = StockPredictionEngine()
-        prediction_result = prediction_engine.predict(symbol, timeframe)
-        
-        logger.info(f"Prediction generated successfully for {symbol}")
-        
-        # Save prediction to database
-        try:
-            prediction = StockPrediction.objects.create(
-                symbol=symbol,
-                timeframe=timeframe,
-                historical_data=prediction_result['historical_data'],
-                predicted_data=prediction_result['predicted_data'],
-                trend_direction=prediction_result['trend_direction'],
-                confidence_score=prediction_result['confidence_score'],
-                recommendation=prediction_result['recommendation'],
-                model_used=prediction_result['model_used'],
-                current_price=prediction_result['current_price'],
-                predicted_end_price=prediction_result['predicted_end_price'],
-                expected_return=prediction_result['expected_return']
-            )
-            logger.info(f"Prediction saved to database with ID: {prediction.id}")
-        except Exception as db_error:
-            logger.error(f"Database save error: {str(db_error)}")
-            # Continue without saving to database if there's an error
-        
-        # Cache the prediction for 1 hour
-        try:
-            cache_expiry = timezone.now() + timedelta(hours=1)
-            PredictionCache.objects.create(
-                cache_key=cache_key,
-                cache_data=prediction_result,
-                expires_at=cache_expiry
-            )
-            logger.info(f"Prediction cached for {symbol}")
-        except Exception as cache_error:
-            logger.error(f"Cache error: {str(cache_error)}")
-            # Continue without caching if there's an error
+        prediction_result = prediction_cache.get_or_compute(cache_key, compute, PREDICTION_CACHE_TTL)
         
-        # Add prediction ID to response if available
-        if 'prediction' in locals():
-            prediction_result['prediction_id'] = prediction.id
+        # Add prediction ID to response if this request generated it
+        if saved:
+            prediction_result = dict(prediction_result, **saved)
         
         logger.info(f"Returning prediction result for {symbol}")
+        if is_compact(request):
+            prediction_result = prediction_columns(prediction_result)
         return Response(prediction_result)
         
     except ValueError as e:
@@ -139,6 +121,70 @@ def generate_prediction(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@renderer_classes(SERIES_RENDERERS)
+def generate_batch_prediction(request):
+    """Generate predictions for many stocks from a single bulk fetch"""
+    try:
+        serializer = BatchPredictionRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid request data', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        symbols = [s.upper() for s in serializer.validated_data.get('symbols', AVAILABLE_STOCKS)]
+        symbols = list(dict.fromkeys(symbols))
+        timeframe = serializer.validated_data['timeframe']
+        simulation = serializer.get_simulation()
+        
+        unavailable = [s for s in symbols if s not in AVAILABLE_STOCKS]
+        if unavailable:
+            return Response(
+                {'error': f'Stocks not available for prediction: {", ".join(unavailable)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        cache_keys = {prediction_cache_key(symbol, timeframe, simulation): symbol for symbol in symbols}
+        
+        def compute_many(keys):
+            logger.info(f"Generating batch prediction for {len(keys)} uncached symbols")
+            prediction_engine = StockPredictionEngine()
+            computed, failed = prediction_engine.predict_batch([cache_keys[k] for k in keys], timeframe, simulation)
+            save_prediction_history(computed.values())
+            return (
+                {prediction_cache_key(s, timeframe, simulation): r for s, r in computed.items()},
+                {prediction_cache_key(s, timeframe, simulation): e for s, e in failed.items()},
+            )
+        
+        found, failed = prediction_cache.get_or_compute_many(list(cache_keys), compute_many, PREDICTION_CACHE_TTL)
+        results = {cache_keys[k]: v for k, v in found.items()}
+        errors = {cache_keys[k]: e for k, e in failed.items()}
+        encode = prediction_columns if is_compact(request) else (lambda result: result)
+        
+        return Response({
+            'timeframe': timeframe,
+            'results': [encode(results[s]) for s in symbols if s in results],
+            'errors': errors
+        })
+        
+    except ValueError as e:
+        error_msg = f"Validation error: {str(e)}"
+        logger.error(f"ValueError: {error_msg}")
+        return Response(
+            {'error': error_msg, 'type': 'validation_error'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        error_msg = f'Batch prediction failed: {str(e)}'
+        logger.error(f"Exception: {error_msg}")
+        return Response(
+            {'error': error_msg, 'type': 'server_error', 'details': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 from django.http import HttpResponse
 
 # @api_view(['GET'])
@@ -322,17 +368,33 @@ def get_stock_info(request, symbol):
             )
         
         current_price = stock_data['Close'].iloc[-1]
-        price_change = stock_data['Close'].iloc[-1] - stock_data['Close'].iloc[-2]
-        price_change_pct = (price_change / stock_data['Close'].iloc[-2]) * 100
+        previous_close = stock_data['Close'].iloc[-2]
+        volume = stock_data['Volume'].iloc[-1]
+        high_52w = stock_data['High'].max()
+        low_52w = stock_data['Low'].min()
+        
+        # Live quote and 52-week range from the shared symbol cache, when upstream has them
+        try:
+            info = symbol_data.info(symbol)
+            current_price = info.get('regularMarketPrice') or current_price
+            previous_close = info.get('regularMarketPreviousClose') or info.get('previousClose') or previous_close
+            volume = info.get('regularMarketVolume') or info.get('volume') or volume
+            high_52w = info.get('fiftyTwoWeekHigh') or high_52w
+            low_52w = info.get('fiftyTwoWeekLow') or low_52w
+        except ValueError as e:
+            logger.warning(f"Using bar data for {symbol} info: {str(e)}")
+        
+        price_change = current_price - previous_close
+        price_change_pct = (price_change / previous_close) * 100
         
         stock_info = {
             'symbol': symbol.upper(),
             'current_price': round(current_price, 2),
             'price_change': round(price_change, 2),
             'price_change_pct': round(price_change_pct, 2),
-            'volume': int(stock_data['Volume'].iloc[-1]),
-            'high_52w': round(stock_data['High'].max(), 2),
-            'low_52w': round(stock_data['Low'].min(), 2),
+            'volume': int(volume),
+            'high_52w': round(high_52w, 2),
+            'low_52w': round(low_52w, 2),
             'last_updated': stock_data.index[-1].strftime('%Y-%m-%d %H:%M:%S')
         }
         
@@ -355,6 +417,7 @@ def clear_prediction_cache(request):
         )
         count = expired_cache.count()
         expired_cache.delete()
+        prediction_cache.clear_local(expired_only=True)
         
         return Response({
             'message': f'Cleared {count} expired cache entries',
@@ -366,3 +429,21 @@ def clear_prediction_cache(request):
             {'error': f'Failed to clear cache: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_cache_stats(request):
+    """Hit/miss and request coalescing counters of the prediction and symbol caches"""
+    return Response(dict(prediction_cache.snapshot(), symbol_data=symbol_data.snapshot()))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_pipeline_metrics(request):
+    """Per-stage latency histograms of the prediction pipeline in this process"""
+    return Response({
+        'allocation_tracing': bool(tracing_allocations()),
+        'stages': stage_metrics.snapshot(),
+        'cache': prediction_cache.snapshot(),
+    })
@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .cache import PREDICTION_CACHE_TTL, prediction_cache, prediction_cache_key
+from .instrumentation import stage
+from .models import StockPrediction, PredictionCache
+from .prediction_engine import StockPredictionEngine, AVAILABLE_STOCKS
+
+logger = logging.getLogger(__name__)
+
+TIMEFRAMES = ['1d', '1w', '1m']
+
+
+def save_prediction_history(results):
+    """Record prediction results in StockPrediction with one bulk insert"""
+    try:
+        with stage('db'):
+            StockPrediction.objects.bulk_create([StockPrediction.from_result(r) for r in results])
+    except Exception as db_error:
+        logger.error(f"Database save error: {str(db_error)}")
+
+
+def store_predictions(results, simulation=None):
+    """Save prediction results to history and (re)place their cache entries"""
+    results = list(results)
+    save_prediction_history(results)
+    prediction_cache.set_many({
+        prediction_cache_key(r['symbol'], r['timeframe'], simulation): r for r in results
+    }, PREDICTION_CACHE_TTL)
+
+
+class PredictionWarmer:
+    """Refresh-ahead for PredictionCache.
+
+    Every symbol x timeframe pair is recomputed before its entry expires, in
+    small batches spaced out over the cycle and with bounded concurrency, so
+    request handlers almost always find a fresh entry.
+    """
+
+    def __init__(self, symbols=None, timeframes=None, refresh_ahead=None,
+                 max_concurrency=None, batch_size=None):
+        self.symbols = list(symbols or AVAILABLE_STOCKS)
+        self.timeframes = list(timeframes or TIMEFRAMES)
+        self.refresh_ahead = refresh_ahead or timedelta(seconds=settings.PREDICTION_WARMER_REFRESH_AHEAD)
+        self.max_concurrency = max_concurrency or settings.PREDICTION_WARMER_CONCURRENCY
+        self.batch_size = batch_size or settings.PREDICTION_WARMER_BATCH_SIZE
+        self.engine = StockPredictionEngine()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {
+            'cycles': 0,
+            'refreshed': 0,
+            'failed': 0,
+            'last_cycle_at': None,
+            # Seconds between an entry's expiry and its refresh; negative means
+            # it was refreshed ahead of time, positive means users saw a miss
+            'recent_lag_seconds': deque(maxlen=500),
+            'max_lag_seconds': None,
+        }
+
+    def due(self, now=None):
+        """Pairs that are missing or expire within the refresh-ahead window, most urgent first"""
+        now = now or timezone.now()
+        keys = {prediction_cache_key(s, tf): (s, tf) for tf in self.timeframes for s in self.symbols}
+        expiries = dict(
+            PredictionCache.objects.filter(cache_key__in=list(keys)).values_list('cache_key', 'expires_at')
+        )
+        due = []
+        for key, (symbol, timeframe) in keys.items():
+            expires_at = expiries.get(key)
+            if expires_at is None or expires_at <= now + self.refresh_ahead:
+                due.append((symbol, timeframe, expires_at))
+        due.sort(key=lambda item: item[2] or now - self.refresh_ahead)
+        return due
+
+    def batches(self, due):
+        """Split due pairs into per-timeframe batches for predict_batch"""
+        by_timeframe = {}
+        for symbol, timeframe, expires_at in due:
+            by_timeframe.setdefault(timeframe, []).append((symbol, expires_at))
+        batches = []
+        for timeframe, items in by_timeframe.items():
+            for i in range(0, len(items), self.batch_size):
+                batches.append((timeframe, items[i:i + self.batch_size]))
+        return batches
+
+    def refresh_batch(self, timeframe, items):
+        try:
+            expiries = dict(items)
+            results, errors = self.engine.predict_batch(list(expiries), timeframe)
+            store_predictions(results.values())
+            now = timezone.now()
+            with self._lock:
+                self.stats['refreshed'] += len(results)
+                self.stats['failed'] += len(errors)
+                for symbol in results:
+                    if expiries[symbol] is not None:
+                        lag = (now - expiries[symbol]).total_seconds()
+                        self.stats['recent_lag_seconds'].append(lag)
+                        self.stats['max_lag_seconds'] = max(lag, self.stats['max_lag_seconds'] or lag)
+            for symbol, error in errors.items():
+                logger.warning(f"Warmer failed for {symbol} {timeframe}: {error}")
+        except Exception as e:
+            with self._lock:
+                self.stats['failed'] += len(items)
+            logger.error(f"Warmer batch failed for {timeframe}: {str(e)}")
+
+    def _refresh_in_thread(self, timeframe, items):
+        # Pool threads own their DB connections, so drop stale ones around each batch
+        close_old_connections()
+        try:
+            self.refresh_batch(timeframe, items)
+        finally:
+            close_old_connections()
+
+    def run_once(self, spread_over=0):
+        """Refresh everything that is due, spacing batches across `spread_over` seconds"""
+        batches = self.batches(self.due())
+        if batches and self.max_concurrency <= 1 and not spread_over:
+            for timeframe, items in batches:
+                self.refresh_batch(timeframe, items)
+        elif batches:
+            spacing = spread_over / len(batches)
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                futures = []
+                for timeframe, items in batches:
+                    futures.append(executor.submit(self._refresh_in_thread, timeframe, items))
+                    if spacing and self._stop.wait(spacing):
+                        break
+                wait(futures)
+        with self._lock:
+            self.stats['cycles'] += 1
+            self.stats['last_cycle_at'] = timezone.now()
+        return len(batches)
+
+    def run_forever(self, interval=None):
+        interval = interval or settings.PREDICTION_WARMER_INTERVAL
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once(spread_over=interval / 2)
+            except Exception as e:
+                logger.error(f"Warmer cycle failed: {str(e)}")
+            self._stop.wait(max(0, interval - (time.monotonic() - started)))
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        """Copy of the stats that is safe to serialize"""
+        with self._lock:
+            stats = {k: v for k, v in self.stats.items() if k != 'recent_lag_seconds'}
+            lags = list(self.stats['recent_lag_seconds'])
+        stats['avg_lag_seconds'] = sum(lags) / len(lags) if lags else None
+        return stats
+
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Investment
+from .models import Investment, MutualFundScheme, NewsArticle, SipInstalment
 
 # Register your models here.
-admin.site.register(Investment)
\ No newline at end of file
+admin.site.register(Investment)
+admin.site.register(MutualFundScheme)
+admin.site.register(SipInstalment)
+admin.site.register(NewsArticle)
@@ -0,0 +1,113 @@
+import numpy as np
+from django.conf import settings
+
+from prediction.bar_store import REFRESH_SECONDS, get_bar_store
+from prediction.cache import LocalTTLCache
+from prediction.columnar import encode_series
+
+# Bar interval used for each chart period
+CHART_INTERVALS = {
+    "1d": "5m",
+    "5d": "30m",
+    "1mo": "1d",
+    "6mo": "1d",
+    "ytd": "1d",
+    "1y": "1d",
+    "5y": "1wk",
+    "max": "1mo"
+}
+INTRADAY_INTERVALS = {"5m", "15m", "30m"}
+
+# Downsampled variants kept per cached series
+MAX_VARIANTS = 8
+
+chart_cache = LocalTTLCache(max_entries=settings.CHART_CACHE_ENTRIES)
+
+
+def lttb(x, y, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps.
+
+    Keeps the first and last points and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the point
+    kept before it and the mean of the next bucket. Peaks and troughs survive
+    where plain striding would skip them.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        # Mean of the next bucket (just the last point for the final bucket)
+        next_x = x[hi:next_hi].mean() if next_hi > hi else x[-1]
+        next_y = y[hi:next_hi].mean() if next_hi > hi else y[-1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def build_series(symbol, period, interval):
+    hist = get_bar_store().history(symbol, period=period, interval=interval)
+    prices = hist['Close'].ffill()
+    # Sessions before the first close have nothing to plot (and NaN is not valid JSON)
+    prices = prices[prices.notna()]
+    fmt = "%b %d %H:%M" if interval in INTRADAY_INTERVALS else "%b %d %Y"
+    return {
+        'x': prices.index.asi8 // 10**9,
+        'y': prices.to_numpy(dtype=np.float64),
+        'dates': prices.index.strftime(fmt).tolist(),
+        'prices': prices.tolist(),
+        'variants': {},
+    }
+
+
+def chart_ttl(interval):
+    """Cached series live as long as the bar store keeps bars of that interval"""
+    return REFRESH_SECONDS.get(interval, 300)
+
+
+def chart_series(symbol, period):
+    interval = CHART_INTERVALS.get(period, "30m")
+    return chart_cache.get_or_compute(
+        (symbol.upper(), period),
+        lambda: build_series(symbol, period, interval),
+        chart_ttl(interval),
+    )
+
+
+def downsampled(series, points=None):
+    """Row indices to send for `points`, or None for the whole series"""
+    if not points or points >= len(series['prices']):
+        return None
+    kept = series['variants'].get(points)
+    if kept is None:
+        kept = lttb(series['x'], series['y'], points)
+        if len(series['variants']) >= MAX_VARIANTS:
+            series['variants'].clear()
+        series['variants'][points] = kept
+    return kept
+
+
+def get_chart(symbol, period, points=None):
+    """{'dates', 'prices'} for a chart period, optionally reduced to `points` with LTTB"""
+    series = chart_series(symbol, period)
+    kept = downsampled(series, points)
+    if kept is None:
+        return {'dates': series['dates'], 'prices': series['prices']}
+    return {
+        'dates': [series['dates'][i] for i in kept],
+        'prices': [series['prices'][i] for i in kept],
+    }
+
+
+def get_chart_columns(symbol, period, points=None):
+    """The same chart as an encoded series (epoch timestamps, float32 prices)"""
+    series = chart_series(symbol, period)
+    kept = downsampled(series, points)
+    x, y = (series['x'], series['y']) if kept is None else (series['x'][kept], series['y'][kept])
+    return {'symbol': symbol.upper(), 'period': period, 'series': encode_series(x, {'prices': y})}
@@ -0,0 +1,153 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from Financogram.db import bulk_update
+from .models import MutualFundScheme
+from .nav_store import get_nav_store
+
+logger = logging.getLogger(__name__)
+
+# Trailing periods in months, with the model field holding each point-to-point return
+PERIODS = {
+    '1M': (1, 'return_1m'),
+    '6M': (6, 'return_6m'),
+    '1Y': (12, 'returns'),
+    '3Y': (36, 'return_3y'),
+    '5Y': (60, 'return_5y'),
+}
+# Periods longer than a year also get a compound annual growth rate
+CAGR_FIELDS = {'3Y': 'cagr_3y', '5Y': 'cagr_5y'}
+METRIC_FIELDS = [field for _, field in PERIODS.values()] + list(CAGR_FIELDS.values()) + [
+    'volatility', 'max_drawdown', 'returns_as_of']
+
+TRADING_DAYS = 252
+# Days of history kept before the longest period, so its start NAV can be carried over a holiday
+START_PAD_DAYS = 10
+# Fewer daily returns than this in the last year leave volatility empty
+MIN_VOLATILITY_RETURNS = 20
+
+
+def align(days_list, navs_list, start):
+    """(dates, funds x dates NAV matrix) on the union of NAV dates from `start`.
+
+    Each fund's NAV is carried forward over dates it did not publish on and
+    is NaN before its first NAV.
+    """
+    windows = [days >= start for days in days_list]
+    dates = np.unique(np.concatenate([days[w] for days, w in zip(days_list, windows)]))
+    matrix = np.full((len(days_list), len(dates)), np.nan)
+    for row, (days, navs, window) in enumerate(zip(days_list, navs_list, windows)):
+        matrix[row, np.searchsorted(dates, days[window])] = navs[window]
+    filled = np.where(np.isnan(matrix), 0, np.arange(len(dates)))
+    np.maximum.accumulate(filled, axis=1, out=filled)
+    return dates, np.take_along_axis(matrix, filled, axis=1)
+
+
+def period_starts(last_days, months):
+    """The day `months` calendar months before each of last_days"""
+    ends = pd.DatetimeIndex(np.asarray(last_days).astype('datetime64[D]'))
+    return (ends - pd.DateOffset(months=months)).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def compute_metrics(days_list, navs_list):
+    """Returns, CAGR, volatility and max drawdown for many NAV series in one pass.
+
+    Every figure is measured back from each fund's own last NAV. Returns a
+    dict of arrays with one entry per fund, NaN where a fund's history is too
+    short. Figures are percentages.
+    """
+    count = len(days_list)
+    rows = np.arange(count)
+    last = np.array([int(days[-1]) for days in days_list], dtype=np.int64)
+    longest = max(months for months, _ in PERIODS.values())
+    dates, matrix = align(days_list, navs_list, period_starts([last.min()], longest)[0] - START_PAD_DAYS)
+    end = np.searchsorted(dates, last)
+    latest = matrix[rows, end]
+
+    metrics = {'returns_as_of': last}
+    starts = {}
+    for label, (months, field) in PERIODS.items():
+        # NAV on the period's first day, or the last one published before it
+        starts[label] = np.searchsorted(dates, period_starts(last, months), side='right') - 1
+        ratio = latest / np.where(starts[label] >= 0, matrix[rows, np.maximum(starts[label], 0)], np.nan)
+        metrics[field] = (ratio - 1) * 100
+        if label in CAGR_FIELDS:
+            metrics[CAGR_FIELDS[label]] = (ratio ** (12 / months) - 1) * 100
+
+    columns = np.arange(len(dates))[None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Annualized standard deviation of daily log returns over the last year
+        log_returns = np.diff(np.log(matrix), axis=1)
+        window = (columns[:, :-1] >= starts['1Y'][:, None]) & (columns[:, :-1] < end[:, None])
+        window &= ~np.isnan(log_returns)
+        n = window.sum(axis=1)
+        picked = np.where(window, log_returns, 0)
+        mean = picked.sum(axis=1) / np.maximum(n, 1)
+        variance = (np.where(window, log_returns - mean[:, None], 0) ** 2).sum(axis=1) / np.maximum(n - 1, 1)
+        metrics['volatility'] = np.where(
+            n >= MIN_VOLATILITY_RETURNS, np.sqrt(variance * TRADING_DAYS) * 100, np.nan)
+
+        # Deepest fall from a running peak within the last five years (or since launch)
+        window = (columns >= np.maximum(starts['5Y'], 0)[:, None]) & (columns <= end[:, None])
+        values = np.where(window, matrix, np.nan)
+        drawdown = values / np.fmax.accumulate(values, axis=1) - 1
+        metrics['max_drawdown'] = np.where(np.isnan(drawdown), 0, drawdown).min(axis=1) * 100
+    return metrics
+
+
+def returns_detail(scheme):
+    """Stored metrics of a scheme (a MutualFundScheme or a values() row) for API responses"""
+    get = scheme.get if isinstance(scheme, dict) else (lambda field: getattr(scheme, field))
+    as_of = get('returns_as_of')
+    return {
+        'as_of': as_of.strftime('%d-%m-%Y') if as_of else None,
+        'absolute': {label: get(field) for label, (_, field) in PERIODS.items()},
+        'cagr': dict({'1Y': get('returns')}, **{label: get(field) for label, field in CAGR_FIELDS.items()}),
+        'volatility': get('volatility'),
+        'max_drawdown': get('max_drawdown'),
+    }
+
+
+def refresh_fund_returns(scheme_codes=None, store=None, chunk_size=None):
+    """Compute and store the metrics of every catalog scheme with NAVs in the store.
+
+    Schemes are processed in chunks of funds with nearby last NAV dates, so
+    funds that stopped publishing years ago do not widen every chunk's date
+    range. Returns the number of schemes updated.
+    """
+    store = store or get_nav_store()
+    chunk_size = chunk_size or settings.FUND_RETURNS_CHUNK_SIZE
+    codes = set(store.scheme_codes() if scheme_codes is None else scheme_codes)
+    schemes = {s.scheme_code: s for s in MutualFundScheme.objects.filter(scheme_code__in=list(codes))}
+    started = time.perf_counter()
+
+    series = []
+    for code in schemes:
+        nav_series = store.read(code)
+        if len(nav_series):
+            series.append((code, nav_series.days, nav_series.navs))
+    series.sort(key=lambda item: int(item[1][-1]))
+
+    now = timezone.now()
+    updated = []
+    for offset in range(0, len(series), chunk_size):
+        chunk = series[offset:offset + chunk_size]
+        metrics = compute_metrics([days for _, days, _ in chunk], [navs for _, _, navs in chunk])
+        as_of = np.asarray(metrics.pop('returns_as_of')).astype('datetime64[D]').tolist()
+        for row, (code, _, _) in enumerate(chunk):
+            scheme = schemes[code]
+            for field, values in metrics.items():
+                value = float(values[row])
+                setattr(scheme, field, None if np.isnan(value) else round(value, 2))
+            scheme.returns_as_of = as_of[row]
+            scheme.updated_at = now
+            updated.append(scheme)
+
+    bulk_update(MutualFundScheme, updated, METRIC_FIELDS + ['updated_at'], batch_size=500)
+    logger.info(f"Fund returns computed for {len(updated)} schemes in {time.perf_counter() - started:.2f}s")
+    return len(updated)
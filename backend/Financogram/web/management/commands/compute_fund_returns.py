@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from web.fund_returns import refresh_fund_returns
+from web.models import MutualFundScheme
+from web.nav_store import get_nav_store
+
+
+class Command(BaseCommand):
+    help = 'Compute trailing returns, volatility and max drawdown for every fund with stored NAVs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync', action='store_true',
+                            help='First bring the NAV history of active catalog schemes up to date')
+        parser.add_argument('--active-days', type=int, default=30,
+                            help='With --sync, schemes whose latest NAV is at most this many days old')
+        parser.add_argument('--schemes', nargs='+', type=int, help='Only these scheme codes')
+
+    def handle(self, *args, **options):
+        store = get_nav_store()
+        if options['sync']:
+            codes = options['schemes']
+            if codes is None:
+                since = timezone.now().date() - timedelta(days=options['active_days'])
+                codes = list(MutualFundScheme.objects.filter(nav_date__gte=since)
+                             .values_list('scheme_code', flat=True))
+                codes = sorted(set(codes) | set(store.scheme_codes()))
+            updated = store.update_many(codes)
+            self.stdout.write(f"NAV history: {len(updated)} schemes synced, "
+                              f"{sum(updated.values())} new NAVs")
+        count = refresh_fund_returns(options['schemes'], store=store)
+        self.stdout.write(self.style.SUCCESS(f"Returns computed for {count} schemes"))
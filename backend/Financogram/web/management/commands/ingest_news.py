@@ -0,0 +1,33 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from web.news import ingest_news, run_poller
+
+
+class Command(BaseCommand):
+    help = 'Poll NewsAPI into the local news store, once or every NEWS_POLL_INTERVAL seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Poll once and exit')
+        parser.add_argument('--interval', type=int, default=None, help='Seconds between polls')
+        parser.add_argument('--queries', nargs='+', help='NewsAPI queries (default: NEWS_QUERIES)')
+        parser.add_argument('--force', action='store_true',
+                            help='Poll even if another process polled within NEWS_POLL_INTERVAL')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            added = ingest_news(options['queries'], force=options['force'])
+            if added is None:
+                self.stdout.write('Skipped: news was polled within NEWS_POLL_INTERVAL (use --force)')
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Stored {added} new articles"))
+            return
+
+        self.stdout.write('News poller running, press Ctrl+C to stop')
+        try:
+            run_poller(options['interval'] or settings.NEWS_POLL_INTERVAL, threading.Event(),
+                       options['queries'], options['force'])
+        except KeyboardInterrupt:
+            pass
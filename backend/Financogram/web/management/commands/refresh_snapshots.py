@@ -0,0 +1,29 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from web.snapshot import run_refresher
+from web.views import index_snapshot, stock_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Refresh the stock and index quote snapshots, once or every MARKET_SNAPSHOT_INTERVAL seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Refresh once and exit')
+        parser.add_argument('--interval', type=int, default=None, help='Seconds between refreshes')
+
+    def handle(self, *args, **options):
+        snapshots = [stock_snapshot, index_snapshot]
+        if options['once']:
+            for snapshot in snapshots:
+                refreshed = snapshot.refresh()
+                self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} {snapshot.name} quotes"))
+            return
+
+        self.stdout.write('Snapshot refresher running, press Ctrl+C to stop')
+        try:
+            run_refresher(snapshots, options['interval'] or settings.MARKET_SNAPSHOT_INTERVAL, threading.Event())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from web.sip import run_sips
+
+
+class Command(BaseCommand):
+    help = 'Create the instalments of every SIP due on a day (safe to run again for the same day)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Due date as YYYY-MM-DD (default: today)')
+        parser.add_argument('--chunk-size', type=int, help='SIPs per batch (default: SIP_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            day = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else timezone.localdate()
+        except ValueError:
+            raise CommandError(f"Invalid date: {options['date']} (expected YYYY-MM-DD)")
+        stats = run_sips(day, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"SIPs due {day}: {stats['due']}, paid {stats['paid']}, failed {stats['failed']}, "
+            f"already run {stats['skipped']}"))
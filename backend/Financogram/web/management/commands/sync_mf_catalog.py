@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from web.mf_catalog import sync_details, sync_scheme_list
+
+
+class Command(BaseCommand):
+    help = 'Sync the mutual fund catalog from mfapi.in (new schemes, then stale details)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--details', type=int, default=2000,
+                            help='Most schemes whose details are refreshed in this run (0 to skip)')
+        parser.add_argument('--skip-list', action='store_true', help='Only refresh details')
+
+    def handle(self, *args, **options):
+        if not options['skip_list']:
+            added, updated = sync_scheme_list()
+            self.stdout.write(f"Scheme list: {added} added, {updated} updated")
+        if options['details']:
+            refreshed = sync_details(limit=options['details'])
+            self.stdout.write(self.style.SUCCESS(f"Refreshed details for {refreshed} schemes"))
@@ -0,0 +1,329 @@
+import base64
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from Financogram.db import bulk_update
+from .models import MutualFundScheme
+
+logger = logging.getLogger(__name__)
+
+MFAPI_URL = 'https://api.mfapi.in/mf'
+
+# Minimum investment shown for every fund (mfapi.in does not publish one)
+MIN_INVESTMENT = 500
+
+
+def fetch_scheme_list():
+    """Every scheme on mfapi.in as [{schemeCode, schemeName, ...}]"""
+    response = requests.get(MFAPI_URL, timeout=60)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_latest(scheme_code):
+    """Scheme metadata and latest NAV: {'meta': {...}, 'data': [{'date', 'nav'}]}"""
+    response = requests.get(f"{MFAPI_URL}/{scheme_code}/latest", timeout=15)
+    response.raise_for_status()
+    return response.json()
+
+
+def sync_scheme_list(fetch=fetch_scheme_list):
+    """Add new schemes and pick up renames and reordering; returns (added, updated)"""
+    schemes = fetch()
+    existing = {code: (name, position) for code, name, position in
+                MutualFundScheme.objects.values_list('scheme_code', 'name', 'position')}
+    ids = dict(MutualFundScheme.objects.values_list('scheme_code', 'id'))
+    added, changed, seen = [], [], set()
+    now = timezone.now()
+    for position, scheme in enumerate(schemes):
+        try:
+            code = int(scheme['schemeCode'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        name = (scheme.get('schemeName') or '').strip()
+        if code in seen or not name:
+            continue
+        seen.add(code)
+        if code not in existing:
+            added.append(MutualFundScheme(scheme_code=code, name=name, position=position))
+        elif existing[code] != (name, position):
+            changed.append(MutualFundScheme(id=ids[code], scheme_code=code, name=name,
+                                            position=position, updated_at=now))
+    MutualFundScheme.objects.bulk_create(added, batch_size=1000)
+    bulk_update(MutualFundScheme, changed, ['name', 'position', 'updated_at'], batch_size=1000)
+    logger.info(f"Mutual fund catalog: {len(added)} new schemes, {len(changed)} updated")
+    return len(added), len(changed)
+
+
+def parse_nav_date(value):
+    try:
+        return datetime.strptime(value, '%d-%m-%Y').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def sync_details(codes=None, limit=None, max_age=None, fetch=fetch_latest, workers=None):
+    """Refresh category, fund house and latest NAV for schemes not synced within max_age.
+
+    With codes, only those schemes are considered. Returns the number of
+    schemes refreshed.
+    """
+    max_age = max_age if max_age is not None else timedelta(hours=settings.MF_CATALOG_DETAIL_MAX_AGE)
+    now = timezone.now()
+    due = MutualFundScheme.objects.filter(
+        Q(detail_synced_at__isnull=True) | Q(detail_synced_at__lt=now - max_age))
+    if codes is not None:
+        due = due.filter(scheme_code__in=list(codes))
+    due = list(due.order_by('detail_synced_at', 'position')[:limit] if limit else due.order_by('position'))
+    if not due:
+        return 0
+
+    def fetch_one(scheme):
+        try:
+            return scheme, fetch(scheme.scheme_code)
+        except Exception as e:
+            logger.warning(f"Detail sync failed for scheme {scheme.scheme_code}: {str(e)}")
+            return scheme, None
+
+    refreshed = []
+    with ThreadPoolExecutor(max_workers=workers or settings.MF_CATALOG_SYNC_WORKERS) as executor:
+        for scheme, detail in executor.map(fetch_one, due):
+            if not detail:
+                continue
+            meta = detail.get('meta') or {}
+            latest = (detail.get('data') or [{}])[0]
+            scheme.fund_house = meta.get('fund_house') or scheme.fund_house
+            scheme.scheme_type = meta.get('scheme_type') or scheme.scheme_type
+            scheme.category = meta.get('scheme_category') or scheme.category
+            scheme.risk = meta.get('risk') or scheme.risk
+            try:
+                scheme.nav = float(latest.get('nav'))
+                scheme.nav_date = parse_nav_date(latest.get('date'))
+            except (TypeError, ValueError):
+                pass
+            scheme.detail_synced_at = scheme.updated_at = now
+            refreshed.append(scheme)
+    bulk_update(MutualFundScheme, refreshed, [
+        'fund_house', 'scheme_type', 'category', 'risk', 'nav', 'nav_date', 'detail_synced_at', 'updated_at',
+    ], batch_size=500)
+    return len(refreshed)
+
+
+def normalize(text):
+    return re.sub(r'[^a-z0-9]+', ' ', (text or '').lower()).strip()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def fund_response(row):
+    """A catalog row as a fund in /web/mutual-funds/ responses"""
+    return {
+        "id": row['scheme_code'],
+        "name": row['name'],
+        "nav": row['nav'] if row['nav'] is not None else 0.0,
+        "returns": row['returns'],
+        "category": row['category'],
+        "risk": row['risk'],
+        "fund_house": row['fund_house'],
+        "min_investment": MIN_INVESTMENT
+    }
+
+
+def encode_cursor(score, key):
+    raw = json.dumps([int(score), key[0], key[1]], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        score, name, code = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return int(score), (str(name), int(code))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+class CatalogIndex:
+    """In-memory search index over catalog rows.
+
+    Rows are kept in (normalized name, scheme code) order, so that order is
+    both the browse order and the tie-break for ranked results. Words are
+    held in one sorted array for prefix lookups, and every 3-character
+    substring of a name maps to the rows containing it for substring
+    matches.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (normalize(row['name']), row['scheme_code']))
+        self.rows = rows
+        self.texts = [normalize(f"{row['name']} {row['fund_house'] or ''}") for row in rows]
+        self.keys = [(normalize(row['name']), row['scheme_code']) for row in rows]
+
+        words = sorted((word, i) for i, text in enumerate(self.texts) for word in set(text.split()))
+        self.words = [word for word, _ in words]
+        self.word_rows = np.array([i for _, i in words], dtype=np.int32)
+
+        postings = {}
+        for i, text in enumerate(self.texts):
+            for gram in trigrams(text):
+                postings.setdefault(gram, []).append(i)
+        self.trigrams = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+        self.categories, self.category_codes = self._codes('category')
+        self.risks, self.risk_codes = self._codes('risk')
+        self.fund_houses, self.fund_house_codes = self._codes('fund_house')
+
+    def _codes(self, field):
+        values = [(row[field] or '').lower() for row in self.rows]
+        labels, codes = np.unique(np.array(values, dtype=object), return_inverse=True) if values else ([], [])
+        return {label: i for i, label in enumerate(labels)}, np.asarray(codes, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _word_range(self, token, prefix=True):
+        lo = bisect.bisect_left(self.words, token)
+        hi = bisect.bisect_left(self.words, token + '\uffff') if prefix else bisect.bisect_right(self.words, token)
+        return np.unique(self.word_rows[lo:hi])
+
+    def _substring(self, token):
+        grams = sorted(trigrams(token), key=lambda g: len(self.trigrams.get(g, ())))
+        if not grams or grams[0] not in self.trigrams:
+            return np.empty(0, dtype=np.int32)
+        candidates = self.trigrams[grams[0]]
+        for gram in grams[1:]:
+            candidates = np.intersect1d(candidates, self.trigrams.get(gram, ()), assume_unique=True)
+            if not len(candidates):
+                break
+        return np.array([i for i in candidates if token in self.texts[i]], dtype=np.int32)
+
+    def _filter(self, mask, labels, codes, value):
+        if not value:
+            return mask
+        code = labels.get(value.lower())
+        if code is None:
+            return np.zeros(len(self.rows), dtype=bool)
+        return mask & (codes == code)
+
+    def search(self, query='', category=None, risk=None, fund_house=None, limit=20, cursor=None):
+        """(rows, next_cursor, total) ranked by match quality, then name.
+
+        Every query word must match: a whole word scores 3, a word prefix 2
+        and a substring of 3+ characters 1.
+        """
+        n = len(self.rows)
+        tokens = normalize(query).split()
+        scores = np.zeros(n, dtype=np.int32)
+        mask = np.ones(n, dtype=bool)
+        for token in tokens:
+            token_score = np.zeros(n, dtype=np.int32)
+            if len(token) >= 3:
+                token_score[self._substring(token)] = 1
+            token_score[self._word_range(token)] = 2
+            token_score[self._word_range(token, prefix=False)] = 3
+            mask &= token_score > 0
+            scores += token_score
+        mask = self._filter(mask, self.categories, self.category_codes, category)
+        mask = self._filter(mask, self.risks, self.risk_codes, risk)
+        mask = self._filter(mask, self.fund_houses, self.fund_house_codes, fund_house)
+
+        matches = np.flatnonzero(mask)
+        order = matches[np.lexsort((matches, -scores[matches]))]
+        total = len(order)
+        if cursor:
+            after_score, after_key = decode_cursor(cursor)
+            # Rows after the cursor: lower score, or equal score and a later key
+            position = bisect.bisect_right(self.keys, after_key)
+            ordered_scores = scores[order]
+            later = (ordered_scores < after_score) | ((ordered_scores == after_score) & (order >= position))
+            order = order[later]
+        page = order[:limit]
+        next_cursor = None
+        if len(order) > limit and len(page):
+            last = int(page[-1])
+            next_cursor = encode_cursor(scores[last], self.keys[last])
+        return [self.rows[i] for i in page], next_cursor, total
+
+
+ROW_FIELDS = ['scheme_code', 'name', 'position', 'fund_house', 'category', 'risk', 'nav', 'nav_date', 'returns']
+
+
+class MutualFundCatalog:
+    """The scheme catalog as served by the web views.
+
+    Each process keeps a CatalogIndex and rebuilds it when the stored
+    catalog changes, checking at most every MF_CATALOG_RELOAD_SECONDS.
+    """
+
+    def __init__(self, fetch_list=fetch_scheme_list, fetch_detail=fetch_latest):
+        self.fetch_list = fetch_list
+        self.fetch_detail = fetch_detail
+        self._index = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _stored_version(self):
+        stats = MutualFundScheme.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+        return stats['count'], stats['updated']
+
+    def index(self):
+        if self._index is not None and time.monotonic() - self._checked_at < settings.MF_CATALOG_RELOAD_SECONDS:
+            return self._index
+        with self._lock:
+            version = self._stored_version()
+            if version[0] == 0:
+                # Empty catalog: one list request makes every scheme searchable by name
+                sync_scheme_list(self.fetch_list)
+                version = self._stored_version()
+            if self._index is None or version != self._version:
+                started = time.perf_counter()
+                rows = list(MutualFundScheme.objects.values(*ROW_FIELDS))
+                self._index = CatalogIndex(rows)
+                self._version = version
+                logger.info(f"Mutual fund index built for {len(rows)} schemes in "
+                            f"{(time.perf_counter() - started) * 1000:.0f}ms")
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def invalidate(self):
+        self._checked_at = 0
+
+    def search(self, query='', category=None, risk=None, fund_house=None, limit=20, cursor=None):
+        rows, next_cursor, total = self.index().search(query, category, risk, fund_house, limit, cursor)
+        return [fund_response(row) for row in rows], next_cursor, total
+
+    def featured(self, count=40, offset=6):
+        """The funds the list page has always shown, with details refreshed when stale"""
+        self.index()
+        schemes = MutualFundScheme.objects.filter(
+            position__gte=offset, position__lt=offset + count).order_by('position')
+        codes = [s.scheme_code for s in schemes]
+        if sync_details(codes=codes, fetch=self.fetch_detail):
+            self.invalidate()
+            schemes = MutualFundScheme.objects.filter(scheme_code__in=codes).order_by('position')
+        return [fund_response(row) for row in schemes.values(*ROW_FIELDS) if row['nav'] is not None]
+
+    def facets(self):
+        """Known categories, risks and fund houses, for filter menus"""
+        rows = self.index().rows
+        return {
+            field: sorted({row[field] for row in rows if row[field]})
+            for field in ('category', 'risk', 'fund_house')
+        }
+
+
+mf_catalog = MutualFundCatalog()
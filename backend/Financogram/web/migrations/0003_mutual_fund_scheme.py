@@ -0,0 +1,30 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0002_auto_20250804_0338'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MutualFundScheme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheme_code', models.IntegerField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('position', models.IntegerField(default=0)),
+                ('fund_house', models.CharField(blank=True, max_length=255, null=True)),
+                ('scheme_type', models.CharField(blank=True, max_length=255, null=True)),
+                ('category', models.CharField(blank=True, max_length=255, null=True)),
+                ('risk', models.CharField(blank=True, max_length=100, null=True)),
+                ('nav', models.FloatField(blank=True, null=True)),
+                ('nav_date', models.DateField(blank=True, null=True)),
+                ('detail_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
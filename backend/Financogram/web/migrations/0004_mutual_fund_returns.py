@@ -0,0 +1,63 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0003_mutual_fund_scheme'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='cagr_3y',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='cagr_5y',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='max_drawdown',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='return_1m',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='return_3y',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='return_5y',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='return_6m',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='returns',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='returns_as_of',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='volatility',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
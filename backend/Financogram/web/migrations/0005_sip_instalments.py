@@ -0,0 +1,62 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_sip_day(apps, schema_editor):
+    # One UPDATE per day of month; djongo cannot run bulk_update's CASE WHEN
+    Investment = apps.get_model('web', 'Investment')
+    by_day = {}
+    for pk, sip_date in Investment.objects.filter(investment_type='sip').values_list('id', 'sip_date'):
+        value = str(sip_date or '').strip()
+        if value.isdigit() and 1 <= int(value) <= 31:
+            by_day.setdefault(int(value), []).append(pk)
+    for day, ids in by_day.items():
+        for start in range(0, len(ids), 1000):
+            Investment.objects.filter(id__in=ids[start:start + 1000]).update(sip_day=day)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0004_mutual_fund_returns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SipInstalment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(db_index=True, max_length=254)),
+                ('fund_id', models.CharField(max_length=100)),
+                ('due_date', models.DateField()),
+                ('amount', models.FloatField()),
+                ('nav', models.FloatField(blank=True, null=True)),
+                ('units', models.FloatField(default=0)),
+                ('payment_mode', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('paid', 'Paid'), ('failed', 'Failed')], max_length=10)),
+                ('reason', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='investment',
+            name='sip_day',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_sip_day, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='investment',
+            index=models.Index(fields=['investment_type', 'sip_day'], name='investment_sip_day_idx'),
+        ),
+        migrations.AddField(
+            model_name='sipinstalment',
+            name='investment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instalments', to='web.investment'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='sipinstalment',
+            unique_together={('investment', 'due_date')},
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0005_sip_instalments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sipinstalment',
+            name='email',
+            field=models.EmailField(max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name='investment',
+            index=models.Index(fields=['email', 'date'], name='investment_email_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfundscheme',
+            index=models.Index(fields=['position'], name='scheme_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfundscheme',
+            index=models.Index(fields=['updated_at'], name='scheme_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sipinstalment',
+            index=models.Index(fields=['email', 'status'], name='sip_instalment_email_idx'),
+        ),
+    ]
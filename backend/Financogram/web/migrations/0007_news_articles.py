@@ -0,0 +1,35 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0006_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(max_length=40, unique=True)),
+                ('url', models.URLField(max_length=1000)),
+                ('title', models.CharField(max_length=500)),
+                ('description', models.TextField(blank=True, default='')),
+                ('content', models.TextField(blank=True, default='')),
+                ('author', models.CharField(blank=True, max_length=255, null=True)),
+                ('source_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('source_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('url_to_image', models.URLField(blank=True, max_length=1000, null=True)),
+                ('published_at', models.DateTimeField()),
+                ('tickers', models.CharField(blank=True, default='', max_length=255)),
+                ('fetched_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='newsarticle',
+            index=models.Index(fields=['published_at'], name='news_published_idx'),
+        ),
+    ]
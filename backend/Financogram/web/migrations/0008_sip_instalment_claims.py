@@ -0,0 +1,23 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0007_news_articles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sipinstalment',
+            name='run_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='sipinstalment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed')], max_length=10),
+        ),
+    ]
@@ -7,6 +7,7 @@ class Investment(models.Model):
     name = models.CharField(max_length=255)
     amount = models.FloatField()
     sip_date = models.CharField(max_length=2 ,default='Not Applicable')
+    sip_day = models.IntegerField(null=True, blank=True)  # sip_date as a day of month, for the scheduler
     investment_type = models.CharField(max_length=20)
     nav = models.FloatField()
     category = models.CharField(max_length=255)
@@ -15,5 +16,108 @@ class Investment(models.Model):
     date = models.DateField(default=timezone.now)
     time = models.TimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['investment_type', 'sip_day'], name='investment_sip_day_idx'),
+            models.Index(fields=['email', 'date'], name='investment_email_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.email} - {self.fund_id}"
+
+
+class SipInstalment(models.Model):
+    """One scheduled payment of a SIP; at most one per investment and due date.
+
+    Wallet instalments are recorded as pending before the wallet is charged;
+    one still pending after its run means the run stopped around the charge.
+    """
+    STATUS_CHOICES = [('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed')]
+
+    investment = models.ForeignKey(Investment, on_delete=models.CASCADE, related_name='instalments')
+    email = models.EmailField()
+    fund_id = models.CharField(max_length=100)
+    due_date = models.DateField()
+    amount = models.FloatField()
+    nav = models.FloatField(null=True, blank=True)
+    units = models.FloatField(default=0)
+    payment_mode = models.CharField(max_length=20)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    reason = models.CharField(max_length=255, blank=True, default='')
+    run_id = models.CharField(max_length=32, blank=True, default='')  # the run_sips call that recorded it
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['investment', 'due_date']
+        indexes = [models.Index(fields=['email', 'status'], name='sip_instalment_email_idx')]
+
+    def __str__(self):
+        return f"{self.email} - {self.fund_id} - {self.due_date} ({self.status})"
+
+
+class MutualFundScheme(models.Model):
+    """One scheme of the mfapi.in catalog; detail fields are filled by sync_details"""
+    scheme_code = models.IntegerField(unique=True)
+    name = models.CharField(max_length=255)
+    position = models.IntegerField(default=0)  # order in the mfapi.in scheme list
+    fund_house = models.CharField(max_length=255, null=True, blank=True)
+    scheme_type = models.CharField(max_length=255, null=True, blank=True)
+    category = models.CharField(max_length=255, null=True, blank=True)
+    risk = models.CharField(max_length=100, null=True, blank=True)
+    nav = models.FloatField(null=True, blank=True)
+    nav_date = models.DateField(null=True, blank=True)
+    detail_synced_at = models.DateTimeField(null=True, blank=True)
+    # Trailing absolute returns in percent, plus annualized cagr_3y/cagr_5y, filled by compute_fund_returns
+    returns = models.FloatField(null=True, blank=True)  # 1 year
+    return_1m = models.FloatField(null=True, blank=True)
+    return_6m = models.FloatField(null=True, blank=True)
+    return_3y = models.FloatField(null=True, blank=True)
+    return_5y = models.FloatField(null=True, blank=True)
+    cagr_3y = models.FloatField(null=True, blank=True)
+    cagr_5y = models.FloatField(null=True, blank=True)
+    volatility = models.FloatField(null=True, blank=True)  # annualized, over 1 year
+    max_drawdown = models.FloatField(null=True, blank=True)  # over up to 5 years
+    returns_as_of = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['position'], name='scheme_position_idx'),
+            models.Index(fields=['updated_at'], name='scheme_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scheme_code} - {self.name}"
+
+
+
+class NewsArticle(models.Model):
+    """One NewsAPI article, stored once per URL by ingest_news"""
+    url_hash = models.CharField(max_length=40, unique=True)  # sha1 of the normalized URL
+    url = models.URLField(max_length=1000)
+    title = models.CharField(max_length=500)
+    description = models.TextField(blank=True, default='')
+    content = models.TextField(blank=True, default='')
+    author = models.CharField(max_length=255, null=True, blank=True)
+    source_id = models.CharField(max_length=100, null=True, blank=True)
+    source_name = models.CharField(max_length=255, null=True, blank=True)
+    url_to_image = models.URLField(max_length=1000, null=True, blank=True)
+    published_at = models.DateTimeField()
+    tickers = models.CharField(max_length=255, blank=True, default='')  # space-separated symbols mentioned
+    fetched_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['published_at'], name='news_published_idx')]
+
+    def __str__(self):
+        return f"{self.published_at:%Y-%m-%d} - {self.title}"
+
+
+class NewsPoll(models.Model):
+    """Claim on the next NewsAPI poll; the unique name lets one process hold it until it expires"""
+    name = models.CharField(max_length=50, unique=True)
+    polled_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} - Expires: {self.expires_at}"
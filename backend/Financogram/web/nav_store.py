@@ -0,0 +1,233 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import requests
+from django.conf import settings
+
+from prediction.bar_store import read_meta, series_lock, write_series
+
+from .charts import lttb
+from .mf_catalog import MFAPI_URL
+
+logger = logging.getLogger(__name__)
+
+# Dates are stored as int32 days since 1970-01-01
+EMPTY_DAYS = np.empty(0, dtype=np.int32)
+EMPTY_NAVS = np.empty(0, dtype=np.float64)
+
+META_FIELDS = ['scheme_name', 'fund_house', 'scheme_type', 'scheme_category', 'risk']
+
+
+def fetch_nav_history(scheme_code, start=None):
+    """{'meta', 'data'} from mfapi.in, with only the NAVs from `start` (a date) when given"""
+    params = {'startDate': start.isoformat()} if start else None
+    response = requests.get(f"{MFAPI_URL}/{scheme_code}", params=params, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def parse_navs(data):
+    """mfapi.in [{'date': 'dd-mm-yyyy', 'nav': '12.34'}] as ascending (days, navs) arrays.
+
+    Rows with an unreadable date or a missing NAV are dropped, and a date that
+    appears twice keeps its last value.
+    """
+    if not data:
+        return EMPTY_DAYS, EMPTY_NAVS
+    frame = pd.DataFrame(data, columns=['date', 'nav'])
+    dates = pd.to_datetime(frame['date'], format='%d-%m-%Y', errors='coerce')
+    navs = pd.to_numeric(frame['nav'], errors='coerce')
+    keep = (dates.notna() & (navs > 0)).to_numpy()
+    days = dates.to_numpy()[keep].astype('datetime64[D]').astype(np.int32)
+    navs = navs.to_numpy(dtype=np.float64)[keep]
+    order = np.argsort(days, kind='stable')
+    days, navs = days[order], navs[order]
+    last = np.append(days[1:] != days[:-1], True)
+    return days[last], navs[last]
+
+
+def parse_day(value):
+    """'YYYY-MM-DD' or 'dd-mm-yyyy' as days since the epoch, None for an empty value"""
+    if not value:
+        return None
+    for fmt in ('%Y-%m-%d', '%d-%m-%Y'):
+        try:
+            return (datetime.strptime(value, fmt).date() - date(1970, 1, 1)).days
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {value} (expected YYYY-MM-DD)")
+
+
+def day_labels(days):
+    """Days since the epoch as the 'dd-mm-yyyy' strings mfapi.in uses"""
+    return pd.DatetimeIndex(np.asarray(days).astype('datetime64[D]')).strftime('%d-%m-%Y').tolist()
+
+
+class NavSeries:
+    """Read-only view over a scheme's stored NAVs (slices of memory-mapped arrays)"""
+
+    def __init__(self, days, navs, meta):
+        self.days = days
+        self.navs = navs
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.days)
+
+    def between(self, start=None, end=None):
+        """NAVs dated within [start, end] (days since the epoch, inclusive)"""
+        lo = 0 if start is None else int(np.searchsorted(self.days, start, side='left'))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, end, side='right'))
+        return NavSeries(self.days[lo:hi], self.navs[lo:hi], self.meta)
+
+    def downsampled(self, points):
+        """At most `points` NAVs picked with LTTB, keeping the peaks and troughs"""
+        if points >= len(self.days):
+            return self
+        kept = lttb(self.days.astype(np.float64), np.asarray(self.navs), points)
+        return NavSeries(self.days[kept], self.navs[kept], self.meta)
+
+    def timestamps(self):
+        """Epoch seconds at midnight UTC of each NAV date"""
+        return np.asarray(self.days, dtype=np.int64) * 86400
+
+    def records(self):
+        """[{'date': 'dd-mm-yyyy', 'nav'}] in date order"""
+        return [{'date': label, 'nav': nav} for label, nav in zip(day_labels(self.days), self.navs.tolist())]
+
+
+class NavStore:
+    """Persistent NAV history per mutual fund scheme.
+
+    Each scheme lives in its own directory as two .npy files (int32 days since
+    the epoch and float64 NAVs) plus meta.json with the scheme's details, laid
+    out like the bar store and opened memory-mapped. Updates ask mfapi.in only
+    for NAVs from the last stored date onwards.
+    """
+
+    def __init__(self, root=None, fetcher=None, refresh_seconds=None):
+        self.root = str(root or settings.NAV_STORE_DIR)
+        self.fetcher = fetcher or fetch_nav_history
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else settings.NAV_STORE_REFRESH_SECONDS
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def series_dir(self, scheme_code):
+        return os.path.join(self.root, str(int(scheme_code)))
+
+    def _load(self, scheme_code):
+        """Return the memory-mapped (days, navs, meta) for a scheme"""
+        path = self.series_dir(scheme_code)
+        days_path = os.path.join(path, 'days.npy')
+        try:
+            stamp = os.stat(days_path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._maps.get(path)
+            if cached and cached[0] == stamp:
+                return cached[1]
+        loaded = (
+            np.load(days_path, mmap_mode='r'),
+            np.load(os.path.join(path, 'navs.npy'), mmap_mode='r'),
+            read_meta(path),
+        )
+        with self._lock:
+            self._maps[path] = (stamp, loaded)
+        return loaded
+
+    def is_stale(self, scheme_code):
+        fetched_at = read_meta(self.series_dir(scheme_code)).get('fetched_at', 0)
+        return time.time() - fetched_at > self.refresh_seconds
+
+    def update(self, scheme_code, force=False):
+        """Fetch only the NAVs after the last stored one; returns the number of new NAVs"""
+        path = self.series_dir(scheme_code)
+        # The directory only appears once the scheme has NAVs to store
+        with series_lock(path, create=False):
+            # Another worker may have refreshed the scheme while we waited
+            if not force and not self.is_stale(scheme_code):
+                return 0
+            loaded = self._load(scheme_code)
+            stored = loaded is not None and len(loaded[0])
+            # Refetch from the last stored date so a revised NAV replaces the old one
+            start = np.datetime64(int(loaded[0][-1]), 'D').item() if stored else None
+            detail = self.fetcher(scheme_code, start=start) or {}
+            new_days, new_navs = parse_navs(detail.get('data'))
+
+            if stored and len(new_days):
+                keep = int(np.searchsorted(loaded[0], new_days[0], side='left'))
+                days = np.concatenate([loaded[0][:keep], new_days])
+                navs = np.concatenate([loaded[1][:keep], new_navs])
+            elif stored:
+                days, navs = np.asarray(loaded[0]), np.asarray(loaded[1])
+            elif len(new_days):
+                days, navs = new_days, new_navs
+            else:
+                raise ValueError(f"No NAV data for scheme {scheme_code}")
+            added = len(days) - (len(loaded[0]) if stored else 0)
+
+            meta = dict(loaded[2]) if loaded is not None else {}
+            fetched = detail.get('meta') or {}
+            meta.update({field: fetched[field] for field in META_FIELDS if fetched.get(field)})
+            meta['fetched_at'] = time.time()
+            write_series(path, [('navs.npy', navs), ('days.npy', days)], meta)
+            logger.info(f"NAV store: scheme {scheme_code} +{added} NAVs")
+            return added
+
+    def update_many(self, scheme_codes, workers=None):
+        """Bring several schemes up to date in parallel; returns {scheme_code: new NAVs}"""
+        def update_one(scheme_code):
+            try:
+                return scheme_code, self.update(scheme_code)
+            except Exception as e:
+                logger.warning(f"NAV store update failed for scheme {scheme_code}: {str(e)}")
+                return scheme_code, None
+
+        with ThreadPoolExecutor(max_workers=workers or settings.MF_CATALOG_SYNC_WORKERS) as executor:
+            return {code: added for code, added in executor.map(update_one, scheme_codes) if added is not None}
+
+    def scheme_codes(self):
+        """Codes of every scheme with stored NAVs"""
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return []
+        return sorted(int(name) for name in names
+                      if name.isdigit() and os.path.exists(os.path.join(self.root, name, 'days.npy')))
+
+    def read(self, scheme_code):
+        """Zero-copy view of every stored NAV of a scheme"""
+        loaded = self._load(scheme_code)
+        if loaded is None:
+            return NavSeries(EMPTY_DAYS, EMPTY_NAVS, {})
+        return NavSeries(*loaded)
+
+    def history(self, scheme_code):
+        """Refresh the scheme if stale, then read it. Raises ValueError if it has no NAVs."""
+        if self.is_stale(scheme_code):
+            try:
+                self.update(scheme_code)
+            except Exception as e:
+                # Serve what we already have rather than failing on a flaky upstream
+                if not len(self.read(scheme_code)):
+                    raise
+                logger.warning(f"NAV store refresh failed for scheme {scheme_code}: {str(e)}")
+        return self.read(scheme_code)
+
+
+_nav_store = None
+
+
+def get_nav_store():
+    """Process-wide NavStore rooted at settings.NAV_STORE_DIR"""
+    global _nav_store
+    if _nav_store is None:
+        _nav_store = NavStore()
+    return _nav_store
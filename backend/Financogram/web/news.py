@@ -0,0 +1,339 @@
+import bisect
+import hashlib
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from Financogram.db import insert_unique
+from .mf_catalog import normalize
+from .models import NewsArticle, NewsPoll
+
+logger = logging.getLogger(__name__)
+
+NEWSAPI_URL = 'https://newsapi.org/v2/everything'
+POLL_NAME = 'newsapi'
+
+# Symbols tagged on articles, with the names headlines use for them
+TICKERS = {
+    'AAPL': ['apple'], 'GOOGL': ['google', 'alphabet'], 'MSFT': ['microsoft'], 'TSLA': ['tesla'],
+    'AMZN': ['amazon'], 'META': ['meta platforms', 'facebook'], 'NFLX': ['netflix'], 'NVDA': ['nvidia'],
+    'IBM': [], 'ORCL': ['oracle'], 'ADBE': ['adobe'], 'AMD': [], 'UBER': ['uber'], 'LYFT': ['lyft'],
+    'SHOP': ['shopify'],
+    'RELIANCE.BO': ['reliance industries', 'reliance'], 'HDFCBANK.BO': ['hdfc bank'],
+    'ICICIBANK.BO': ['icici bank'], 'SBIN.BO': ['state bank of india', 'sbi'], 'AXISBANK.BO': ['axis bank'],
+    'KOTAKBANK.BO': ['kotak mahindra bank', 'kotak bank'], 'BAJFINANCE.BO': ['bajaj finance'],
+    'LT.BO': ['larsen toubro'], 'MARUTI.BO': ['maruti suzuki', 'maruti'], 'TATAMOTORS.BO': ['tata motors'],
+    '^BSESN': ['sensex'], '^NSEI': ['nifty 50', 'nifty'], '^NSEBANK': ['nifty bank', 'bank nifty'],
+    '^CNXIT': ['nifty it'],
+}
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in', 'is', 'it', 'its', 'of',
+    'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'with',
+}
+
+ARTICLE_FIELDS = ['id', 'url', 'title', 'description', 'content', 'author', 'source_id', 'source_name',
+                  'url_to_image', 'published_at', 'tickers']
+
+
+def _symbol_code(symbol):
+    return symbol.lstrip('^').split('.')[0]
+
+
+def normalize_url(url):
+    """url without its fragment, tracking parameters or trailing slash, with a lowercase host"""
+    parts = urlsplit(url.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                       if not k.lower().startswith('utm_')])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/') or '/', query, ''))
+
+
+def url_hash(url):
+    return hashlib.sha1(normalize_url(url).encode()).hexdigest()
+
+
+def words(text):
+    """Index terms of text: normalized words, minus stopwords and single characters"""
+    return {word for word in normalize(text).split() if len(word) > 1 and word not in STOPWORDS}
+
+
+def extract_tickers(text):
+    """Symbols in TICKERS that text mentions by upper-case code ('AAPL', '$TSLA') or by name"""
+    padded = f" {normalize(text)} "
+    found = []
+    for symbol, names in TICKERS.items():
+        code = _symbol_code(symbol)
+        if (len(code) >= 3 and re.search(rf'(?<![A-Za-z0-9]){re.escape(code)}(?![A-Za-z0-9])', text)) or \
+                any(f" {name} " in padded for name in names):
+            found.append(symbol)
+    return found
+
+
+def resolve_ticker(value):
+    """The TICKERS symbol for a symbol, code or name as typed ('aapl', 'RELIANCE', 'sensex'), or None"""
+    value = (value or '').strip()
+    if value.upper() in TICKERS:
+        return value.upper()
+    for symbol, names in TICKERS.items():
+        if _symbol_code(symbol) == value.upper().lstrip('^') or normalize(value) in names:
+            return symbol
+    return None
+
+
+def parse_published(value):
+    try:
+        published = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return published if timezone.is_aware(published) else timezone.make_aware(published, dt_timezone.utc)
+
+
+def fetch_news(query, page_size=100):
+    """NewsAPI's newest English articles matching query"""
+    response = requests.get(NEWSAPI_URL, params={
+        'q': query,
+        'language': 'en',
+        'sortBy': 'publishedAt',
+        'pageSize': page_size,
+        'apiKey': settings.NEWS_API_KEY,
+    }, timeout=15)
+    response.raise_for_status()
+    data = response.json()
+    if data.get('status') != 'ok':
+        raise ValueError(f"NewsAPI error: {data.get('message')}")
+    return data.get('articles') or []
+
+
+def claim_poll(interval):
+    """Whether this process may poll NewsAPI now.
+
+    The claim is a NewsPoll row that expires a little before the next
+    scheduled poll; its unique name lets one process win, so every process
+    together stays within one poll per interval.
+    """
+    now = timezone.now()
+    NewsPoll.objects.filter(name=POLL_NAME, expires_at__lte=now).delete()
+    return insert_unique(lambda: NewsPoll.objects.create(
+        name=POLL_NAME, polled_at=now, expires_at=now + timedelta(seconds=interval * 0.9)))
+
+
+def release_poll():
+    """Give up the poll claim, so the next process to ask may poll right away"""
+    NewsPoll.objects.filter(name=POLL_NAME).delete()
+
+
+def ingest_news(queries=None, fetch=fetch_news, force=False):
+    """Store the newest articles for each query, once per normalized URL.
+
+    Returns the number of new articles, or None when another poll ran within
+    NEWS_POLL_INTERVAL (force skips that check). When every query fails the
+    claim is released, so the poll is retried without waiting out the
+    interval. Articles older than NEWS_RETENTION_DAYS are dropped.
+    """
+    if not force and not claim_poll(settings.NEWS_POLL_INTERVAL):
+        return None
+    queries = queries or settings.NEWS_QUERIES
+    fetched = {}
+    failures = 0
+    for query in queries:
+        try:
+            articles = fetch(query)
+        except Exception as e:
+            logger.warning(f"News fetch failed for '{query}': {str(e)}")
+            failures += 1
+            continue
+        for article in articles:
+            url, title = article.get('url'), (article.get('title') or '').strip()
+            published_at = parse_published(article.get('publishedAt'))
+            if not url or not title or title == '[Removed]' or published_at is None:
+                continue
+            fetched.setdefault(url_hash(url), (article, title, published_at))
+    if not force and queries and failures == len(queries):
+        release_poll()
+
+    existing = set(NewsArticle.objects.filter(url_hash__in=list(fetched)).values_list('url_hash', flat=True))
+    added = []
+    for digest, (article, title, published_at) in fetched.items():
+        if digest in existing:
+            continue
+        source = article.get('source') or {}
+        description = article.get('description') or ''
+        added.append(NewsArticle(
+            url_hash=digest,
+            url=article['url'][:1000],
+            title=title[:500],
+            description=description,
+            content=article.get('content') or '',
+            author=(article.get('author') or '')[:255] or None,
+            source_id=source.get('id'),
+            source_name=source.get('name'),
+            url_to_image=(article.get('urlToImage') or '')[:1000] or None,
+            published_at=published_at,
+            tickers=' '.join(extract_tickers(f"{title} {description}"))[:255],
+        ))
+    NewsArticle.objects.bulk_create(sorted(added, key=lambda a: a.published_at), batch_size=500)
+    expired, _ = NewsArticle.objects.filter(
+        published_at__lt=timezone.now() - timedelta(days=settings.NEWS_RETENTION_DAYS)).delete()
+    logger.info(f"News: {len(added)} new articles from {len(fetched)} fetched, {expired} expired")
+    return len(added)
+
+
+def article_response(row):
+    """A stored article in NewsAPI's article shape, plus its tickers"""
+    return {
+        'source': {'id': row['source_id'], 'name': row['source_name']},
+        'author': row['author'],
+        'title': row['title'],
+        'description': row['description'],
+        'url': row['url'],
+        'urlToImage': row['url_to_image'],
+        'publishedAt': row['published_at'].astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'content': row['content'],
+        'tickers': row['tickers'].split(),
+    }
+
+
+class NewsIndex:
+    """In-memory inverted index over stored articles.
+
+    Words of the title and description and the tagged tickers each map to
+    the positions of the articles containing them. Articles are appended
+    in id order, so postings stay sorted and new articles are added without
+    a rebuild. Results are ordered newest first.
+    """
+
+    def __init__(self):
+        self.articles = []
+        self.ids = []
+        self.published = []
+        self.postings = {}
+        self.ticker_postings = {}
+        self.order = np.empty(0, dtype=np.int64)
+        self._terms = []
+
+    def __len__(self):
+        return len(self.articles)
+
+    def add(self, rows):
+        for row in rows:
+            position = len(self.articles)
+            self.articles.append(article_response(row))
+            self.ids.append(row['id'])
+            self.published.append(row['published_at'].timestamp())
+            for word in words(f"{row['title']} {row['description']}"):
+                self.postings.setdefault(word, []).append(position)
+            for symbol in row['tickers'].split():
+                self.ticker_postings.setdefault(symbol, []).append(position)
+        self.order = np.lexsort((-np.array(self.ids, dtype=np.int64), -np.array(self.published)))
+        self._terms = sorted(self.postings)
+
+    def _prefix(self, token):
+        lo = bisect.bisect_left(self._terms, token)
+        hi = bisect.bisect_left(self._terms, token + '\uffff')
+        postings = [self.postings[term] for term in self._terms[lo:hi]]
+        return np.unique(np.concatenate(postings)) if postings else np.empty(0, dtype=np.int64)
+
+    def search(self, query='', ticker=None, page=1, page_size=20):
+        """(articles, total) of one page of the articles matching every query word and the ticker.
+
+        Query words match whole words or word prefixes.
+        """
+        mask = np.ones(len(self.articles), dtype=bool)
+        for token in normalize(query).split():
+            matches = np.zeros(len(self.articles), dtype=bool)
+            matches[self._prefix(token)] = True
+            mask &= matches
+        if ticker is not None:
+            matches = np.zeros(len(self.articles), dtype=bool)
+            matches[self.ticker_postings.get(ticker, [])] = True
+            mask &= matches
+        ordered = self.order[mask[self.order]]
+        start = (page - 1) * page_size
+        return [self.articles[i] for i in ordered[start:start + page_size]], len(ordered)
+
+
+class NewsStore:
+    """Stored news as served by /web/news/.
+
+    Each process keeps a NewsIndex, adding newly stored articles at most
+    every NEWS_RELOAD_SECONDS and rebuilding it when articles were removed.
+    With refresh_on_read, a read starts a background poll once the poll
+    interval has passed, so a deployment without the ingest_news job still
+    gets news and no request waits on NewsAPI.
+    """
+
+    def __init__(self, fetch=fetch_news, refresh_on_read=True):
+        self.fetch = fetch
+        self.refresh_on_read = refresh_on_read
+        self._index = None
+        self._last_id = None
+        self._checked_at = 0
+        self._next_poll = 0
+        self._lock = threading.Lock()
+
+    def index(self):
+        if self._index is not None and time.monotonic() - self._checked_at < settings.NEWS_RELOAD_SECONDS:
+            return self._index
+        with self._lock:
+            stats = NewsArticle.objects.aggregate(count=Count('id'), last_id=Max('id'))
+            if self._index is None or (stats['count'], stats['last_id']) != (len(self._index), self._last_id):
+                articles = NewsArticle.objects.values(*ARTICLE_FIELDS).order_by('id')
+                new = list(articles.filter(id__gt=self._last_id or 0)) if self._index is not None else []
+                if self._index is None or len(self._index) + len(new) != stats['count']:
+                    # First load, or articles were removed: rebuild
+                    self._index = NewsIndex()
+                    new = list(articles)
+                self._index.add(new)
+                self._last_id = stats['last_id']
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def invalidate(self):
+        self._checked_at = 0
+
+    def _poll(self):
+        try:
+            if ingest_news(fetch=self.fetch):
+                self.invalidate()
+        except Exception as e:
+            logger.error(f"News poll failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+    def poll_if_due(self):
+        with self._lock:
+            if not self.refresh_on_read or time.monotonic() < self._next_poll:
+                return
+            self._next_poll = time.monotonic() + settings.NEWS_POLL_INTERVAL
+        threading.Thread(target=self._poll, name='news-poll', daemon=True).start()
+
+    def search(self, query='', ticker=None, page=1, page_size=20):
+        self.poll_if_due()
+        return self.index().search(query, ticker, page, page_size)
+
+
+news_store = NewsStore(refresh_on_read=settings.NEWS_REFRESH_ON_READ)
+
+
+def run_poller(interval, stop, queries=None, force=False):
+    """Ingest news every `interval` seconds until `stop` is set"""
+    while not stop.is_set():
+        started = time.monotonic()
+        try:
+            ingest_news(queries, force=force)
+        except Exception as e:
+            logger.error(f"News poll failed: {str(e)}")
+        news_store.invalidate()
+        close_old_connections()
+        stop.wait(max(0, interval - (time.monotonic() - started)))
+
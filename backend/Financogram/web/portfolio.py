@@ -0,0 +1,226 @@
+import hashlib
+import logging
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from prediction.models import MarketDataCache
+
+from .models import Investment, MutualFundScheme, SipInstalment
+from .nav_store import day_labels, get_nav_store
+
+logger = logging.getLogger(__name__)
+
+DAYS_PER_YEAR = 365.0
+# Search range for the bisection fallback (annual rates)
+XIRR_BOUNDS = (-0.9999, 1000.0)
+
+
+def xirr(flows, years, tol=1e-7, iterations=50):
+    """Annual rate r with sum(flows * (1 + r) ** years) == 0, for every row at once.
+
+    flows and years are 2-D arrays with one cash flow series per row, padded
+    with zero flows. Money invested is negative, the current value positive,
+    and years counts back from the valuation date. Rows start with Newton
+    steps from 10%; rows that have not converged fall back to bisection.
+    Rows without a root (such as money invested today) get NaN.
+    """
+    flows = np.asarray(flows, dtype=np.float64)
+    years = np.asarray(years, dtype=np.float64)
+    scale = np.maximum(np.abs(flows).sum(axis=1), 1e-12)
+
+    def npv(rate):
+        return (flows * (1 + rate[:, None]) ** years).sum(axis=1)
+
+    rate = np.full(len(flows), 0.1)
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        for _ in range(iterations):
+            growth = (1 + rate[:, None]) ** years
+            value = (flows * growth).sum(axis=1)
+            slope = (flows * years * growth).sum(axis=1) / (1 + rate)
+            step = np.where(slope != 0, value / slope, 0)
+            rate = np.clip(rate - np.nan_to_num(step), *XIRR_BOUNDS)
+            if np.all(np.abs(step) < tol):
+                break
+
+        unsolved = ~(np.abs(npv(rate)) <= tol * scale)
+        if unsolved.any():
+            lo = np.full(unsolved.sum(), XIRR_BOUNDS[0])
+            hi = np.full(unsolved.sum(), XIRR_BOUNDS[1])
+            sub_flows, sub_years = flows[unsolved], years[unsolved]
+
+            def sub_npv(r):
+                return (sub_flows * (1 + r[:, None]) ** sub_years).sum(axis=1)
+
+            lo_value = sub_npv(lo)
+            bracketed = np.sign(lo_value) != np.sign(sub_npv(hi))
+            for _ in range(200):
+                mid = (lo + hi) / 2
+                mid_value = sub_npv(mid)
+                below = np.sign(mid_value) == np.sign(lo_value)
+                lo, lo_value = np.where(below, mid, lo), np.where(below, mid_value, lo_value)
+                hi = np.where(below, hi, mid)
+            rate[unsolved] = np.where(bracketed, (lo + hi) / 2, np.nan)
+        rate[(years == 0).all(axis=1) | ~(np.abs(npv(rate)) <= 1e-4 * scale)] = np.nan
+    return rate
+
+
+def padded_flows(groups, amounts, years, terminal):
+    """(flows, years) matrices: each group's investments then its current value at year 0"""
+    order = np.argsort(groups, kind='stable')
+    groups, amounts, years = groups[order], amounts[order], years[order]
+    counts = np.bincount(groups, minlength=len(terminal))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    columns = np.arange(len(groups)) - starts[groups]
+    width = (counts.max() if len(counts) else 0) + 1
+    flow_matrix = np.zeros((len(terminal), width))
+    year_matrix = np.zeros((len(terminal), width))
+    flow_matrix[groups, columns] = -amounts
+    year_matrix[groups, columns] = years
+    flow_matrix[np.arange(len(terminal)), counts] = terminal
+    return flow_matrix, year_matrix
+
+
+def latest_navs(fund_ids, day=None):
+    """{fund_id: (nav, nav_date, previous_nav)} from the NAV store, refreshing stale schemes.
+
+    With day, the NAVs are the last ones published on or before it. Schemes
+    without stored NAVs fall back to the catalog's latest NAV.
+    """
+    store = get_nav_store()
+    codes = [int(f) for f in fund_ids if str(f).isdigit()]
+    stale = [code for code in codes if store.is_stale(code)]
+    if stale:
+        store.update_many(stale)
+    end = (day - date(1970, 1, 1)).days if day else None
+    navs = {}
+    for code in codes:
+        series = store.read(code).between(end=end)
+        if len(series):
+            previous = float(series.navs[-2]) if len(series) > 1 else None
+            navs[str(code)] = (float(series.navs[-1]), day_labels(series.days[-1:])[0], previous)
+    missing = [code for code in codes if str(code) not in navs]
+    for code, nav, nav_date in MutualFundScheme.objects.filter(
+            scheme_code__in=missing, nav__isnull=False).values_list('scheme_code', 'nav', 'nav_date'):
+        navs[str(code)] = (nav, nav_date.strftime('%d-%m-%Y') if nav_date else None, None)
+    return navs
+
+
+def _round(value, digits=2):
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def value_portfolio(email, today=None):
+    """Holdings per fund with units, current value, gain and XIRR, plus portfolio totals.
+
+    Two queries load the investments and the paid SIP instalments; units,
+    values and returns of all holdings are computed together with numpy.
+    """
+    today = today or timezone.now().date()
+    investments = {row[0]: row[1:] for row in Investment.objects.filter(email=email).order_by(
+        'date', 'time', 'id').values_list(
+        'id', 'fund_id', 'name', 'category', 'risk', 'investment_type', 'amount', 'nav', 'date')}
+    rows = list(investments.values())
+    for investment_id, amount, nav, due_date in SipInstalment.objects.filter(
+            email=email, status='paid').values_list('investment_id', 'amount', 'nav', 'due_date'):
+        if investment_id in investments:
+            rows.append(investments[investment_id][:5] + (amount, nav, due_date))
+    rows.sort(key=lambda row: row[7])
+    summary = {'invested': 0.0, 'current_value': 0.0, 'gain': 0.0, 'gain_percent': None,
+               'day_change': 0.0, 'xirr': None, 'holdings': 0}
+    if not rows:
+        return {'email': email, 'as_of': today.isoformat(), 'summary': summary, 'holdings': []}
+
+    fund_ids, groups = np.unique([str(r[0]) for r in rows], return_inverse=True)
+    amounts = np.array([r[5] for r in rows], dtype=np.float64)
+    cost_navs = np.array([r[6] or 0 for r in rows], dtype=np.float64)
+    years = np.array([(today - r[7]).days for r in rows], dtype=np.float64) / DAYS_PER_YEAR
+    years = np.maximum(years, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        units = np.where(cost_navs > 0, amounts / cost_navs, 0)
+    invested = np.bincount(groups, weights=amounts, minlength=len(fund_ids))
+    held = np.bincount(groups, weights=units, minlength=len(fund_ids))
+
+    navs = latest_navs(fund_ids)
+    last_cost = np.zeros(len(fund_ids))
+    last_cost[groups] = cost_navs  # later rows win: the most recent purchase NAV
+    current_nav = np.array([navs.get(f, (None,))[0] or last_cost[i] for i, f in enumerate(fund_ids)])
+    previous_nav = np.array([navs.get(f, (None, None, None))[2] or current_nav[i] for i, f in enumerate(fund_ids)])
+    value = held * current_nav
+    day_change = held * (current_nav - previous_nav)
+
+    holding_xirr = xirr(*padded_flows(groups, amounts, years, value))
+    total_xirr = xirr(*padded_flows(np.zeros(len(rows), dtype=int), amounts, years, np.array([value.sum()])))[0]
+
+    first = {}
+    details = {}
+    types = {}
+    for row, group in zip(rows, groups):
+        first[group] = min(first.get(group, row[7]), row[7])
+        details[group] = row[1:4]  # the latest name, category and risk
+        types.setdefault(group, set()).add(row[4])
+    counts = np.bincount(groups, minlength=len(fund_ids))
+
+    holdings = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, fund_id in enumerate(fund_ids):
+            name, category, risk = details[i]
+            holdings.append({
+                'fund_id': str(fund_id),
+                'name': name,
+                'category': category,
+                'risk': risk,
+                'investment_types': sorted(types[i]),
+                'transactions': int(counts[i]),
+                'first_invested': first[i].isoformat(),
+                'invested': _round(invested[i]),
+                'units': _round(held[i], 4),
+                'average_nav': _round(invested[i] / held[i], 4) if held[i] else None,
+                'nav': _round(current_nav[i], 4),
+                'nav_date': navs.get(fund_id, (None, None))[1],
+                'current_value': _round(value[i]),
+                'gain': _round(value[i] - invested[i]),
+                'gain_percent': _round((value[i] - invested[i]) / invested[i] * 100) if invested[i] else None,
+                'day_change': _round(day_change[i]),
+                'xirr': _round(holding_xirr[i] * 100),
+            })
+
+    total_invested, total_value = invested.sum(), value.sum()
+    summary.update({
+        'invested': _round(total_invested),
+        'current_value': _round(total_value),
+        'gain': _round(total_value - total_invested),
+        'gain_percent': _round((total_value - total_invested) / total_invested * 100) if total_invested else None,
+        'day_change': _round(day_change.sum()),
+        'xirr': _round(total_xirr * 100),
+        'holdings': len(holdings),
+    })
+    return {'email': email, 'as_of': today.isoformat(), 'summary': summary, 'holdings': holdings}
+
+
+def portfolio_cache_key(email):
+    return f"portfolio:{hashlib.sha1(email.encode()).hexdigest()}"
+
+
+def get_portfolio(email):
+    """The valued portfolio, from the shared cache while it is fresh"""
+    key = portfolio_cache_key(email)
+    cached = MarketDataCache.objects.filter(cache_key=key, expires_at__gt=timezone.now()).values_list(
+        'cache_data', flat=True).first()
+    if cached is not None:
+        return cached
+    portfolio = value_portfolio(email)
+    try:
+        MarketDataCache.store_many({key: portfolio}, timedelta(seconds=settings.PORTFOLIO_CACHE_TTL))
+    except Exception as e:
+        logger.error(f"Portfolio cache write failed: {str(e)}")
+    return portfolio
+
+
+def invalidate_portfolio(*emails):
+    """Drop cached portfolios in every process, e.g. after a new investment"""
+    MarketDataCache.objects.filter(cache_key__in=[portfolio_cache_key(email) for email in emails]).delete()
@@ -0,0 +1,195 @@
+import calendar
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+
+from api.models import InsufficientBalance, User
+from Financogram.db import insert_unique
+
+from .models import Investment, SipInstalment
+from .portfolio import invalidate_portfolio, latest_navs
+
+logger = logging.getLogger(__name__)
+
+
+def parse_sip_day(value):
+    """A SIP date as entered ('5', '05') as a day of month, or None"""
+    value = str(value or '').strip()
+    if value.isdigit() and 1 <= int(value) <= 31:
+        return int(value)
+    return None
+
+
+def due_days(day):
+    """Days of month whose SIPs run on `day`; a month's last day also runs the days it lacks"""
+    last = calendar.monthrange(day.year, day.month)[1]
+    return list(range(day.day, 32)) if day.day == last else [day.day]
+
+
+def due_sips(day):
+    """SIPs with an instalment due on `day`.
+
+    Uses the (investment_type, sip_day) index. A SIP's first instalment is
+    paid when it is started, so the schedule begins the month after that.
+    """
+    return Investment.objects.filter(
+        investment_type='sip', sip_day__in=due_days(day), date__lt=day.replace(day=1))
+
+
+def claim_instalments(day, instalments, run_id):
+    """Insert instalments unless another run recorded them first; returns the stored ones we own.
+
+    There is no transaction to fall back on, so a failed bulk insert may have
+    written some rows. Those carry our run_id; the rest are inserted one by
+    one, and any that already exist belong to another run.
+    """
+    if not instalments:
+        return []
+    if not insert_unique(lambda: SipInstalment.objects.bulk_create(instalments, batch_size=1000)):
+        logger.warning(f"SIP instalments for {day} raced another run; claiming one by one")
+        for instalment in instalments:
+            instalment.pk = None
+            insert_unique(lambda: instalment.save(force_insert=True))
+    return list(SipInstalment.objects.filter(
+        investment_id__in=[i.investment_id for i in instalments], due_date=day, run_id=run_id,
+    ).order_by('investment_id'))
+
+
+def debit(email, amount):
+    """Take amount from a wallet; returns the reason it failed, or ''"""
+    try:
+        return '' if User.debit(email, amount) is not None else 'User not found'
+    except ValueError as e:
+        return str(e)
+
+
+def charge_wallets(instalments):
+    """Debit claimed wallet instalments; returns {instalment pk: reason it failed, or ''}.
+
+    The balances are read in one query, then each user's instalments are
+    taken with one compare-and-set for their total. Only a user whose total
+    exceeds the balance is charged one instalment at a time, so the ones
+    that fit still go through.
+    """
+    by_email = {}
+    for instalment in instalments:
+        by_email.setdefault(instalment.email, []).append(instalment)
+    balances = User.balances(by_email) if by_email else {}
+    outcomes = {}
+    for email, own in by_email.items():
+        total = sum(instalment.amount for instalment in own)
+        try:
+            found = User.debit(email, total, current=balances.get(email)) is not None
+            reason = '' if found else 'User not found'
+        except InsufficientBalance as e:
+            if len(own) > 1:
+                outcomes.update({instalment.pk: debit(email, instalment.amount) for instalment in own})
+                continue
+            reason = str(e)
+        except ValueError as e:
+            reason = str(e)
+        outcomes.update({instalment.pk: reason for instalment in own})
+    return outcomes
+
+
+def record_outcomes(outcomes):
+    """Mark pending instalments paid or failed, with one UPDATE per outcome"""
+    by_reason = {}
+    for pk, reason in outcomes.items():
+        by_reason.setdefault(reason, []).append(pk)
+    for reason, pks in by_reason.items():
+        fields = {'status': 'paid'} if not reason else {'status': 'failed', 'units': 0, 'reason': reason}
+        SipInstalment.objects.filter(pk__in=pks, status='pending').update(**fields)
+
+
+def run_chunk(day, sips, navs, run_id):
+    """Record and charge the instalments of one chunk of SIPs.
+
+    Every instalment is inserted before any money moves. Wallet ones go in
+    as pending and are then charged per user through the wallet's
+    compare-and-set (see charge_wallets). An instalment another run has recorded is skipped, so
+    running a day again never charges twice. Other payment modes are
+    collected outside the app. Returns (paid, failed, skipped, emails with
+    new paid instalments).
+    """
+    done = set(SipInstalment.objects.filter(
+        investment_id__in=[sip.id for sip in sips], due_date=day).values_list('investment_id', flat=True))
+    instalments = []
+    for sip in sips:
+        if sip.id in done:
+            continue
+        nav = navs.get(str(sip.fund_id), (None,))[0] or sip.nav
+        if not nav:
+            status, reason = 'failed', 'No NAV available'
+        else:
+            status, reason = ('pending' if sip.payment_mode == 'Wallet' else 'paid'), ''
+        instalments.append(SipInstalment(
+            investment_id=sip.id,
+            email=sip.email,
+            fund_id=sip.fund_id,
+            due_date=day,
+            amount=sip.amount,
+            nav=nav,
+            units=0 if reason else sip.amount / nav,
+            payment_mode=sip.payment_mode,
+            status=status,
+            reason=reason,
+            run_id=run_id,
+        ))
+
+    claimed = claim_instalments(day, instalments, run_id)
+    outcomes = charge_wallets([instalment for instalment in claimed if instalment.status == 'pending'])
+    record_outcomes(outcomes)
+    paid = failed = 0
+    emails = set()
+    for instalment in claimed:
+        reason = outcomes.get(instalment.pk, instalment.reason)
+        if reason:
+            failed += 1
+        else:
+            paid += 1
+            emails.add(instalment.email)
+    return paid, failed, len(sips) - len(claimed), emails
+
+
+def run_sips(day=None, chunk_size=None, nav_lookup=latest_navs):
+    """Create the instalments of every SIP due on `day` (default today).
+
+    SIPs are read in id order, chunk_size at a time. Nothing relies on
+    transactions (djongo has none): a concurrent run of the same day only
+    charges the instalments it recorded itself. Returns counts of due, paid,
+    failed and skipped SIPs.
+    """
+    day = day or timezone.localdate()
+    run_id = uuid.uuid4().hex
+    chunk_size = chunk_size or settings.SIP_CHUNK_SIZE
+    started = time.perf_counter()
+    stats = {'due': 0, 'paid': 0, 'failed': 0, 'skipped': 0}
+    navs = {}
+    last_id = None
+    while True:
+        query = due_sips(day).order_by('id')
+        if last_id is not None:
+            query = query.filter(id__gt=last_id)
+        sips = list(query.only('id', 'email', 'fund_id', 'amount', 'nav', 'payment_mode')[:chunk_size])
+        if not sips:
+            break
+        last_id = sips[-1].id
+
+        missing = {str(sip.fund_id) for sip in sips} - set(navs)
+        if missing:
+            looked_up = nav_lookup(sorted(missing), day)
+            navs.update({fund_id: looked_up.get(fund_id, (None,)) for fund_id in missing})
+        paid, failed, skipped, emails = run_chunk(day, sips, navs, run_id)
+        if emails:
+            invalidate_portfolio(*emails)
+        stats['due'] += len(sips)
+        stats['paid'] += paid
+        stats['failed'] += failed
+        stats['skipped'] += skipped
+
+    logger.info(f"SIPs for {day}: {stats} in {time.perf_counter() - started:.2f}s")
+    return stats
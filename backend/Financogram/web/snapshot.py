@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from prediction.symbol_cache import symbol_data
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteSnapshot:
+    """Latest quotes for a fixed list of symbols, served from memory.
+
+    A snapshot younger than max_age is served as is. An older one is still
+    served while a single background refresh replaces it
+    (stale-while-revalidate). Only an empty snapshot, or one older than
+    max_stale, makes the caller wait for a refresh. Upstream calls therefore
+    depend on the refresh rate, not on the number of visitors.
+    """
+
+    def __init__(self, name, symbols, max_age=None, max_stale=None):
+        self.name = name
+        self.symbols = list(symbols)
+        self.max_age = max_age if max_age is not None else settings.MARKET_SNAPSHOT_MAX_AGE
+        self.max_stale = max_stale if max_stale is not None else settings.MARKET_SNAPSHOT_MAX_STALE
+        self.quotes = {}
+        self.as_of = None
+        self._refreshed_at = None
+        self._refresh_lock = threading.Lock()
+        self._revalidating = False
+        self.stats = {'refreshes': 0, 'failed_refreshes': 0, 'stale_served': 0}
+
+    def age(self):
+        return None if self._refreshed_at is None else time.monotonic() - self._refreshed_at
+
+    def refresh(self, if_older_than=None):
+        """Fetch every symbol and swap in the new quotes.
+
+        Quotes come through the shared symbol cache. Quotes that fail or
+        miss the deadline keep their previous value, so one slow symbol does
+        not blank its row. With if_older_than, a refresh
+        that finished while waiting for the lock counts as done.
+        """
+        with self._refresh_lock:
+            age = self.age()
+            if if_older_than is not None and age is not None and age <= if_older_than:
+                return 0
+            try:
+                quotes, errors = symbol_data.quotes(self.symbols)
+            except Exception as e:
+                self.stats['failed_refreshes'] += 1
+                logger.error(f"{self.name} snapshot refresh failed: {str(e)}")
+                return 0
+            if quotes or self.quotes:
+                # Readers keep whichever dict they already hold; swap, never mutate
+                self.quotes = {**self.quotes, **quotes}
+                self.as_of = timezone.now()
+                self._refreshed_at = time.monotonic()
+            self.stats['refreshes'] += 1
+            if errors:
+                logger.warning(f"{self.name} snapshot kept old quotes for {len(errors)} symbols")
+            return len(quotes)
+
+    def _revalidate(self):
+        try:
+            self.refresh()
+        finally:
+            self._revalidating = False
+            # The symbol cache may have opened a connection on this thread
+            close_old_connections()
+
+    def get(self):
+        """(quotes, as_of), refreshing first only when there is nothing fresh enough to serve"""
+        age = self.age()
+        if age is None or age > self.max_stale:
+            self.refresh(if_older_than=self.max_stale)
+        elif age > self.max_age:
+            self.stats['stale_served'] += 1
+            quotes, as_of = self.quotes, self.as_of
+            if not self._revalidating and not self._refresh_lock.locked():
+                self._revalidating = True
+                threading.Thread(target=self._revalidate, name=f'{self.name}-snapshot', daemon=True).start()
+            return quotes, as_of
+        return self.quotes, self.as_of
+
+    def snapshot(self):
+        return dict(self.stats, symbols=len(self.symbols), quotes=len(self.quotes),
+                    as_of=self.as_of, age_seconds=self.age())
+
+
+def run_refresher(snapshots, interval, stop):
+    """Refresh every snapshot each `interval` seconds until `stop` is set"""
+    while not stop.is_set():
+        started = time.monotonic()
+        for snapshot in snapshots:
+            snapshot.refresh()
+        close_old_connections()
+        stop.wait(max(0, interval - (time.monotonic() - started)))
+
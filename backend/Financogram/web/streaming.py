@@ -0,0 +1,258 @@
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from django.conf import settings
+
+from prediction.bar_store import SYMBOL_PATTERN
+from prediction.market_client import get_market_client
+from prediction.market_data import get_market_data
+
+logger = logging.getLogger(__name__)
+
+# Raw ASGI handlers for live quotes. One poller per process fetches the union of
+# subscribed symbols and pushes only the quotes that changed to each subscriber,
+# so upstream load grows with the number of symbols, not with the number of clients.
+
+
+def parse_symbols(value):
+    """Comma separated symbols, upper-cased; raises ValueError for malformed ones"""
+    symbols = []
+    for symbol in (value or '').split(','):
+        symbol = symbol.strip().upper()
+        if not symbol:
+            continue
+        if not SYMBOL_PATTERN.match(symbol):
+            raise ValueError(f"Invalid symbol: {symbol}")
+        if symbol not in symbols:
+            symbols.append(symbol)
+    if len(symbols) > settings.QUOTE_STREAM_MAX_SYMBOLS:
+        raise ValueError(f"At most {settings.QUOTE_STREAM_MAX_SYMBOLS} symbols per subscription")
+    return symbols
+
+
+def quote_message(quote):
+    """Quote in the shape pushed to clients, with change figures like /web/indices/"""
+    price, previous_close = quote.get('price'), quote.get('previous_close')
+    message = {
+        'symbol': quote['symbol'],
+        'name': quote.get('name'),
+        'price': price,
+        'previous_close': previous_close,
+        'change': None,
+        'percent': None,
+    }
+    if price and previous_close:
+        message['change'] = round(price - previous_close, 2)
+        message['percent'] = round((price - previous_close) / previous_close * 100, 2)
+    return message
+
+
+class Subscription:
+    """One client's symbol set and its pending updates.
+
+    Updates are coalesced per symbol, so a slow client gets the latest quote
+    for each symbol instead of an ever growing backlog.
+    """
+
+    def __init__(self, symbols=()):
+        self.symbols = set(symbols)
+        self.pending = {}
+        self._ready = asyncio.Event()
+
+    def push(self, messages):
+        for message in messages:
+            if message['symbol'] in self.symbols:
+                self.pending[message['symbol']] = message
+        if self.pending:
+            self._ready.set()
+
+    async def next_batch(self, timeout=None):
+        """Pending messages, or [] if nothing arrives within timeout"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        batch, self.pending = list(self.pending.values()), {}
+        return batch
+
+
+class QuoteHub:
+    """Polls quotes for every subscribed symbol and fans changes out to subscribers.
+
+    The poller runs as a task on the server's event loop while anyone is
+    subscribed; provider calls go through the shared market data client.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval if interval is not None else settings.QUOTE_STREAM_INTERVAL
+        self.subscriptions = set()
+        self.latest = {}
+        self._task = None
+        self.stats = {'polls': 0, 'pushed': 0}
+
+    def symbols(self):
+        return set().union(*(s.symbols for s in self.subscriptions)) if self.subscriptions else set()
+
+    def subscribe(self, symbols):
+        subscription = Subscription(symbols)
+        self.subscriptions.add(subscription)
+        self.resubscribed(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscription
+
+    def resubscribed(self, subscription):
+        """Send known quotes for a subscription's symbols straight away"""
+        subscription.push([self.latest[s] for s in subscription.symbols if s in self.latest])
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def poll(self):
+        """Fetch every subscribed symbol once and push the quotes that changed"""
+        symbols = sorted(self.symbols())
+        if not symbols:
+            return []
+        quotes, _, _ = await get_market_client().amap(get_market_data().quote, symbols)
+        changed = []
+        for symbol, quote in quotes.items():
+            message = quote_message(quote)
+            if self.latest.get(symbol) != message:
+                self.latest[symbol] = message
+                changed.append(message)
+        self.stats['polls'] += 1
+        if changed:
+            self.stats['pushed'] += len(changed)
+            for subscription in list(self.subscriptions):
+                subscription.push(changed)
+        return changed
+
+    async def _run(self):
+        while self.subscriptions:
+            started = asyncio.get_running_loop().time()
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Quote poll failed: {str(e)}")
+            await asyncio.sleep(max(0, self.interval - (asyncio.get_running_loop().time() - started)))
+
+
+quote_hub = QuoteHub()
+
+
+def cors_headers(scope):
+    """CORS headers for origins allowed in settings (raw ASGI skips corsheaders)"""
+    origin = dict(scope.get('headers') or []).get(b'origin', b'').decode()
+    if origin and origin in settings.CORS_ALLOWED_ORIGINS:
+        return [(b'access-control-allow-origin', origin.encode()),
+                (b'access-control-allow-credentials', b'true')]
+    return []
+
+
+class QuoteStream:
+    """ASGI app for /web/stream/quotes/.
+
+    HTTP requests get Server-Sent Events for `?symbols=A,B`; each event is a
+    JSON list of changed quotes. WebSocket clients can also send
+    {"subscribe": [...]} and {"unsubscribe": [...]} to change their set.
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        try:
+            symbols = parse_symbols(','.join(query.get('symbols', [])))
+        except ValueError as e:
+            symbols, error = None, str(e)
+        if scope['type'] == 'websocket':
+            await self.websocket(scope, receive, send, symbols, None if symbols is not None else error)
+        else:
+            await self.event_stream(scope, receive, send, symbols, None if symbols is not None else error)
+
+    async def event_stream(self, scope, receive, send, symbols, error):
+        if error or not symbols:
+            body = json.dumps({'error': error or 'symbols is required'}).encode()
+            await send({'type': 'http.response.start', 'status': 400,
+                        'headers': [(b'content-type', b'application/json')] + cors_headers(scope)})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ] + cors_headers(scope)})
+        subscription = self.hub.subscribe(symbols)
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            while not disconnected.done():
+                batch = await subscription.next_batch(timeout=settings.QUOTE_STREAM_HEARTBEAT)
+                # A comment line keeps proxies from closing an idle stream
+                chunk = f"event: quotes\ndata: {json.dumps(batch)}\n\n" if batch else ": ping\n\n"
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        except OSError:
+            pass
+        finally:
+            disconnected.cancel()
+            self.hub.unsubscribe(subscription)
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def websocket(self, scope, receive, send, symbols, error):
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        if error:
+            await send({'type': 'websocket.close', 'code': 4400})
+            return
+        await send({'type': 'websocket.accept'})
+        subscription = self.hub.subscribe(symbols or [])
+        incoming = asyncio.ensure_future(receive())
+        try:
+            while True:
+                outgoing = asyncio.ensure_future(subscription.next_batch(timeout=settings.QUOTE_STREAM_HEARTBEAT))
+                await asyncio.wait({incoming, outgoing}, return_when=asyncio.FIRST_COMPLETED)
+                if outgoing.done():
+                    batch = outgoing.result()
+                    if batch:
+                        await send({'type': 'websocket.send', 'text': json.dumps({'type': 'quotes', 'quotes': batch})})
+                else:
+                    outgoing.cancel()
+                if incoming.done():
+                    message = incoming.result()
+                    if message['type'] == 'websocket.disconnect':
+                        break
+                    await self._handle_command(send, subscription, message.get('text'))
+                    incoming = asyncio.ensure_future(receive())
+        finally:
+            incoming.cancel()
+            self.hub.unsubscribe(subscription)
+
+    async def _handle_command(self, send, subscription, text):
+        try:
+            command = json.loads(text or '{}')
+            subscribe = parse_symbols(','.join(command.get('subscribe', [])))
+            unsubscribe = parse_symbols(','.join(command.get('unsubscribe', [])))
+            if len(subscription.symbols | set(subscribe)) > settings.QUOTE_STREAM_MAX_SYMBOLS:
+                raise ValueError(f"At most {settings.QUOTE_STREAM_MAX_SYMBOLS} symbols per subscription")
+        except (ValueError, AttributeError, TypeError) as e:
+            await send({'type': 'websocket.send', 'text': json.dumps({'type': 'error', 'error': str(e)})})
+            return
+        subscription.symbols = (subscription.symbols | set(subscribe)) - set(unsubscribe)
+        self.hub.resubscribed(subscription)
+        await send({'type': 'websocket.send', 'text': json.dumps({
+            'type': 'subscribed', 'symbols': sorted(subscription.symbols)})})
+
+
+quote_stream = QuoteStream(quote_hub)
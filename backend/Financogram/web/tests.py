@@ -1,3 +1,969 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import unittest.mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+import numpy as np
+import requests
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+from asgiref.testing import ApplicationCommunicator
+from pymongo.errors import DuplicateKeyError
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from Financogram import mongo
+from Financogram.db import bulk_update
+from prediction import bar_store
+from prediction.market_data import SyntheticProvider, set_market_data
+from prediction.symbol_cache import symbol_data
+from prediction.columnar import decode_series, parse_columnar
+from .charts import chart_cache, lttb
+from .fund_returns import compute_metrics, refresh_fund_returns
+from .mf_catalog import MutualFundCatalog, mf_catalog, sync_details, sync_scheme_list
+from .models import Investment, MutualFundScheme, NewsArticle, NewsPoll, SipInstalment
+from . import nav_store
+from .nav_store import NavStore, parse_navs
+from .news import NewsStore, claim_poll, extract_tickers, ingest_news, url_hash
+from .portfolio import value_portfolio, xirr
+from .sip import due_days, due_sips, run_sips
+from .snapshot import QuoteSnapshot
+from .streaming import QuoteHub, QuoteStream, Subscription, parse_symbols
+from . import views
+
+
+class CountingProvider(SyntheticProvider):
+    def __init__(self):
+        super().__init__(seed=1)
+        self.calls = 0
+
+    def info(self, symbol):
+        self.calls += 1
+        return super().info(symbol)
+
+
+class QuoteSnapshotTest(TestCase):
+    def setUp(self):
+        symbol_data.local.clear()
+        self.provider = CountingProvider()
+        set_market_data(self.provider)
+        self.addCleanup(set_market_data, None)
+
+    def test_fresh_snapshot_is_served_without_upstream_calls(self):
+        snapshot = QuoteSnapshot('test', ['AAPL', 'MSFT'], max_age=60, max_stale=600)
+        quotes, as_of = snapshot.get()
+        self.assertEqual(set(quotes), {'AAPL', 'MSFT'})
+        self.assertIsNotNone(as_of)
+        for _ in range(50):
+            snapshot.get()
+        self.assertEqual(self.provider.calls, 2)
+
+    def test_stale_snapshot_is_served_while_revalidating(self):
+        snapshot = QuoteSnapshot('test', ['AAPL'], max_age=0, max_stale=600)
+        _, first = snapshot.get()
+        time.sleep(0.01)
+        quotes, as_of = snapshot.get()
+        self.assertEqual(as_of, first)
+        self.assertIn('AAPL', quotes)
+        for _ in range(100):
+            if snapshot.as_of != first:
+                break
+            time.sleep(0.01)
+        self.assertGreater(snapshot.as_of, first)
+        self.assertEqual(snapshot.stats['stale_served'], 1)
+
+    def test_failed_symbols_keep_previous_quotes(self):
+        snapshot = QuoteSnapshot('test', ['AAPL', 'MSFT'], max_age=60, max_stale=600)
+        snapshot.refresh()
+
+        class BrokenProvider(SyntheticProvider):
+            def info(self, symbol):
+                if symbol == 'MSFT':
+                    raise ValueError('upstream error')
+                return super().info(symbol)
+
+        set_market_data(BrokenProvider(seed=1))
+        snapshot.refresh()
+        self.assertEqual(set(snapshot.quotes), {'AAPL', 'MSFT'})
+
+
+class MarketListAPITest(APITestCase):
+    def setUp(self):
+        symbol_data.local.clear()
+        set_market_data(SyntheticProvider(seed=1))
+        self.addCleanup(set_market_data, None)
+        for snapshot in (views.stock_snapshot, views.index_snapshot):
+            snapshot.quotes, snapshot.as_of, snapshot._refreshed_at = {}, None, None
+
+    def test_stocks_list_with_as_of_header(self):
+        response = self.client.get(reverse('get_stocks'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['symbol'] for row in response.json()], views.TOP_STOCKS)
+        self.assertIn('X-As-Of', response)
+
+    def test_indices_list(self):
+        response = self.client.get(reverse('get_indices'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), len(views.INDICES))
+        self.assertEqual(set(response.json()[0]), {'symbol', 'name', 'value', 'change', 'percent'})
+
+
+class QuoteStreamTest(SimpleTestCase):
+    def setUp(self):
+        self.provider = CountingProvider()
+        set_market_data(self.provider)
+        self.addCleanup(set_market_data, None)
+        self.hub = QuoteHub(interval=0.05)
+        self.app = QuoteStream(self.hub)
+
+    def test_parse_symbols(self):
+        self.assertEqual(parse_symbols('aapl, MSFT,,aapl'), ['AAPL', 'MSFT'])
+        with self.assertRaises(ValueError):
+            parse_symbols('AAPL;DROP')
+
+    async def test_poll_pushes_only_changes_to_matching_subscribers(self):
+        # Added directly so the background poller does not start
+        first, second = Subscription(['AAPL']), Subscription(['MSFT'])
+        self.hub.subscriptions = {first, second}
+
+        changed = await self.hub.poll()
+        self.assertEqual({m['symbol'] for m in changed}, {'AAPL', 'MSFT'})
+        self.assertEqual([m['symbol'] for m in await first.next_batch(0.1)], ['AAPL'])
+        self.assertEqual(await self.hub.poll(), [])
+        self.assertEqual(await first.next_batch(0.05), [])
+        # One upstream call per symbol per poll, whatever the number of subscribers
+        self.assertEqual(self.provider.calls, 4)
+
+    async def test_event_stream(self):
+        scope = {'type': 'http', 'path': '/web/stream/quotes/', 'query_string': b'symbols=AAPL,MSFT',
+                 'headers': [(b'origin', b'http://localhost:3000')]}
+        communicator = ApplicationCommunicator(self.app, scope)
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertIn((b'access-control-allow-origin', b'http://localhost:3000'), start['headers'])
+        event = (await communicator.receive_output(1))['body'].decode()
+        self.assertTrue(event.startswith('event: quotes\n'))
+        quotes = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual({q['symbol'] for q in quotes}, {'AAPL', 'MSFT'})
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(1)
+        self.assertEqual(self.hub.subscriptions, set())
+
+    async def test_event_stream_requires_symbols(self):
+        scope = {'type': 'http', 'path': '/web/stream/quotes/', 'query_string': b'', 'headers': []}
+        communicator = ApplicationCommunicator(self.app, scope)
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        self.assertEqual((await communicator.receive_output(1))['status'], 400)
+        await communicator.wait(1)
+
+    async def test_websocket_subscribe(self):
+        scope = {'type': 'websocket', 'path': '/web/stream/quotes/', 'query_string': b'', 'headers': []}
+        communicator = ApplicationCommunicator(self.app, scope)
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output(1))['type'], 'websocket.accept')
+        await communicator.send_input({'type': 'websocket.receive', 'text': json.dumps({'subscribe': ['aapl']})})
+        self.assertEqual(json.loads((await communicator.receive_output(1))['text']),
+                         {'type': 'subscribed', 'symbols': ['AAPL']})
+        message = json.loads((await communicator.receive_output(1))['text'])
+        self.assertEqual(message['type'], 'quotes')
+        self.assertEqual(message['quotes'][0]['symbol'], 'AAPL')
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(1)
+        await asyncio.sleep(0)
+        self.assertEqual(self.hub.subscriptions, set())
+
+
+class ChartTest(APITestCase):
+    def setUp(self):
+        self.provider = CountingProvider()
+        set_market_data(self.provider)
+        self.addCleanup(set_market_data, None)
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        previous = bar_store._bar_store
+        bar_store._bar_store = bar_store.BarStore(root=root)
+        self.addCleanup(setattr, bar_store, '_bar_store', previous)
+        chart_cache.clear()
+
+    def test_lttb_keeps_ends_and_extremes(self):
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50)
+        y[437] = 25
+        kept = lttb(x, y, 50)
+        self.assertEqual(len(kept), 50)
+        self.assertEqual((kept[0], kept[-1]), (0, 999))
+        self.assertTrue((np.diff(kept) > 0).all())
+        self.assertIn(437, kept)
+        np.testing.assert_array_equal(lttb(x[:10], y[:10], 50), np.arange(10))
+
+    def test_chart_is_cached_and_downsampled(self):
+        url = reverse('get_stock_chart', args=['AAPL'])
+        misses = chart_cache.snapshot()['misses']
+        full = self.client.get(url, {'period': '5y'})
+        self.assertEqual(full.status_code, 200)
+        self.assertIn('max-age', full['Cache-Control'])
+        small = self.client.get(url, {'period': '5y', 'points': 40}).json()
+        self.assertEqual(len(small['prices']), 40)
+        self.assertEqual(small['dates'][0], full.json()['dates'][0])
+        self.assertEqual(small['prices'][-1], full.json()['prices'][-1])
+        self.assertEqual(chart_cache.snapshot()['misses'], misses + 1)
+        self.assertEqual(self.client.get(url, {'period': '5y', 'points': 'x'}).status_code, 400)
+
+    def test_chart_compact_format(self):
+        url = reverse('get_stock_chart', args=['AAPL'])
+        full = self.client.get(url, {'period': '1y'}).json()
+        response = self.client.get(url, {'period': '1y', 'format': 'columns'})
+        self.assertEqual(response['Content-Type'], 'application/vnd.financogram.columns')
+        series = decode_series(parse_columnar(response.content)['series'])
+        self.assertEqual(len(series['t']), len(full['prices']))
+        np.testing.assert_allclose(series['prices'], full['prices'], rtol=1e-6)
+        self.assertLess(len(response.content), len(json.dumps(full)) / 2)
+
+    def test_chart_rejects_invalid_symbols(self):
+        for symbol in ('..', 'A$B'):
+            response = self.client.get(reverse('get_stock_chart', args=[symbol]))
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(os.listdir(bar_store._bar_store.root), [])
+
+
+FUNDS = [
+    'Axis Bluechip Fund - Direct Plan - Growth',
+    'Axis Midcap Fund - Regular Plan - Growth',
+    'HDFC Flexi Cap Fund - Growth',
+    'SBI Bluechip Fund - Growth',
+    'ICICI Prudential Bluechip Fund - IDCW',
+    'Nippon India Liquid Fund - Growth',
+] + [f'Filler Income Scheme {i}' for i in range(60)]
+
+
+def fake_scheme_list(names=FUNDS):
+    return [{'schemeCode': 100000 + i, 'schemeName': name} for i, name in enumerate(names)]
+
+
+def fake_latest(scheme_code):
+    name = FUNDS[scheme_code - 100000]
+    category = 'Equity Scheme - Large Cap Fund' if 'Bluechip' in name else 'Other Scheme'
+    return {
+        'meta': {'fund_house': name.split()[0] + ' Mutual Fund', 'scheme_category': category},
+        'data': [{'date': '17-10-2026', 'nav': str(10 + scheme_code % 100)}],
+    }
+
+
+class MutualFundCatalogTest(TestCase):
+    def setUp(self):
+        self.catalog = MutualFundCatalog(fetch_list=fake_scheme_list, fetch_detail=fake_latest)
+
+    def names(self, funds):
+        return [fund['name'] for fund in funds]
+
+    def test_prefix_and_substring_search(self):
+        funds, _, total = self.catalog.search('blue')
+        self.assertEqual(total, 3)
+        self.assertTrue(all('Bluechip' in name for name in self.names(funds)))
+        self.assertEqual(self.catalog.search('chip')[2], 3)
+        # Whole-word matches rank before prefixes
+        self.assertEqual(self.names(self.catalog.search('axis blue')[0]), [FUNDS[0]])
+        self.assertEqual(self.names(self.catalog.search('fund')[0])[0], FUNDS[0])
+        self.assertEqual(self.catalog.search('zz')[2], 0)
+
+    def test_filters_use_synced_details(self):
+        self.catalog.index()
+        self.assertEqual(sync_details(fetch=fake_latest), len(FUNDS))
+        self.catalog.invalidate()
+        funds, _, total = self.catalog.search(category='equity scheme - large cap fund')
+        self.assertEqual(total, 3)
+        self.assertEqual(funds[0]['nav'], 10.0)
+        self.assertEqual(self.catalog.search('fund', fund_house='SBI Mutual Fund')[2], 1)
+        self.assertIn('Equity Scheme - Large Cap Fund', self.catalog.facets()['category'])
+
+    def test_cursor_pagination_visits_every_match_once(self):
+        seen, cursor = [], None
+        while True:
+            funds, cursor, total = self.catalog.search('income', limit=7, cursor=cursor)
+            seen.extend(fund['id'] for fund in funds)
+            if cursor is None:
+                break
+        self.assertEqual(total, 60)
+        self.assertEqual(len(seen), 60)
+        self.assertEqual(len(set(seen)), 60)
+        with self.assertRaises(ValueError):
+            self.catalog.search('income', cursor='not-a-cursor')
+
+    def test_list_sync_is_incremental(self):
+        self.catalog.index()
+        renamed = ['Axis Bluechip Fund - Direct - Growth'] + FUNDS[1:] + ['Brand New Fund']
+        self.assertEqual(sync_scheme_list(lambda: fake_scheme_list(renamed)), (1, 1))
+        self.catalog.invalidate()
+        self.assertEqual(self.names(self.catalog.search('brand')[0]), ['Brand New Fund'])
+
+    def test_featured_keeps_the_list_page(self):
+        funds = self.catalog.featured(count=4, offset=1)
+        self.assertEqual(self.names(funds), FUNDS[1:5])
+        self.assertEqual(set(funds[0]), {'id', 'name', 'nav', 'returns', 'category', 'risk', 'fund_house', 'min_investment'})
+
+
+class MutualFundAPITest(APITestCase):
+    def setUp(self):
+        previous = (mf_catalog.fetch_list, mf_catalog.fetch_detail)
+        mf_catalog.fetch_list, mf_catalog.fetch_detail = fake_scheme_list, fake_latest
+        mf_catalog._index = None
+        self.addCleanup(setattr, mf_catalog, '_index', None)
+        self.addCleanup(lambda: setattr(mf_catalog, 'fetch_list', previous[0]))
+        self.addCleanup(lambda: setattr(mf_catalog, 'fetch_detail', previous[1]))
+
+    def test_list_and_search(self):
+        listed = self.client.get(reverse('get_mutual_funds')).json()
+        self.assertIsInstance(listed, list)
+        self.assertEqual(listed[0]['name'], FUNDS[6])
+
+        response = self.client.get(reverse('search_mutual_funds'), {'q': 'bluechip', 'limit': 2})
+        data = response.json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(len(data['results']), 2)
+        following = self.client.get(reverse('search_mutual_funds'),
+                                    {'q': 'bluechip', 'limit': 2, 'cursor': data['next_cursor']}).json()
+        self.assertEqual(len(following['results']), 1)
+        self.assertIsNone(following['next_cursor'])
+        self.assertEqual(self.client.get(reverse('search_mutual_funds'), {'limit': 'x'}).status_code, 400)
+
+
+def nav_rows(start, count):
+    """mfapi.in style NAVs, newest first, for `count` days from a date"""
+    days = np.arange(np.datetime64(start), np.datetime64(start) + count)
+    return [{'date': str(d.item().strftime('%d-%m-%Y')), 'nav': f"{10 + i / 10:.4f}"}
+            for i, d in reversed(list(enumerate(days)))]
+
+
+class FakeNavHistory:
+    def __init__(self, rows):
+        self.rows = rows
+        self.starts = []
+
+    def __call__(self, scheme_code, start=None):
+        self.starts.append(start)
+        rows = [r for r in self.rows if start is None or
+                np.datetime64('-'.join(reversed(r['date'].split('-')))) >= np.datetime64(start)]
+        return {'meta': {'scheme_name': 'Alpha Bluechip Fund', 'scheme_category': 'Equity Scheme - Large Cap Fund'},
+                'data': rows}
+
+
+class NavStoreTest(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_parse_navs_sorts_chronologically(self):
+        days, navs = parse_navs([
+            {'date': '01-02-2020', 'nav': '11.0'},
+            {'date': '31-01-2020', 'nav': '10.0'},
+            {'date': '15-01-2021', 'nav': 'N.A.'},
+            {'date': '02-02-2020', 'nav': '12.0'},
+        ])
+        self.assertEqual(days.astype('datetime64[D]').astype(str).tolist(),
+                         ['2020-01-31', '2020-02-01', '2020-02-02'])
+        self.assertEqual(navs.tolist(), [10.0, 11.0, 12.0])
+
+    def test_update_fetches_only_new_navs(self):
+        fetcher = FakeNavHistory(nav_rows('2020-01-01', 100))
+        store = NavStore(root=self.root, fetcher=fetcher, refresh_seconds=3600)
+        self.assertEqual(store.update(101), 100)
+        self.assertEqual(store.update(101), 0)
+
+        # Two new NAVs and a revision of the last stored one
+        fetcher.rows = nav_rows('2020-01-01', 102)
+        fetcher.rows[2]['nav'] = '99.0'
+        self.assertEqual(store.update(101, force=True), 2)
+        self.assertEqual(fetcher.starts, [None, np.datetime64('2020-04-09').item()])
+        series = store.read(101)
+        self.assertEqual(len(series), 102)
+        self.assertEqual(series.navs[99], 99.0)
+        self.assertTrue((np.diff(series.days) > 0).all())
+        self.assertEqual(series.meta['scheme_name'], 'Alpha Bluechip Fund')
+
+    def test_range_and_downsampling(self):
+        store = NavStore(root=self.root, fetcher=FakeNavHistory(nav_rows('2020-01-01', 366)))
+        series = store.history(101)
+        window = series.between(series.days[10], series.days[19])
+        self.assertEqual(len(window), 10)
+        self.assertEqual(window.records()[0], {'date': '11-01-2020', 'nav': 11.0})
+        small = series.downsampled(30)
+        self.assertEqual(len(small), 30)
+        self.assertEqual((small.days[0], small.days[-1]), (series.days[0], series.days[-1]))
+
+    def test_unknown_scheme(self):
+        store = NavStore(root=self.root, fetcher=FakeNavHistory([]))
+        with self.assertRaises(ValueError):
+            store.history(999)
+        # Nothing is written for a scheme without NAVs
+        self.assertEqual(os.listdir(self.root), [])
+
+
+class MutualFundDetailsAPITest(APITestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.root = root
+        self.fetcher = FakeNavHistory(nav_rows('2019-12-01', 400))
+        previous = nav_store._nav_store
+        nav_store._nav_store = NavStore(root=root, fetcher=self.fetcher)
+        self.addCleanup(setattr, nav_store, '_nav_store', previous)
+        MutualFundScheme.objects.create(scheme_code=101, name='Alpha Bluechip Fund')
+
+    def test_details_range_and_points(self):
+        url = reverse('get_mutual_fund_details', args=['101'])
+        full = self.client.get(url).json()
+        self.assertEqual(len(full['historical_nav']), 400)
+        self.assertEqual(full['historical_nav'][0]['date'], '01-12-2019')
+        self.assertEqual(full['nav'], full['historical_nav'][-1]['nav'])
+        self.assertEqual(full['category'], 'Equity Scheme - Large Cap Fund')
+
+        window = self.client.get(url, {'from': '2020-01-01', 'to': '2020-01-31'}).json()
+        self.assertEqual(len(window['historical_nav']), 31)
+        self.assertEqual(window['historical_nav'][0]['date'], '01-01-2020')
+        self.assertEqual(window['nav'], full['nav'])
+        self.assertEqual(len(self.client.get(url, {'points': 50}).json()['historical_nav']), 50)
+        # The history was downloaded once
+        self.assertEqual(self.fetcher.starts, [None])
+
+        self.assertEqual(self.client.get(url, {'from': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'points': 1}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('get_mutual_fund_details', args=['abc'])).status_code, 404)
+
+    def test_unknown_scheme_never_reaches_the_store(self):
+        self.assertEqual(self.client.get(reverse('get_mutual_fund_details', args=['999999'])).status_code, 404)
+        self.assertEqual(self.fetcher.starts, [])
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_details_compact_format(self):
+        url = reverse('get_mutual_fund_details', args=['101'])
+        response = self.client.get(url, {'format': 'columns'})
+        series = decode_series(parse_columnar(response.content)['historical_nav'])
+        self.assertEqual(len(series['t']), 400)
+        self.assertEqual(int(series['t'][0]), int(np.datetime64('2019-12-01', 's').astype(np.int64)))
+
+
+def growth_series(start, end, yearly):
+    """Weekday NAVs growing at a constant yearly rate"""
+    days = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    days = days[np.is_busday(days)].astype(np.int64).astype(np.int32)
+    return days, 10 * (1 + yearly) ** ((days - days[0]) / 365.25)
+
+
+class FundReturnsTest(TestCase):
+    def test_metrics_match_constant_growth(self):
+        old = growth_series('2015-01-01', '2026-10-16', 0.12)
+        young = growth_series('2026-01-01', '2026-10-16', 0.12)
+        metrics = compute_metrics([old[0], young[0]], [old[1], young[1]])
+        self.assertAlmostEqual(metrics['cagr_5y'][0], 12, delta=0.05)
+        self.assertAlmostEqual(metrics['returns'][0], 12, delta=0.1)
+        self.assertAlmostEqual(metrics['return_5y'][0], (1.12 ** 5 - 1) * 100, delta=0.5)
+        self.assertEqual(metrics['max_drawdown'][0], 0)
+        self.assertLess(metrics['volatility'][0], 1)
+        # Too young for a year's figures, old enough for six months
+        self.assertTrue(np.isnan(metrics['returns'][1]))
+        self.assertTrue(np.isnan(metrics['cagr_3y'][1]))
+        self.assertAlmostEqual(metrics['return_6m'][1], (1.12 ** 0.5 - 1) * 100, delta=0.2)
+
+    def test_drawdown_and_volatility(self):
+        days, navs = growth_series('2023-01-01', '2026-10-16', 0)
+        navs = navs.copy()
+        navs[300:400] = 7  # a 30% fall and recovery
+        rng = np.random.default_rng(1)
+        noisy = navs * np.exp(np.concatenate([[0], np.cumsum(rng.normal(0, 0.01, len(navs) - 1))]))
+        metrics = compute_metrics([days, days], [navs, noisy])
+        self.assertAlmostEqual(metrics['max_drawdown'][0], -30)
+        self.assertAlmostEqual(metrics['volatility'][1], 0.01 * np.sqrt(252) * 100, delta=2)
+
+    def test_refresh_stores_metrics_for_the_endpoints(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = NavStore(root=root, fetcher=FakeNavHistory(nav_rows('2024-06-01', 600)))
+        store.update(100006)
+        sync_scheme_list(fake_scheme_list)
+        self.assertEqual(refresh_fund_returns(store=store), 1)
+
+        scheme = MutualFundScheme.objects.get(scheme_code=100006)
+        self.assertIsNotNone(scheme.returns)
+        self.assertIsNone(scheme.return_3y)
+        self.assertEqual(str(scheme.returns_as_of), '2026-01-21')
+
+        previous = nav_store._nav_store
+        nav_store._nav_store = store
+        self.addCleanup(setattr, nav_store, '_nav_store', previous)
+        detail = self.client.get(reverse('get_mutual_fund_details', args=['100006'])).json()
+        self.assertEqual(detail['returns'], scheme.returns)
+        self.assertEqual(detail['returns_detail']['absolute']['1Y'], scheme.returns)
+        self.assertEqual(detail['returns_detail']['as_of'], '21-01-2026')
+
+
+class PortfolioTest(APITestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        # 120 daily NAVs ending at 21.9 (previous 21.8) for scheme 101 only
+        history = FakeNavHistory(nav_rows('2026-06-01', 120))
+        previous = nav_store._nav_store
+        nav_store._nav_store = NavStore(root=root, fetcher=lambda code, start=None: (
+            history(code, start) if int(code) == 101 else {'data': []}))
+        self.addCleanup(setattr, nav_store, '_nav_store', previous)
+
+    def invest(self, amount, nav, day, fund_id='101', investment_type='one-time'):
+        Investment.objects.create(
+            email='a@example.com', fund_id=fund_id, name='Alpha Bluechip Fund', amount=amount,
+            investment_type=investment_type, nav=nav, category='Equity', payment_mode='Wallet',
+            date=np.datetime64(day).item())
+
+    def test_xirr_rows_are_solved_together(self):
+        rates = xirr(
+            [[-1000, 1100, 0], [-1000, -1000, 2200], [-500, 500, 0], [-1000, 5, 0]],
+            [[1, 0, 0], [2, 1, 0], [0, 0, 0], [1, 0, 0]])
+        self.assertAlmostEqual(rates[0], 0.10)
+        # 1000 * (1 + r) ** 2 + 1000 * (1 + r) == 2200
+        self.assertAlmostEqual(rates[1], (-3 + np.sqrt(1 + 4 * 2.2)) / 2, places=6)
+        self.assertTrue(np.isnan(rates[2]))
+        self.assertAlmostEqual(rates[3], -0.995)
+
+    def test_holdings_are_aggregated_per_fund(self):
+        self.invest(1000, 10.0, '2025-09-28', investment_type='sip')
+        self.invest(1119, 11.19, '2026-09-28', investment_type='one-time')
+        self.invest(500, 20.0, '2026-01-01', fund_id='999')
+        portfolio = value_portfolio('a@example.com', today=np.datetime64('2026-09-28').item())
+        alpha, other = portfolio['holdings']
+        self.assertEqual(alpha['fund_id'], '101')
+        self.assertEqual(alpha['investment_types'], ['one-time', 'sip'])
+        self.assertEqual(alpha['units'], 200)
+        self.assertEqual(alpha['nav'], 21.9)
+        self.assertEqual(alpha['current_value'], 4380)
+        self.assertEqual(alpha['gain'], 2261)
+        self.assertEqual(alpha['day_change'], 20)
+        # 1000 a year ago grew to 4380 - 1119
+        self.assertAlmostEqual(alpha['xirr'], 226.1)
+        # No NAVs for this fund: valued at its purchase NAV
+        self.assertEqual((other['current_value'], other['gain']), (500, 0))
+        self.assertEqual(portfolio['summary']['invested'], 2619)
+        self.assertEqual(portfolio['summary']['holdings'], 2)
+
+    def test_portfolio_cache_is_dropped_on_invest(self):
+        from api.models import User
+        User.objects.create(name='A', username='a', mobile='1', email='a@example.com', password='x', balance='5000')
+        url = reverse('get_portfolio')
+        self.assertEqual(self.client.get(url, {'email': 'a@example.com'}).json()['holdings'], [])
+        self.invest(1000, 10.0, '2026-01-01')
+        # Still the cached valuation
+        self.assertEqual(self.client.get(url, {'email': 'a@example.com'}).json()['holdings'], [])
+        response = self.client.post(reverse('save_investment'), {
+            'email': 'a@example.com', 'fund_id': '101', 'name': 'Alpha Bluechip Fund', 'amount': 500,
+            'investment_type': 'one-time', 'nav': 10, 'category': 'Equity', 'payment_mode': 'Wallet',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['new_balance'], 4500)
+        self.assertEqual(User.objects.get(email='a@example.com').balance, '4500.00')
+        summary = self.client.get(url, {'email': 'a@example.com'}).json()['summary']
+        self.assertEqual(summary['invested'], 1500)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_wallet_investment_needs_the_balance(self):
+        from api.models import User
+        User.objects.create(name='A', username='a', mobile='1', email='a@example.com', password='x', balance='100.00')
+        payload = {'email': 'a@example.com', 'fund_id': '101', 'name': 'Alpha Bluechip Fund', 'amount': 500,
+                   'investment_type': 'one-time', 'nav': 10, 'category': 'Equity', 'payment_mode': 'Wallet'}
+        response = self.client.post(reverse('save_investment'), payload, format='json')
+        self.assertEqual((response.status_code, response.json()), (400, {'error': 'Insufficient wallet balance'}))
+        response = self.client.post(reverse('save_investment'), dict(payload, nav='abc'), format='json')
+        self.assertEqual(response.status_code, 400)
+        User.objects.filter(email='a@example.com').update(balance='1000.00')
+        response = self.client.post(reverse('save_investment'), dict(payload, nav='abc'), format='json')
+        self.assertEqual(response.status_code, 400)
+        # The charge for an investment that could not be saved is refunded
+        self.assertEqual(User.objects.get(email='a@example.com').balance, '1000.00')
+        self.assertFalse(Investment.objects.exists())
+
+
+class SipSchedulerTest(TestCase):
+    day = np.datetime64('2026-10-05').item()
+
+    def setUp(self):
+        from api.models import User
+        self.user = User.objects.create(
+            name='A', username='a', mobile='1', email='a@example.com', password='x', balance='2500.00')
+
+    def sip(self, sip_day=5, start='2026-09-05', payment_mode='Wallet', amount=1000):
+        return Investment.objects.create(
+            email='a@example.com', fund_id='101', name='Alpha Bluechip Fund', amount=amount,
+            investment_type='sip', sip_date=str(sip_day), sip_day=sip_day, nav=10, category='Equity',
+            payment_mode=payment_mode, date=np.datetime64(start).item())
+
+    def fake_navs(self, fund_ids, day):
+        self.lookups.append(list(fund_ids))
+        return {'101': (20.0, day.strftime('%d-%m-%Y'), None)}
+
+    def test_due_days_cover_short_months(self):
+        self.assertEqual(due_days(np.datetime64('2026-02-28').item()), [28, 29, 30, 31])
+        self.assertEqual(due_days(np.datetime64('2026-10-30').item()), [30])
+        self.assertEqual(due_days(np.datetime64('2026-10-31').item()), [31])
+
+    def test_run_charges_wallets_in_chunks_and_is_idempotent(self):
+        self.lookups = []
+        wallet = [self.sip() for _ in range(3)]
+        upi = self.sip(payment_mode='UPI')
+        self.sip(start='2026-10-02')  # started this month: first instalment already paid
+        self.sip(sip_day=6)
+
+        stats = run_sips(self.day, chunk_size=2, nav_lookup=self.fake_navs)
+        self.assertEqual(stats, {'due': 4, 'paid': 3, 'failed': 1, 'skipped': 0})
+        self.assertEqual(self.lookups, [['101']])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, '500.00')
+        failed = SipInstalment.objects.get(status='failed')
+        self.assertEqual((failed.investment_id, failed.reason), (wallet[2].id, 'Insufficient wallet balance'))
+        paid = SipInstalment.objects.get(investment=upi)
+        self.assertEqual((paid.nav, paid.units), (20.0, 50.0))
+
+        again = run_sips(self.day, chunk_size=3, nav_lookup=self.fake_navs)
+        self.assertEqual(again, {'due': 4, 'paid': 0, 'failed': 0, 'skipped': 4})
+        self.assertEqual(SipInstalment.objects.count(), 4)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, '500.00')
+
+    def test_paid_instalments_count_in_the_portfolio(self):
+        self.lookups = []
+        self.sip()
+        run_sips(self.day, nav_lookup=self.fake_navs)
+        with unittest.mock.patch('web.portfolio.latest_navs', return_value={'101': (20.0, '05-10-2026', None)}):
+            portfolio = value_portfolio('a@example.com', today=self.day)
+        holding = portfolio['holdings'][0]
+        self.assertEqual(holding['transactions'], 2)
+        self.assertEqual(holding['invested'], 2000)
+        self.assertEqual(holding['units'], 150)
+
+    def test_instalment_recorded_by_another_run_is_not_charged(self):
+        self.lookups = []
+        taken, free = self.sip(), self.sip()
+        SipInstalment.objects.create(
+            investment=taken, email='a@example.com', fund_id='101', due_date=self.day, amount=1000, nav=20,
+            units=50, payment_mode='Wallet', status='pending', run_id='other')
+        stats = run_sips(self.day, nav_lookup=self.fake_navs)
+        self.assertEqual(stats, {'due': 2, 'paid': 1, 'failed': 0, 'skipped': 1})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, '1500.00')
+        self.assertEqual(SipInstalment.objects.get(investment=taken).status, 'pending')
+        self.assertEqual(SipInstalment.objects.get(investment=free).status, 'paid')
+
+    def test_wallets_are_charged_once_per_user(self):
+        from api.models import User
+        self.lookups = []
+        User.objects.create(name='B', username='b', mobile='2', email='b@example.com', password='x',
+                            balance='10000.00')
+        for _ in range(2):
+            self.sip()
+        for _ in range(3):
+            Investment.objects.create(
+                email='b@example.com', fund_id='101', name='Alpha Bluechip Fund', amount=500, investment_type='sip',
+                sip_date='5', sip_day=5, nav=10, category='Equity', payment_mode='Wallet', date=date(2026, 9, 5))
+        with CaptureQueriesContext(connection) as queries:
+            stats = run_sips(self.day, nav_lookup=self.fake_navs)
+        self.assertEqual(stats, {'due': 5, 'paid': 5, 'failed': 0, 'skipped': 0})
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len([sql for sql in updates if '"api_user"' in sql]), 2)
+        self.assertEqual(len([sql for sql in updates if '"web_sipinstalment"' in sql]), 1)
+        self.assertEqual(dict(User.objects.values_list('email', 'balance')),
+                         {'a@example.com': '500.00', 'b@example.com': '8500.00'})
+
+    def test_wallet_write_is_retried_when_the_balance_changed(self):
+        from api.models import User
+        seen = []
+        def change(balance):
+            seen.append(balance)
+            if len(seen) == 1:
+                User.objects.filter(email='a@example.com').update(balance='3000.00')  # another writer
+            return balance - 100
+        self.assertEqual(User.update_balance('a@example.com', change), 2900.0)
+        self.assertEqual(seen, [2500.0, 3000.0])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, '2900.00')
+        # A stale balance passed in is compared, not trusted
+        self.assertEqual(User.debit('a@example.com', 100, current='2500.00'), 2800.0)
+
+
+class SipWithoutTransactionsTest(TransactionTestCase):
+    """On djongo a failed bulk insert is not rolled back and leaves its first rows behind"""
+
+    def test_partial_bulk_insert_charges_every_sip_once(self):
+        from api.models import User
+        User.objects.create(name='A', username='a', mobile='1', email='a@example.com', password='x',
+                            balance='2500.00')
+        sips = [Investment.objects.create(
+            email='a@example.com', fund_id='101', name='Alpha Bluechip Fund', amount=1000, investment_type='sip',
+            sip_date='5', sip_day=5, nav=10, category='Equity', payment_mode='Wallet',
+            date=date(2026, 9, 5)) for _ in range(2)]
+        bulk_create = SipInstalment.objects.bulk_create
+
+        def partial_bulk_create(instalments, **kwargs):
+            bulk_create(instalments[:1])
+            raise DatabaseError('duplicate key') from DuplicateKeyError('E11000 duplicate key error')
+
+        day = date(2026, 10, 5)
+        with unittest.mock.patch('Financogram.db.connection', unittest.mock.Mock(vendor='djongo')), \
+                unittest.mock.patch.object(SipInstalment.objects, 'bulk_create', partial_bulk_create):
+            stats = run_sips(day, nav_lookup=lambda fund_ids, day: {'101': (20.0, '05-10-2026', None)})
+        self.assertEqual(stats, {'due': 2, 'paid': 2, 'failed': 0, 'skipped': 0})
+        self.assertEqual(User.objects.get(email='a@example.com').balance, '500.00')
+        self.assertEqual(sorted(SipInstalment.objects.values_list('investment_id', 'status')),
+                         [(sips[0].id, 'paid'), (sips[1].id, 'paid')])
+
+        again = run_sips(day, nav_lookup=lambda fund_ids, day: {})
+        self.assertEqual(again, {'due': 2, 'paid': 0, 'failed': 0, 'skipped': 2})
+        self.assertEqual(User.objects.get(email='a@example.com').balance, '500.00')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'query plans are checked on SQLite')
+class QueryPlanTest(TestCase):
+    """Hot lookups must be index searches, never table scans"""
+
+    def assert_uses_index(self, queryset, index):
+        plan = queryset.explain()
+        self.assertRegex(plan, rf'SEARCH \S+ USING (COVERING )?INDEX {index}')
+        self.assertNotRegex(plan, r'\bSCAN\b')
+
+    def test_investment_lookups(self):
+        from api.models import User
+        self.assert_uses_index(Investment.objects.filter(email='a@example.com'), 'investment_email_date_idx')
+        self.assert_uses_index(due_sips(np.datetime64('2026-10-05').item()).order_by('id'), 'investment_sip_day_idx')
+        self.assert_uses_index(
+            SipInstalment.objects.filter(email='a@example.com', status='paid'), 'sip_instalment_email_idx')
+        # The unique constraint on User.email is its index
+        self.assert_uses_index(User.objects.filter(email='a@example.com'), 'sqlite_autoindex_api_user')
+
+    def test_catalog_lookups(self):
+        self.assert_uses_index(
+            MutualFundScheme.objects.filter(position__gte=6, position__lt=46).order_by('position'),
+            'scheme_position_idx')
+        self.assert_uses_index(MutualFundScheme.objects.filter(scheme_code=100006), 'sqlite_autoindex')
+
+
+def news_article(n, url=None, title=None, description='', published='2026-10-0{n}T10:00:00Z'):
+    return {
+        'source': {'id': None, 'name': 'Wire'},
+        'author': 'Desk',
+        'title': title or f"Story {n}",
+        'description': description,
+        'url': url or f"https://news.example.com/story-{n}",
+        'urlToImage': None,
+        'publishedAt': published.format(n=n),
+        'content': 'Body',
+    }
+
+
+class NewsStoreTest(APITestCase):
+    FEED = [
+        news_article(1, title='Sensex climbs as Reliance rallies', description='Markets rose.'),
+        news_article(2, title='AAPL earnings beat', description='Apple shares jump after results.'),
+        news_article(3, title='Monsoon and inflation', description='Economy watch.'),
+        news_article(4, title='[Removed]'),
+        # The same story again, with tracking parameters and a fragment
+        news_article(1, url='https://NEWS.example.com/story-1/?utm_source=x#top', title='Duplicate'),
+    ]
+
+    def setUp(self):
+        self.calls = []
+
+        def fetch(query):
+            self.calls.append(query)
+            return self.feed
+
+        self.feed = list(self.FEED)
+        self.fetch = fetch
+        self.store = NewsStore(fetch=fetch, refresh_on_read=False)
+        patch = unittest.mock.patch.object(views, 'news_store', self.store)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_ingestion_dedupes_by_url(self):
+        self.assertEqual(url_hash('https://news.example.com/story-1'),
+                         url_hash('https://NEWS.example.com/story-1/?utm_source=x#top'))
+        self.assertEqual(ingest_news(['sensex'], fetch=self.fetch), 3)
+        self.assertEqual(NewsArticle.objects.get(url_hash=url_hash('https://news.example.com/story-1')).title,
+                         'Sensex climbs as Reliance rallies')
+        # Within the poll interval another poll is skipped; forced, it adds nothing new
+        self.assertIsNone(ingest_news(['sensex'], fetch=self.fetch))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(ingest_news(['sensex'], fetch=self.fetch, force=True), 0)
+        self.assertEqual(NewsArticle.objects.count(), 3)
+
+    def test_failed_poll_releases_its_claim(self):
+        def down(query):
+            raise requests.ConnectionError('NewsAPI is down')
+
+        self.assertEqual(ingest_news(['sensex', 'nifty'], fetch=down), 0)
+        self.assertFalse(NewsPoll.objects.exists())
+        # The next poll runs right away, and a successful one keeps its claim
+        self.assertEqual(ingest_news(['sensex'], fetch=self.fetch), 3)
+        self.assertTrue(NewsPoll.objects.exists())
+        self.assertIsNone(ingest_news(['sensex'], fetch=self.fetch))
+
+    def test_lost_poll_claim_on_djongo(self):
+        """djongo reports the other process's claim as a DatabaseError; later queries still run"""
+        def create(**kwargs):
+            raise DatabaseError('duplicate key') from DuplicateKeyError('E11000 duplicate key error')
+
+        with unittest.mock.patch('Financogram.db.connection', unittest.mock.Mock(vendor='djongo')), \
+                unittest.mock.patch.object(NewsPoll.objects, 'create', create):
+            self.assertFalse(claim_poll(900))
+        self.assertTrue(claim_poll(900))
+        self.assertFalse(claim_poll(900))
+        self.assertEqual(NewsPoll.objects.count(), 1)
+        NewsPoll.objects.update(expires_at=timezone.now())
+        self.assertTrue(claim_poll(900))
+
+    def test_tickers(self):
+        self.assertEqual(extract_tickers('Sensex climbs as Reliance rallies'), ['RELIANCE.BO', '^BSESN'])
+        self.assertEqual(extract_tickers('$AAPL and Nvidia; an amd chip'), ['AAPL', 'NVDA'])
+
+    def test_search_and_pagination(self):
+        ingest_news(['sensex'], fetch=self.fetch)
+        response = self.client.get(reverse('get_news'))
+        self.assertEqual(response.data['status'], 'ok')
+        self.assertEqual(response.data['totalResults'], 3)
+        self.assertEqual([a['title'] for a in response.data['articles']],
+                         ['Monsoon and inflation', 'AAPL earnings beat', 'Sensex climbs as Reliance rallies'])
+        self.assertEqual(response.data['articles'][0]['publishedAt'], '2026-10-03T10:00:00Z')
+
+        page = self.client.get(reverse('get_news'), {'page': 2, 'page_size': 2}).data
+        self.assertEqual([a['title'] for a in page['articles']], ['Sensex climbs as Reliance rallies'])
+
+        titles = lambda params: [a['title'] for a in self.client.get(reverse('get_news'), params).data['articles']]
+        self.assertEqual(titles({'q': 'apple shar'}), ['AAPL earnings beat'])
+        self.assertEqual(titles({'q': 'markets sensex'}), ['Sensex climbs as Reliance rallies'])
+        self.assertEqual(titles({'ticker': 'reliance'}), ['Sensex climbs as Reliance rallies'])
+        self.assertEqual(titles({'ticker': 'aapl', 'q': 'earnings'}), ['AAPL earnings beat'])
+        self.assertEqual(titles({'ticker': 'UNKNOWN'}), [])
+        self.assertEqual(self.client.get(reverse('get_news'), {'page': 0}).status_code, 400)
+
+    def test_index_picks_up_new_and_removed_articles(self):
+        ingest_news(['sensex'], fetch=self.fetch)
+        self.assertEqual(len(self.store.index()), 3)
+        self.feed = [news_article(5, title='Nifty at a record')]
+        ingest_news(['sensex'], fetch=self.fetch, force=True)
+        self.store.invalidate()
+        self.assertEqual(self.store.search('nifty')[1], 1)
+        self.assertEqual(len(self.store.index()), 4)
+
+        NewsArticle.objects.filter(title='Monsoon and inflation').delete()
+        self.store.invalidate()
+        self.assertEqual(self.store.search('monsoon'), ([], 0))
+        self.assertEqual(len(self.store.index()), 3)
+
+    def test_reads_never_call_newsapi(self):
+        with unittest.mock.patch('web.news.requests.get', side_effect=AssertionError('NewsAPI called')):
+            response = self.client.get(reverse('get_news'))
+        self.assertEqual(response.data['articles'], [])
+
+
+@unittest.skipUnless(mongomock, 'mongomock is not installed')
+class MongoRepositoryTest(APITestCase):
+    """The pymongo repositories read and write documents in djongo's layout"""
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().financogram
+        for name, seq in [('prediction_predictioncache', 4), ('api_user', 1), ('web_investment', 2)]:
+            self.db['__schema__'].insert_one({'name': name, 'auto': {'field_names': ['id'], 'seq': seq}})
+        self.db.api_user.insert_one({
+            'id': 1, 'name': 'A', 'username': 'a', 'mobile': '1', 'email': 'a@example.com', 'password': 'x',
+            'face_image': None, 'profile_image': None, 'qr_code': None,
+            'date_joined': datetime(2026, 1, 2), 'balance': '100.00'})
+        self.db.web_investment.insert_many([
+            {'id': 2, 'email': 'a@example.com', 'fund_id': '102', 'name': 'Second', 'amount': 500.0,
+             'sip_date': '5', 'sip_day': 5, 'investment_type': 'sip', 'nav': 20.0, 'category': 'Debt',
+             'risk': 'Low', 'payment_mode': 'UPI', 'date': datetime(2026, 2, 1),
+             'time': datetime(1900, 1, 1, 9, 30)},
+            {'id': 1, 'email': 'a@example.com', 'fund_id': '101', 'name': 'First', 'amount': 1000.0,
+             'sip_date': 'Not Applicable', 'sip_day': None, 'investment_type': 'lumpsum', 'nav': 10.0,
+             'category': 'Equity', 'risk': 'High', 'payment_mode': 'Wallet', 'date': datetime(2026, 1, 5),
+             'time': datetime(1900, 1, 1, 12, 0)},
+            {'id': 3, 'email': 'b@example.com', 'fund_id': '101', 'name': 'Other', 'amount': 1.0},
+        ])
+        patches = [
+            unittest.mock.patch.object(mongo, 'enabled', return_value=True),
+            unittest.mock.patch.object(mongo, 'get_database', return_value=self.db),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_prediction_cache_upsert_and_get(self):
+        from prediction.cache import TieredPredictionCache
+        repository = mongo.PredictionCacheRepository()
+        self.db.prediction_predictioncache.insert_one({
+            'id': 4, 'cache_key': 'AAPL_1d', 'cache_data': '{"old": true}',
+            'expires_at': datetime(2000, 1, 1), 'created_at': datetime(2000, 1, 1)})
+
+        cache = TieredPredictionCache(max_entries=8)
+        self.assertIsNone(cache.get('AAPL_1d'))  # expired
+        cache.set_many({'AAPL_1d': {'price': 1}, 'MSFT_1d': {'price': 2}}, timedelta(hours=1))
+
+        docs = {doc['cache_key']: doc for doc in self.db.prediction_predictioncache.find()}
+        self.assertEqual(docs['AAPL_1d']['id'], 4)
+        self.assertEqual(docs['MSFT_1d']['id'], 6)  # 5 was reserved for AAPL_1d in case its row expired
+        self.assertEqual(json.loads(docs['MSFT_1d']['cache_data']), {'price': 2})
+        self.assertIsNone(docs['MSFT_1d']['expires_at'].tzinfo)
+
+        rows = repository.get_many(['AAPL_1d', 'MSFT_1d', 'NVDA_1d'], timezone.now())
+        self.assertEqual({key: data for key, data, _ in rows}, {'AAPL_1d': {'price': 1}, 'MSFT_1d': {'price': 2}})
+        self.assertTrue(all(expires_at > timezone.now() for _, _, expires_at in rows))
+        self.assertEqual(TieredPredictionCache().get('MSFT_1d'), {'price': 2})
+
+    def test_user_lookup_and_wallet(self):
+        users = mongo.UserRepository()
+        profile = users.find_by_email('a@example.com', ['username', 'date_joined', 'balance'])
+        self.assertEqual(profile, {'username': 'a', 'date_joined': date(2026, 1, 2), 'balance': '100.00'})
+        self.assertIsNone(users.find_by_email('x@example.com', ['username']))
+
+        from api.models import InsufficientBalance, User
+        self.assertEqual(User.add_to_balance('a@example.com', 25.5), 125.5)
+        self.assertEqual(self.db.api_user.find_one({'email': 'a@example.com'})['balance'], '125.50')
+        self.assertEqual(User.debit('a@example.com', 100), 25.5)
+        with self.assertRaises(InsufficientBalance):
+            User.debit('a@example.com', 30)
+        self.assertEqual(self.db.api_user.find_one({'email': 'a@example.com'})['balance'], '25.50')
+        self.assertIsNone(User.add_to_balance('x@example.com', 1))
+
+        # A balance read in bulk saves the first read; a stale one is read again
+        self.assertEqual(User.balances(['a@example.com', 'x@example.com']), {'a@example.com': '25.50'})
+        self.assertEqual(User.debit('a@example.com', 5, current='25.50'), 20.5)
+        self.assertEqual(User.debit('a@example.com', 5, current='25.50'), 15.5)
+
+    def test_bulk_update_writes_djongo_layout(self):
+        self.db.web_mutualfundscheme.insert_many([
+            {'id': 1, 'scheme_code': 101, 'name': 'Old', 'nav': None, 'nav_date': None},
+            {'id': 2, 'scheme_code': 102, 'name': 'Untouched', 'nav': None, 'nav_date': None},
+        ])
+        synced_at = timezone.make_aware(datetime(2026, 5, 10, 12, 0), dt_timezone.utc)
+        scheme = MutualFundScheme(id=1, scheme_code=101, name='New', nav=12.5, nav_date=date(2026, 5, 9),
+                                  detail_synced_at=synced_at)
+        bulk_update(MutualFundScheme, [scheme], ['name', 'nav', 'nav_date', 'detail_synced_at'])
+        doc = self.db.web_mutualfundscheme.find_one({'id': 1}, {'_id': 0})
+        self.assertEqual(doc, {'id': 1, 'scheme_code': 101, 'name': 'New', 'nav': 12.5,
+                               'nav_date': datetime(2026, 5, 9), 'detail_synced_at': datetime(2026, 5, 10, 12, 0)})
+        self.assertEqual(self.db.web_mutualfundscheme.find_one({'id': 2})['name'], 'Untouched')
+
+    def test_investment_listing(self):
+        response = self.client.get(reverse('get_investments'), {'email': 'a@example.com'})
+        self.assertEqual([row['name'] for row in response.json()], ['First', 'Second'])
+        self.assertEqual(response.json()[1]['date'], '2026-02-01')
+        self.assertEqual(response.json()[1]['time'], '09:30:00')
+        self.assertEqual(set(response.json()[0]), set(mongo.InvestmentRepository.list_fields))
@@ -10,7 +10,10 @@ urlpatterns = [
     path('stocks/<str:symbol>/details/', views.get_stock_details, name='get_stock_details'),
     path('mutual-funds/', views.get_mutual_funds, name='get_mutual_funds'),
     path('mutual-funds/invest/', views.save_investment, name='save_investment'),
+    path('mutual-funds/search/', views.search_mutual_funds, name='search_mutual_funds'),
+    path('mutual-funds/facets/', views.get_mutual_fund_facets, name='get_mutual_fund_facets'),
     path('mutual-fund-details/<str:fund_id>/', views.get_mutual_fund_details, name='get_mutual_fund_details'),
     path('investments/', views.get_investments, name='get_investments'),
+    path('portfolio/', views.get_portfolio_summary, name='get_portfolio'),
 
 ]
\ No newline at end of file
@@ -1,26 +1,36 @@
 import requests
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.http import JsonResponse
 import os
 from dotenv import load_dotenv
+from .news import news_store, resolve_ticker
 
 load_dotenv()
 
-NEWS_API_KEY = os.getenv('NEWS_API_KEY')
-
 @api_view(['GET'])
 def get_news(request):
-    url = "https://newsapi.org/v2/everything"
-    params = {
-        "q": "sensex",
-        "language": "en",
-        "sortBy": "publishedAt",
-        "pageSize": 36,
-        "apiKey": NEWS_API_KEY,
-    }
-    response = requests.get(url, params=params)
-    return JsonResponse(response.json())
+    """Stored articles newest first, optionally matching keywords (q) and a ticker, a page at a time"""
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET.get('page_size', 36))
+    except ValueError:
+        return Response({'status': 'error', 'message': 'page and page_size must be integers'}, status=400)
+    if page < 1 or not 1 <= page_size <= 100:
+        return Response({'status': 'error', 'message': 'page must be >= 1 and page_size 1-100'}, status=400)
+
+    ticker = request.GET.get('ticker')
+    symbol = resolve_ticker(ticker) if ticker else None
+    if ticker and symbol is None:
+        articles, total = [], 0
+    else:
+        articles, total = news_store.search(request.GET.get('q', ''), symbol, page, page_size)
+    return Response({
+        'status': 'ok',
+        'totalResults': total,
+        'page': page,
+        'page_size': page_size,
+        'articles': articles,
+    })
 
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')  # from openrouter.ai
 
@@ -54,10 +64,13 @@ def chat(request):
 
 
 # views.py
-import yfinance as yf
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
+from prediction.bar_store import SYMBOL_PATTERN
+from prediction.symbol_cache import symbol_data
+from prediction.columnar import SERIES_RENDERERS, is_compact
+from .charts import CHART_INTERVALS, chart_ttl, get_chart, get_chart_columns
+from .snapshot import QuoteSnapshot
 
 
 TOP_STOCKS = [
@@ -69,55 +82,49 @@ TOP_STOCKS = [
     'KOTAKBANK.BO', 'BAJFINANCE.BO', 'LT.BO', 'MARUTI.BO', 'TATAMOTORS.BO'
 ]
 
+stock_snapshot = QuoteSnapshot('stocks', TOP_STOCKS)
+
+
+def snapshot_headers(as_of):
+    return {'X-As-Of': as_of.isoformat()} if as_of else {}
+
+
 @api_view(['GET'])
 def get_stocks(request):
-    def fetch_info(symbol):
-        try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            return {
-                'symbol': symbol,
-                'name': info.get('shortName', symbol),
-                'price': info.get('regularMarketPrice', 0.0)
-            }
-        except Exception:
-            return {
-                'symbol': symbol,
-                'name': symbol,
-                'price': 0.0
-            }
+    # Served from the snapshot; symbols never fetched successfully get placeholders
+    quotes, as_of = stock_snapshot.get()
 
     results = []
-    with ThreadPoolExecutor(max_workers=25) as executor:
-        futures = [executor.submit(fetch_info, sym) for sym in TOP_STOCKS]
-        for future in as_completed(futures):
-            results.append(future.result())
+    for symbol in TOP_STOCKS:
+        quote = quotes.get(symbol)
+        if quote is None:
+            results.append({'symbol': symbol, 'name': symbol, 'price': 0.0})
+            continue
+        results.append({
+            'symbol': symbol,
+            'name': quote['name'],
+            'price': quote['price'] if quote['price'] is not None else 0.0
+        })
 
-    return Response(results)
+    return Response(results, headers=snapshot_headers(as_of))
 
 
 @api_view(['GET'])
+@renderer_classes(SERIES_RENDERERS)
 def get_stock_chart(request, symbol):
+    if not SYMBOL_PATTERN.match(symbol.upper()) or symbol in ('.', '..'):
+        return Response({'error': f'Invalid symbol: {symbol}'}, status=400)
     period = request.GET.get("period", "5d")
-    interval_map = {
-        "1d": "5m",
-        "5d": "30m",
-        "1mo": "1d",
-        "6mo": "1d",
-        "ytd": "1d",
-        "1y": "1d",
-        "5y": "1wk",
-        "max": "1mo"
-    }
-    interval = interval_map.get(period, "30m")
-
-    stock = yf.Ticker(symbol)
-    hist = stock.history(period=period, interval=interval)
+    points = request.GET.get("points")
+    if points is not None:
+        if not points.isdigit() or int(points) < 3:
+            return Response({'error': 'points must be an integer of at least 3'}, status=400)
+        points = int(points)
 
-    dates = hist.index.to_series().dt.strftime("%b %d %H:%M" if interval in ["5m", "15m", "30m"] else "%b %d %Y").tolist()
-    prices = hist['Close'].fillna(method='ffill').tolist()
-
-    return Response({'dates': dates, 'prices': prices})
+    # ?format=columns / ?format=msgpack (or the matching Accept header) skip date formatting
+    chart = get_chart_columns(symbol, period, points) if is_compact(request) else get_chart(symbol, period, points)
+    interval = CHART_INTERVALS.get(period, "30m")
+    return Response(chart, headers={'Cache-Control': f'max-age={chart_ttl(interval)}'})
 
 
 INDICES = {
@@ -128,44 +135,38 @@ INDICES = {
     "^BSESMCAP": "S&P BSE SmallCap"
 }
 
+index_snapshot = QuoteSnapshot('indices', INDICES)
+
+
 @api_view(['GET'])
 def get_indices(request):
-    def fetch_index(symbol, name):
-        try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            current = info.get('regularMarketPrice')
-            prev_close = info.get('regularMarketPreviousClose')
-            if current and prev_close:
-                change = current - prev_close
-                percent = (change / prev_close) * 100
-                return {
-                    'symbol': symbol,
-                    'name': name,
-                    'value': round(current, 2),
-                    'change': round(change, 2),
-                    'percent': round(percent, 2)
-                }
-        except Exception:
-            pass
-        return None
+    quotes, as_of = index_snapshot.get()
 
     results = []
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(fetch_index, sym, nm): sym for sym, nm in INDICES.items()}
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                results.append(result)
+    for symbol, name in INDICES.items():
+        quote = quotes.get(symbol)
+        if quote is None:
+            continue
+        current = quote['price']
+        prev_close = quote['previous_close']
+        if current and prev_close:
+            change = current - prev_close
+            percent = (change / prev_close) * 100
+            results.append({
+                'symbol': symbol,
+                'name': name,
+                'value': round(current, 2),
+                'change': round(change, 2),
+                'percent': round(percent, 2)
+            })
 
-    return Response(results)
+    return Response(results, headers=snapshot_headers(as_of))
 
 
 @api_view(['GET'])
 def get_stock_details(request, symbol):
     try:
-        stock = yf.Ticker(symbol)
-        info = stock.info
+        info = symbol_data.info(symbol)
 
         data = {
             "previousClose": info.get("previousClose"),
@@ -188,100 +189,104 @@ def get_stock_details(request, symbol):
 
 
 # views_mutual_funds.py
-import os
-import json
-from datetime import datetime, timedelta
-import concurrent.futures
-
-CACHE_PATH = 'mf_cache.json'
-CACHE_EXPIRY_HOURS = 12
-
-def is_cache_valid():
-    if not os.path.exists(CACHE_PATH):
-        return False
-    modified_time = datetime.fromtimestamp(os.path.getmtime(CACHE_PATH))
-    return datetime.now() - modified_time < timedelta(hours=CACHE_EXPIRY_HOURS)
+from .mf_catalog import mf_catalog
 
+@api_view(['GET'])
+def get_mutual_funds(request):
+    return Response(mf_catalog.featured())
 
-def fetch_fund_detail(scheme):
-    try:
-        detail = requests.get(f"https://api.mfapi.in/mf/{scheme['schemeCode']}").json()
-        latest = detail.get('data', [{}])[0]
-        return {
-            "id": scheme['schemeCode'],
-            "name": scheme['schemeName'],
-            "nav": float(latest.get('nav', 0)),
-            "returns": None,
-            "category": detail.get('meta', {}).get('scheme_category'),
-            "risk": detail.get('meta', {}).get('risk'),
-            "min_investment": 500
-        }
-    except:
-        return None
 
 @api_view(['GET'])
-def get_mutual_funds(request):
-    if is_cache_valid():
-        with open(CACHE_PATH, 'r') as f:
-            data = json.load(f)
-        return Response(data)
+def search_mutual_funds(request):
+    """Search the whole scheme catalog: ?q=&category=&risk=&fund_house=&limit=&cursor="""
+    try:
+        limit = min(int(request.GET.get('limit', 20)), 100)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=400)
+    if limit < 1:
+        return Response({'error': 'limit must be positive'}, status=400)
 
-    resp = requests.get('https://api.mfapi.in/mf?limit=40&offset=6')
-    all_schemes = resp.json()
+    try:
+        results, next_cursor, total = mf_catalog.search(
+            request.GET.get('q', ''),
+            category=request.GET.get('category'),
+            risk=request.GET.get('risk'),
+            fund_house=request.GET.get('fund_house'),
+            limit=limit,
+            cursor=request.GET.get('cursor'),
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
 
-    funds = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        results = list(executor.map(fetch_fund_detail, all_schemes))
-        # Filter out None results if any failed
-        funds = [fund for fund in results if fund is not None]
+    return Response({'results': results, 'next_cursor': next_cursor, 'total': total})
 
-    with open(CACHE_PATH, 'w') as f:
-        json.dump(funds, f)
 
-    return Response(funds)
+@api_view(['GET'])
+def get_mutual_fund_facets(request):
+    return Response(mf_catalog.facets())
 
 
-import requests
+from prediction.columnar import encode_series
+from .fund_returns import METRIC_FIELDS, returns_detail
+from .models import MutualFundScheme
+from .nav_store import get_nav_store, parse_day
 
 @api_view(['GET'])
+@renderer_classes(SERIES_RENDERERS)
 def get_mutual_fund_details(request, fund_id):
+    """Fund details with its NAV history, optionally limited by ?from=&to= and reduced to ?points="""
+    if not str(fund_id).isdigit():
+        return Response({"error": "No data found for this fund."}, status=404)
+    points = request.GET.get("points")
     try:
-        detail = requests.get(f"https://api.mfapi.in/mf/{fund_id}").json()
-        full_history = detail.get("data", [])  # Don't slice
-
-        if not full_history:
-            return Response({"error": "No data found for this fund."}, status=404)
-
-        # Sort in ascending order by date
-        sorted_history = sorted(
-            full_history,
-            key=lambda x: x["date"]
-        )
-
-        nav_data = [
-            {"date": item["date"], "nav": float(item["nav"])}
-            for item in sorted_history if "nav" in item
-        ]
-
-        response = {
-            "id": fund_id,
-            "name": detail.get("meta", {}).get("scheme_name"),
-            "category": detail.get("meta", {}).get("scheme_category"),
-            "risk": detail.get("meta", {}).get("risk"),
-            "nav": float(nav_data[-1]["nav"]) if nav_data else 0,
-            "returns": None,
-            "historical_nav": nav_data
-        }
-        return Response(response)
+        start = parse_day(request.GET.get("from"))
+        end = parse_day(request.GET.get("to"))
+        if points is not None:
+            if not points.isdigit() or int(points) < 3:
+                raise ValueError("points must be an integer of at least 3")
+            points = int(points)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    # Only catalog schemes reach the NAV store (and mfapi.in). Returns are
+    # computed in batches by compute_fund_returns, never per request.
+    metrics = MutualFundScheme.objects.filter(scheme_code=int(fund_id)).values(*METRIC_FIELDS).first()
+    if metrics is None:
+        return Response({"error": "No data found for this fund."}, status=404)
 
+    try:
+        series = get_nav_store().history(fund_id)
+    except ValueError:
+        return Response({"error": "No data found for this fund."}, status=404)
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
+    window = series.between(start, end)
+    if points:
+        window = window.downsampled(points)
+    meta = series.meta
+    if is_compact(request):
+        historical = encode_series(window.timestamps(), {'nav': window.navs})
+    else:
+        historical = window.records()
+    return Response({
+        "id": fund_id,
+        "name": meta.get("scheme_name"),
+        "category": meta.get("scheme_category"),
+        "risk": meta.get("risk"),
+        "nav": float(series.navs[-1]),
+        "returns": metrics['returns'],
+        "returns_detail": returns_detail(metrics),
+        "historical_nav": historical
+    })
+
 
 from .models import Investment
+from .portfolio import get_portfolio, invalidate_portfolio
+from .sip import parse_sip_day
 from django.utils import timezone
-from django.db import transaction
-from api.models import User
+from api.models import InsufficientBalance, User
+from Financogram import mongo
 
 @api_view(['POST'])
 def save_investment(request):
@@ -305,35 +310,29 @@ def save_investment(request):
         if amount <= 0:
             return Response({'error': 'Amount must be greater than 0'}, status=400)
 
-        # Fetch user
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
+        # Charge the wallet first, with the same compare-and-set as every balance write
+        # (djongo has no transactions to make the charge and the insert atomic)
+        new_balance = None
+        if payment_mode == 'Wallet':
+            try:
+                new_balance = User.debit(email, amount)
+            except InsufficientBalance as e:
+                return Response({'error': str(e)}, status=400)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=500)
+            if new_balance is None:
+                return Response({'error': 'User not found'}, status=404)
+        elif not User.objects.filter(email=email).exists():
             return Response({'error': 'User not found'}, status=404)
 
-        # Perform atomic operation for wallet deduction + investment save
-        with transaction.atomic():
-            new_balance = None
-            if payment_mode == 'Wallet':
-                try:
-                    current_balance = float(user.balance)
-                except (TypeError, ValueError):
-                    return Response({'error': 'Invalid user balance in system'}, status=500)
-
-                if amount > current_balance:
-                    return Response({'error': 'Insufficient wallet balance'}, status=400)
-
-                new_balance = round(current_balance - amount, 2)
-                user.balance = f"{new_balance:.2f}"
-                user.save(update_fields=['balance'])
-
-            # Create and save investment
+        try:
             Investment.objects.create(
                 email=email,
                 fund_id=data.get('fund_id'),
                 name=data.get('name'),
                 amount=amount,
                 sip_date=data.get('sip_date') or 'Not Applicable',
+                sip_day=parse_sip_day(data.get('sip_date')) if data.get('investment_type') == 'sip' else None,
                 investment_type=data.get('investment_type'),
                 nav=float(data.get('nav')) if data.get('nav') is not None else 0.0,
                 category=data.get('category'),
@@ -342,10 +341,17 @@ def save_investment(request):
                 date=timezone.now().date(),
                 time=timezone.now().time()
             )
+        except Exception:
+            if new_balance is not None:
+                # Refund the charge for an investment that was not saved
+                User.add_to_balance(email, amount)
+            raise
+
+        invalidate_portfolio(email)
 
         response = {'message': 'Investment saved successfully ✅'}
         if payment_mode == 'Wallet':
-            response['new_balance'] = float(user.balance)
+            response['new_balance'] = new_balance
         return Response(response)
 
     except Exception as e:
@@ -358,6 +364,9 @@ def get_investments(request):
     if not email:
         return Response({'error': 'Email is required'}, status=400)
 
+    if mongo.enabled():
+        return Response(mongo.InvestmentRepository().list_for(email))
+
     investments = Investment.objects.filter(email=email)
     serialized = [{
         "fund_id": i.fund_id,
@@ -374,3 +383,15 @@ def get_investments(request):
     } for i in investments]
 
     return Response(serialized)
+
+
+@api_view(['GET'])
+def get_portfolio_summary(request):
+    """Holdings aggregated per fund with current value, gain and XIRR, in one response"""
+    email = request.GET.get('email')
+    if not email:
+        return Response({'error': 'Email is required'}, status=400)
+    try:
+        return Response(get_portfolio(email))
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
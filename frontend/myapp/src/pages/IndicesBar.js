@@ -30,6 +30,26 @@ const IndicesBar = () => {
     return () => clearInterval(interval);
   }, []);
 
+  // Live updates for the indices already on screen; polling above stays as the fallback
+  const streamSymbols = indices.map(index => index.symbol).join(',');
+  useEffect(() => {
+    if (!process.env.REACT_APP_BACKEND_URL || !streamSymbols || !window.EventSource) return;
+
+    const source = new EventSource(
+      `${process.env.REACT_APP_BACKEND_URL}/web/stream/quotes/?symbols=${encodeURIComponent(streamSymbols)}`
+    );
+    source.addEventListener('quotes', event => {
+      const quotes = {};
+      JSON.parse(event.data).forEach(quote => { quotes[quote.symbol] = quote; });
+      setIndices(current => current.map(index => {
+        const quote = quotes[index.symbol];
+        if (!quote || quote.price == null || quote.change == null) return index;
+        return { ...index, value: Number(quote.price.toFixed(2)), change: quote.change, percent: quote.percent };
+      }));
+    });
+    return () => source.close();
+  }, [streamSymbols]);
+
   return (
     <>
       <style>{`
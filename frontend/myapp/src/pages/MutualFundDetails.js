@@ -10,7 +10,6 @@ const MutualFundDetails = () => {
   const { id } = useParams();
   const [fund, setFund] = useState(null);
   const [timeRange, setTimeRange] = useState("1M");
-  const [fullGraphData, setFullGraphData] = useState([]);
   const [chartData, setChartData] = useState({ dates: [], prices: [] });
   const [investmentType, setInvestmentType] = useState("one-time");
   const [isLoading, setIsLoading] = useState(true);
@@ -21,12 +20,42 @@ const MutualFundDetails = () => {
     payment_mode: ""
   });
 
-  // Helper: Sort dates properly (DD-MM-YYYY to Date)
-  const sortHistoricalData = (data) => {
-    return [...data].sort((a, b) => {
-      const dateA = moment(a.date, "DD-MM-YYYY");
-      const dateB = moment(b.date, "DD-MM-YYYY");
-      return dateA - dateB;
+  // First NAV date shown for a time range, or null for the whole history
+  const rangeStart = (range) => {
+    const now = moment();
+    switch (range) {
+      case "1M":
+        return now.subtract(1, "months");
+      case "6M":
+        return now.subtract(6, "months");
+      case "YTD":
+        return now.startOf("year");
+      case "1Y":
+        return now.subtract(1, "years");
+      case "5Y":
+        return now.subtract(5, "years");
+      case "MAX":
+      default:
+        return null;
+    }
+  };
+
+  // The server keeps the NAV history, so each range asks only for its own window
+  const fetchRange = async (range) => {
+    const params = { points: 500 };
+    const start = rangeStart(range);
+    if (start) params.from = start.format("YYYY-MM-DD");
+    const response = await axios.get(
+      `${process.env.REACT_APP_BACKEND_URL}/web/mutual-fund-details/${id}/`,
+      { params }
+    );
+    return response.data;
+  };
+
+  const showHistory = (history) => {
+    setChartData({
+      dates: history.map((item) => item.date),
+      prices: history.map((item) => item.nav)
     });
   };
 
@@ -34,12 +63,10 @@ const MutualFundDetails = () => {
     const fetchFundDetails = async () => {
       try {
         setIsLoading(true);
-        const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/web/mutual-fund-details/${id}/`);
-        const data = await response.json();
+        const data = await fetchRange("1M");
         setFund(data);
-        const sortedData = sortHistoricalData(data.historical_nav || []);
-        setFullGraphData(sortedData);
-        handleTimeRangeChange("1M", sortedData);
+        setTimeRange("1M");
+        showHistory(data.historical_nav || []);
       } catch (error) {
         console.error('Failed to fetch fund details:', error);
       } finally {
@@ -49,42 +76,14 @@ const MutualFundDetails = () => {
     fetchFundDetails();
   }, [id]);
 
-  const handleTimeRangeChange = (range, dataFromFetch = null) => {
-    const data = dataFromFetch || fullGraphData;
-    const sorted = sortHistoricalData(data);
+  const handleTimeRangeChange = async (range) => {
     setTimeRange(range);
-
-    const now = moment();
-    let cutoff = null;
-
-    switch (range) {
-      case "1M":
-        cutoff = now.clone().subtract(1, "months");
-        break;
-      case "6M":
-        cutoff = now.clone().subtract(6, "months");
-        break;
-      case "YTD":
-        cutoff = moment().startOf("year");
-        break;
-      case "1Y":
-        cutoff = now.clone().subtract(1, "years");
-        break;
-      case "5Y":
-        cutoff = now.clone().subtract(5, "years");
-        break;
-      case "MAX":
-      default:
-        cutoff = null;
+    try {
+      const data = await fetchRange(range);
+      showHistory(data.historical_nav || []);
+    } catch (error) {
+      console.error('Failed to fetch fund history:', error);
     }
-
-    const filtered = cutoff
-      ? sorted.filter((item) => moment(item.date, "DD-MM-YYYY").isAfter(cutoff))
-      : sorted;
-
-    const dates = filtered.map((item) => item.date);
-    const prices = filtered.map((item) => item.nav);
-    setChartData({ dates, prices });
   };
 
   useEffect(() => {
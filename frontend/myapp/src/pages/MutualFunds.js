@@ -1,5 +1,5 @@
 // MutualFunds.js
-import React, { useEffect, useState } from 'react'
+import React, { useEffect, useRef, useState } from 'react'
 import axios from 'axios'
 import { Container } from 'react-bootstrap'
 import {
@@ -22,6 +22,7 @@ const MutualFunds = () => {
   const [currentPage, setCurrentPage] = useState(1)
   const [totalPages, setTotalPages] = useState(0)
   const articlesPerPage = 12
+  const latestSearch = useRef('')
 
   useEffect(() => {
     const fetchFunds = async () => {
@@ -87,9 +88,27 @@ const MutualFunds = () => {
     filterFunds(searchTerm, category)
   }
 
-  const filterFunds = (search, category) => {
-    let filtered = funds.filter(fund => {
+  const filterFunds = async (search, category) => {
+    // Longer terms search the whole catalog instead of the featured list
+    let source = funds
+    let searched = false
+    latestSearch.current = search
+    if (search.trim().length >= 2) {
+      try {
+        const res = await axios.get(
+          `${process.env.REACT_APP_BACKEND_URL}/web/mutual-funds/search/`,
+          { params: { q: search, limit: 48 } }
+        )
+        if (latestSearch.current !== search) return
+        source = res.data.results
+        searched = true
+      } catch (error) {
+        console.error('Failed to search mutual funds', error)
+      }
+    }
+    let filtered = source.filter(fund => {
       const matchesSearch =
+        searched ||
         fund.name.toLowerCase().includes(search.toLowerCase()) ||
         (fund.category &&
           fund.category.toLowerCase().includes(search.toLowerCase()))
@@ -42,49 +42,27 @@ const Portfolio = () => {
         return;
       }
 
-      const res = await axios.get(`${process.env.REACT_APP_BACKEND_URL}/web/investments/?email=${email}`);
-      const dataWithNAV = await Promise.all(
-        res.data.map(async (inv) => {
-          try {
-            const navRes = await axios.get(`https://api.mfapi.in/mf/${inv.fund_id}`);
-            const latestNAV = navRes.data.data?.[0]?.nav || inv.nav;
-            const previousNAV = navRes.data.data?.[1]?.nav || inv.nav;
-            
-            const currentValue = parseFloat(latestNAV) * (inv.amount / inv.nav);
-            const previousValue = parseFloat(previousNAV) * (inv.amount / inv.nav);
-            const absoluteReturn = currentValue - inv.amount;
-            const percentageReturn = ((currentValue - inv.amount) / inv.amount) * 100;
-            const dailyChange = currentValue - previousValue;
-            const dailyChangePercent = ((currentValue - previousValue) / previousValue) * 100;
-
-            return {
-              ...inv,
-              realTimeNAV: parseFloat(latestNAV),
-              currentValue: currentValue.toFixed(2),
-              units: (inv.amount / inv.nav).toFixed(3),
-              absoluteReturn: absoluteReturn.toFixed(2),
-              percentageReturn: percentageReturn.toFixed(2),
-              dailyChange: dailyChange.toFixed(2),
-              dailyChangePercent: dailyChangePercent.toFixed(2),
-              riskLevel: getRiskLevel(inv.category),
-              color: getCategoryColor(inv.category)
-            };
-          } catch (err) {
-            return { 
-              ...inv, 
-              realTimeNAV: inv.nav, 
-              currentValue: inv.amount, 
-              units: (inv.amount / inv.nav).toFixed(3),
-              absoluteReturn: '0.00',
-              percentageReturn: '0.00',
-              dailyChange: '0.00',
-              dailyChangePercent: '0.00',
-              riskLevel: getRiskLevel(inv.category),
-              color: getCategoryColor(inv.category)
-            };
-          }
-        })
-      );
+      // Holdings come valued per fund, with current NAVs, in a single request
+      const res = await axios.get(`${process.env.REACT_APP_BACKEND_URL}/web/portfolio/`, {
+        params: { email }
+      });
+      const dataWithNAV = res.data.holdings.map((holding) => {
+        const previousValue = holding.current_value - holding.day_change;
+        return {
+          ...holding,
+          amount: holding.invested,
+          nav: holding.average_nav,
+          realTimeNAV: holding.nav,
+          currentValue: holding.current_value.toFixed(2),
+          units: holding.units.toFixed(3),
+          absoluteReturn: holding.gain.toFixed(2),
+          percentageReturn: (holding.gain_percent || 0).toFixed(2),
+          dailyChange: holding.day_change.toFixed(2),
+          dailyChangePercent: (previousValue ? (holding.day_change / previousValue) * 100 : 0).toFixed(2),
+          riskLevel: getRiskLevel(holding.category),
+          color: getCategoryColor(holding.category)
+        };
+      });
       setInvestments(dataWithNAV);
     } catch (err) {
       console.error("Failed to fetch investments:", err);
@@ -103,7 +103,7 @@ const StockMarket = () => {
       setLoading(true)
       try {
         const res = await axios.get(
-          `${process.env.REACT_APP_BACKEND_URL}/web/stocks/${symbol}/chart/?period=${period}`
+          `${process.env.REACT_APP_BACKEND_URL}/web/stocks/${symbol}/chart/?period=${period}&points=400`
         )
         setChartData(res.data)
 